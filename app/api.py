@@ -10,9 +10,15 @@ import yaml
 import logging
 import datetime
 from functools import wraps
-from utils.influx import InfluxClient
+from utils.influx import InfluxClient, DEVICE_STATUS_MEASUREMENT, ALERT_MEASUREMENT
 from utils.auth import authenticate_user, get_user_role
-from flask import Flask, request, jsonify, g
+from utils.snapshot import snapshot, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.telemetry import telemetry
+from utils.supervisor import supervisor
+from utils.serving import serve, enable_compression, conditional
+from utils.livefeed import livefeed
+from utils.versions import versions
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 
 # Configure logging
 logging.basicConfig(
@@ -51,6 +57,10 @@ def token_required(f):
             if auth_header.startswith('Bearer '):
                 token = auth_header.split(' ')[1]
         
+        # EventSource cannot set headers, so event streams may pass the token in the URL
+        if not token and request.accept_mimetypes.best == 'text/event-stream':
+            token = request.args.get('access_token')
+        
         if not token:
             return jsonify({'message': 'Missing authentication token'}), 401
         
@@ -123,6 +133,7 @@ def login():
 
 @app.route('/api/status', methods=['GET'])
 @token_required
+@conditional(lambda: versions.stamp(DEVICE_STATUS_MEASUREMENT))
 def get_status():
     """Get the status of all monitored devices"""
     try:
@@ -133,8 +144,28 @@ def get_status():
         logger.error(f"Error fetching device status: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/status/collectors', methods=['GET'])
+@token_required
+def get_collector_status():
+    """
+    Get the supervision state of all collectors
+    
+    Served from the supervisor when the API runs inside the collector
+    process, otherwise from the collector_status measurement.
+    """
+    states = supervisor.snapshot()
+    if states:
+        return jsonify(states)
+    
+    try:
+        return jsonify(influx_client.get_collector_status())
+    except Exception as e:
+        logger.error(f"Error fetching collector status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/devices', methods=['GET'])
 @token_required
+@conditional(lambda: versions.stamp(devices=True))
 def get_devices():
     """Get the list of monitored devices"""
     try:
@@ -206,8 +237,70 @@ def get_qos_metrics(device_id):
         logger.error(f"Error fetching QoS metrics for device {device_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/wan/latency', methods=['GET'])
+@token_required
+def get_wan_latency():
+    """Get WAN latency percentiles merged from the stored histograms"""
+    try:
+        # Parse query parameters
+        start_time = request.args.get('start', '-24h')
+        end_time = request.args.get('end', 'now()')
+        group_by = request.args.get('group_by', 'target,probe,link').split(',')
+        percentiles = [float(q) for q in request.args.get('percentiles', '50,95,99').split(',') if q]
+        
+        # Query InfluxDB for the merged histograms
+        latencies = influx_client.get_latency_percentiles(
+            start_time,
+            end_time,
+            target=request.args.get('target'),
+            probe=request.args.get('probe'),
+            link=request.args.get('link'),
+            group_by=group_by,
+            percentiles=percentiles
+        )
+        return jsonify(latencies)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid percentiles: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error fetching WAN latency: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stream', methods=['GET'])
+@token_required
+def stream_metrics():
+    """Stream new samples and alert transitions as Server-Sent Events"""
+    # Parse query parameters (comma-separated lists, empty for all)
+    devices = [d for d in request.args.get('device', '').split(',') if d]
+    measurements = [m for m in request.args.get('measurement', '').split(',') if m]
+    
+    subscription = livefeed.subscribe(devices or None, measurements or None)
+    if subscription is None:
+        return jsonify({"error": "Too many live subscribers"}), 503
+    
+    return Response(
+        stream_with_context(livefeed.stream(subscription)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/forecasts', methods=['GET'])
+@token_required
+def get_forecasts():
+    """Get the latest capacity forecasts (time-to-threshold per series)"""
+    try:
+        # Parse query parameters
+        device_id = request.args.get('device')
+        
+        # Query InfluxDB for the latest forecasts
+        forecasts = influx_client.get_forecasts(device_id)
+        return jsonify(forecasts)
+    except Exception as e:
+        logger.error(f"Error fetching capacity forecasts: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/alerts', methods=['GET'])
 @token_required
+@conditional(lambda: versions.stamp(ALERT_MEASUREMENT, 'alert_state'))
 def get_alerts():
     """Get active alerts"""
     try:
@@ -218,6 +311,32 @@ def get_alerts():
         logger.error(f"Error fetching alerts: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/telemetry', methods=['GET'])
+@token_required
+def get_telemetry():
+    """Get collector self-telemetry (timing histograms and counters) of this process and its workers"""
+    return jsonify(telemetry.snapshot())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Expose the latest collected values in OpenMetrics text format
+    
+    Served from the in-process snapshot, so it only returns data when the API
+    runs inside the collector process (api.embedded in config.yaml).
+    Unauthenticated so Prometheus can scrape it; an optional ?target=
+    parameter restricts the output to a single device.
+    """
+    target = request.args.get('target')
+    
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(snapshot.render_gzip(target), content_type=METRICS_CONTENT_TYPE)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+    
+    return Response(snapshot.render(target), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/config', methods=['GET'])
 @token_required
 @role_required(['admin'])
@@ -269,19 +388,30 @@ def update_config():
         logger.error(f"Error updating configuration: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def start_api_server(app_config):
-    """Start the API server"""
+def init_api(app_config):
+    """Initialize the configuration and InfluxDB client used by the API"""
     global config, influx_client
     
+    first = config is None
     config = app_config
     influx_client = create_influx_client(config)
+    snapshot.configure(config)
+    livefeed.configure(config)
+    versions.configure(config)
+    if first:
+        enable_compression(app, config)
+    return app
+
+def start_api_server(app_config):
+    """Start the API server"""
+    init_api(app_config)
     
     api_config = config.get('api', {})
     host = api_config.get('host', '0.0.0.0')
     port = api_config.get('port', 8000)
     
     logger.info(f"Starting API server on {host}:{port}")
-    app.run(host=host, port=port)
+    serve(app, config, host, port)
 
 if __name__ == "__main__":
     # For testing purposes only
@@ -3,8 +3,40 @@ Network monitoring collectors package
 Contains data collectors for various device types and metrics
 """
 
+import time
 import logging
+import threading
 from abc import ABC, abstractmethod
+from utils.telemetry import telemetry
+from utils.sharding import sharding
+from utils.scheduler import PollScheduler
+
+class CycleCancelled(Exception):
+    """Raised in a cycle that the supervisor abandoned after a timeout"""
+    pass
+
+# Cycle number of the cycle running in the current thread
+_cycle = threading.local()
+
+class _DevicePoll:
+    """Times one device poll and reports its completion to the scheduler"""
+    
+    def __init__(self, collector, device, timer):
+        self.collector = collector
+        self.device = device
+        self.timer = timer
+    
+    def __enter__(self):
+        self.timer.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.__exit__(exc_type, exc_value, traceback)
+        if self.collector.scheduler:
+            if exc_type is not None:
+                self.collector.scheduler.failure(self.device['id'])
+            self.collector.scheduler.complete(self.device['id'])
+        return False
 
 class BaseCollector:
     """Base class for all data collectors"""
@@ -12,12 +44,114 @@ class BaseCollector:
     def __init__(self, config):
         """Initialize the collector with configuration"""
         self.config = config
-        self.logger = logging.getLogger(f'collectors.{self.__class__.__module__.split(".")[-1]}')
+        self.name = self.__class__.__module__.split(".")[-1]
+        self.logger = logging.getLogger(f'collectors.{self.name}')
+        self.quarantined = set()  # Device ids skipped by owned_devices()
+        self.quarantine = None  # Quarantine fed by failed polls, set by the supervisor
+        self.current_device = None  # Device being polled by the current cycle
+        self.scheduler = None  # Adaptive poll scheduler, created on first use
+        self._cycle_id = 0
         
     def initialize(self):
         """Initialize collector-specific resources"""
         pass  # Default implementation does nothing
     
+    def run_cycle(self):
+        """Run one collection cycle, recording its duration, errors and overruns"""
+        self._cycle_id += 1
+        _cycle.id = self._cycle_id
+        self.current_device = None
+        start = time.perf_counter()
+        try:
+            self.collect()
+        except CycleCancelled:
+            self.logger.warning(f"Abandoned cycle of collector {self.name} stopped")
+        except Exception:
+            telemetry.count('collect_errors', collector=self.name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            telemetry.observe('collect_duration', elapsed, collector=self.name)
+            if elapsed > getattr(self, 'interval', 60):
+                telemetry.count('collect_overruns', collector=self.name)
+    
+    def cancel_cycle(self):
+        """Make the running cycle stop before its next device"""
+        self._cycle_id += 1
+    
+    def owned_devices(self):
+        """Return the devices this instance polls (all of them unless sharding is enabled)"""
+        devices = sharding.owned(getattr(self, 'devices', []))
+        if self.quarantined:
+            devices = [device for device in devices if device['id'] not in self.quarantined]
+        return devices
+    
+    def due_devices(self):
+        """
+        Return the devices to poll in this cycle
+        
+        With adaptive scheduling enabled only the owned devices whose poll
+        interval has elapsed are returned; otherwise all owned devices.
+        """
+        devices = self.owned_devices()
+        if self.scheduler is None:
+            self.scheduler = PollScheduler.from_config(self.config, getattr(self, 'interval', 60)) or False
+        if not self.scheduler:
+            return devices
+        return self.scheduler.due(devices)
+    
+    def next_cycle_delay(self):
+        """Return the seconds until the next cycle is needed, or None for the default delay"""
+        if not self.scheduler:
+            return None
+        return self.scheduler.next_wakeup()
+    
+    def observe_series(self, device, name, value):
+        """Feed a collected value into the device's volatility estimate"""
+        if self.scheduler:
+            self.scheduler.observe(device['id'], name, value)
+    
+    def probe_port(self, device):
+        """Return the TCP port used to check whether a device is reachable"""
+        if device.get('use_api', False):
+            return device.get('api_port', 8728)
+        return device.get('probe_port', 22)
+    
+    def device_timer(self, device):
+        """Return a (sampled) timer for polling a single device"""
+        if getattr(_cycle, 'id', self._cycle_id) != self._cycle_id:
+            raise CycleCancelled(self.name)
+        self.current_device = device['id']
+        timer = telemetry.timer('device_poll', sampled=True, collector=self.name, device_id=device['id'])
+        return _DevicePoll(self, device, timer)
+    
+    def roundtrip_timer(self, kind, device):
+        """Return a (sampled) timer for a single API or SNMP round trip"""
+        return telemetry.timer(f'{kind}_roundtrip', sampled=True, collector=self.name, device_id=device['id'])
+    
+    def record_device_error(self, device):
+        """Count a failed poll of a device"""
+        telemetry.count('device_errors', collector=self.name, device_id=device['id'])
+        if self.scheduler:
+            self.scheduler.failure(device['id'])
+        self.strike_device(device['id'])
+    
+    def strike_device(self, device_id):
+        """Record a strike against a device, quarantining it after repeated failures"""
+        if self.quarantine is None or not self.quarantine.strike(device_id):
+            return
+        self.quarantined.add(device_id)
+        telemetry.count('device_quarantines', collector=self.name)
+        self.logger.warning(f"Quarantining device {device_id} of collector {self.name} "
+                            f"for {self.quarantine.duration}s after repeated failures")
+    
+    def record_demo_fallback(self, device):
+        """Count a poll that fell back to demo data"""
+        telemetry.count('demo_fallbacks', collector=self.name, device_id=device['id'])
+        # Devices in demo mode are not unreachable and keep their normal interval
+        if self.scheduler and not device.get('demo_mode', False):
+            self.scheduler.failure(device['id'])
+    
     @abstractmethod
     def collect(self):
         """Collect metrics - to be implemented by subclasses"""
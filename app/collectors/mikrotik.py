@@ -2,10 +2,15 @@
 MikroTik collector module
 Collects metrics from MikroTik devices using their API
 """
+import asyncio
 import logging
+import threading
 import time
 from . import BaseCollector
 from utils.influx import InfluxClient
+from utils.inventory import get_inventory
+from utils.forecast import CapacityForecaster
+from utils.streaming import streams, COLLECTOR_PATHS
 
 # Optional: Use librouteros if available
 try:
@@ -18,17 +23,38 @@ except ImportError:
 # Use pysnmp for SNMP-based collection
 import pysnmp.hlapi as snmp
 
+# pysnmp >= 7 only provides the asyncio high-level API
+try:
+    from pysnmp.hlapi.v3arch import asyncio as snmp_asyncio
+except ImportError:
+    snmp_asyncio = None
+
 # Configure logging
 logger = logging.getLogger("collectors.mikrotik")
 
+# Tables polled when a device has no inventory plan
+DEFAULT_TABLES = ('system', 'interfaces')
+
+# MikroTik system OIDs: CPU load, total memory, free memory
+SYSTEM_OIDS = ('1.3.6.1.4.1.14988.1.1.3.14.0', '1.3.6.1.4.1.14988.1.1.3.10.0', '1.3.6.1.4.1.14988.1.1.3.11.0')
+
 class Collector(BaseCollector):
     """Collector for MikroTik devices"""
     
+    # Capacity forecast metrics fed by this collector
+    FORECAST_METRICS = ('router_memory', 'interface_rx', 'interface_tx')
+    
     def __init__(self, config):
         """Initialize MikroTik collector"""
         self.interval = 30  # Collect every 30 seconds
         self.devices = []  # Will be populated in initialize()
         self.influx = None
+        self.forecaster = None
+        # SNMP engine, event loop and transport targets reused across devices and cycles
+        self._snmp_engine = None
+        self._snmp_loop = None
+        self._snmp_targets = {}
+        self._snmp_lock = threading.Lock()
         super().__init__(config)
     
     def initialize(self):
@@ -43,19 +69,14 @@ class Collector(BaseCollector):
             bucket=influx_config.get('bucket', 'my-bucket')
         )
         
-        # Load device list (in a real application, this would come from a database)
-        # For demo purposes, we'll hardcode a test device
-        self.devices = [
-            {
-                'id': 'mikrotik1',
-                'name': 'Main Router',
-                'host': '192.168.1.1',
-                'snmp_community': 'public',
-                'api_user': 'admin',
-                'api_password': 'password',
-                'use_api': HAVE_ROUTEROS
-            }
-        ]
+        # Load the devices (and the tables to poll on each) from the inventory
+        self.devices = get_inventory(self.config).plan('mikrotik')
+        
+        self.forecaster = CapacityForecaster(self.config, self.influx, self.FORECAST_METRICS)
+        
+        # Record links going up or down as they happen when streaming
+        if streams.enabled:
+            streams.add_listener('/interface', self._on_interface_change)
         
         logger.info(f"Initialized MikroTik collector with {len(self.devices)} devices")
     
@@ -64,79 +85,120 @@ class Collector(BaseCollector):
         start_time = time.time()
         logger.debug("Starting MikroTik metrics collection")
         
-        for device in self.devices:
-            try:
-                # Check if we're in demo mode or can't reach the device
-                if device.get('demo_mode', False) or not self._can_connect(device['host']):
-                    logger.info(f"Using demo data for device {device['id']} (host: {device['host']})")
-                    self._collect_demo_data(device)
-                elif device.get('use_api', False) and HAVE_ROUTEROS:
-                    self._collect_via_api(device)
-                else:
-                    self._collect_via_snmp(device)
-            except Exception as e:
-                logger.error(f"Error collecting metrics for device {device['id']}: {str(e)}")
-                # Fallback to demo data on error
+        for device in self.due_devices():
+            with self.device_timer(device):
                 try:
-                    logger.info(f"Falling back to demo data for device {device['id']}")
-                    self._collect_demo_data(device)
-                except Exception as demo_error:
-                    logger.error(f"Error generating demo data: {str(demo_error)}")
+                    # Check if we're in demo mode or can't reach the device
+                    if device.get('demo_mode', False) or not self._can_connect(device['host'], self.probe_port(device)):
+                        logger.info(f"Using demo data for device {device['id']} (host: {device['host']})")
+                        self.record_demo_fallback(device)
+                        self._collect_demo_data(device)
+                    elif device.get('use_api', False) and HAVE_ROUTEROS:
+                        self._collect_via_api(device)
+                    else:
+                        self._collect_via_snmp(device)
+                except Exception as e:
+                    self.record_device_error(device)
+                    logger.error(f"Error collecting metrics for device {device['id']}: {str(e)}")
+                    # Fallback to demo data on error
+                    try:
+                        logger.info(f"Falling back to demo data for device {device['id']}")
+                        self.record_demo_fallback(device)
+                        self._collect_demo_data(device)
+                    except Exception as demo_error:
+                        logger.error(f"Error generating demo data: {str(demo_error)}")
+        
+        # Publish capacity forecasts for the samples collected this cycle
+        try:
+            self.forecaster.publish()
+        except Exception as e:
+            logger.error(f"Error publishing capacity forecasts: {str(e)}")
         
         elapsed = time.time() - start_time
         logger.debug(f"Completed MikroTik metrics collection in {elapsed:.2f} seconds")
     
     def _collect_via_api(self, device):
         """Collect metrics using MikroTik API"""
+        api = None
         try:
             # Connect to RouterOS API
-            api = librouteros.connect(
-                host=device['host'],
-                username=device['api_user'],
-                password=device['api_password']
-            )
-            
-            # Collect system resources
-            resources = api.path('/system/resource').get()[0]
-            
-            # Collect CPU load
-            cpu_load = resources.get('cpu-load', 0)
-            
-            # Collect memory usage
-            total_memory = int(resources.get('total-memory', 0))
-            free_memory = int(resources.get('free-memory', 0))
-            memory_usage = 0
-            if total_memory > 0:
-                memory_usage = round(((total_memory - free_memory) / total_memory) * 100, 2)
+            with self.roundtrip_timer('api', device):
+                api = librouteros.connect(
+                    host=device['host'],
+                    username=device['api_user'],
+                    password=device['api_password'],
+                    port=device.get('api_port', 8728)
+                )
             
-            # Collect interface metrics
-            interfaces = api.path('/interface').get()
-            interface_metrics = []
+            tables = device.get('tables', DEFAULT_TABLES)
             
-            for iface in interfaces:
-                name = iface.get('name', 'unknown')
-                if not name.startswith('vlan') and not name.startswith('bridge'):
-                    # Get interface statistics
-                    stats = api.path(f'/interface/monitor-traffic', 
-                                    {'interface': name, 'once': ''})[0]
-                    
-                    rx_bytes = stats.get('rx-bits-per-second', 0)
-                    tx_bytes = stats.get('tx-bits-per-second', 0)
-                    
-                    interface_metrics.append({
-                        'name': name,
-                        'rx_bytes': rx_bytes,
-                        'tx_bytes': tx_bytes,
-                        'status': iface.get('running', False)
-                    })
+            if 'system' in tables:
+                # Collect system resources
+                with self.roundtrip_timer('api', device):
+                    resources = tuple(api.path('/system/resource'))[0]
+                
+                # Collect CPU load
+                cpu_load = resources.get('cpu-load', 0)
+                
+                # Collect memory usage
+                total_memory = int(resources.get('total-memory', 0))
+                free_memory = int(resources.get('free-memory', 0))
+                memory_usage = 0
+                if total_memory > 0:
+                    memory_usage = round(((total_memory - free_memory) / total_memory) * 100, 2)
+                
+                self._store_system_metrics(device, cpu_load, memory_usage)
             
-            # Store metrics in InfluxDB
-            self._store_system_metrics(device, cpu_load, memory_usage)
-            self._store_interface_metrics(device, interface_metrics)
+            if 'interfaces' in tables:
+                # Collect interface metrics
+                interfaces = streams.rows(device, '/interface', COLLECTOR_PATHS['mikrotik'])
+                if interfaces is None:
+                    with self.roundtrip_timer('api', device):
+                        interfaces = tuple(api.path('/interface'))
+                interface_metrics = []
+                
+                for iface in interfaces:
+                    name = iface.get('name', 'unknown')
+                    if not name.startswith('vlan') and not name.startswith('bridge'):
+                        # Get interface statistics
+                        with self.roundtrip_timer('api', device):
+                            stats = tuple(api('/interface/monitor-traffic', interface=name, once=True))[0]
+                        
+                        rx_bytes = stats.get('rx-bits-per-second', 0)
+                        tx_bytes = stats.get('tx-bits-per-second', 0)
+                        
+                        interface_metrics.append({
+                            'name': name,
+                            'rx_bytes': rx_bytes,
+                            'tx_bytes': tx_bytes,
+                            'status': iface.get('running', False)
+                        })
+                
+                self._store_interface_metrics(device, interface_metrics)
             
         except Exception as e:
             logger.error(f"API collection error for device {device['id']}: {str(e)}")
             raise
+        finally:
+            if api is not None:
+                api.close()
+    
+    def _on_interface_change(self, device, event, row, previous):
+        """Write an up or down event when a streamed interface changes running state"""
+        if event != 'update' or 'running' not in row or row['running'] == previous.get('running'):
+            return
+        self.influx.write_data({
+            "measurement": "interface_event",
+            "tags": {
+                "device_id": device['id'],
+                "device_name": device['name'],
+                "interface": row.get('name', 'unknown'),
+                "event": 'up' if row['running'] else 'down'
+            },
+            "fields": {
+                "value": 1
+            }
+        })
     
     def _collect_via_snmp(self, device):
         """Collect metrics using SNMP"""
@@ -144,79 +206,111 @@ class Collector(BaseCollector):
             # SNMP connection parameters
             host = device['host']
             community = device.get('snmp_community', 'public')
+            port = device.get('snmp_port', 161)
             
-            # Collect system metrics
-            # CPU Load - MikroTik OID 1.3.6.1.4.1.14988.1.1.3.14.0
-            cpu_load = self._get_snmp_value(host, community, '1.3.6.1.4.1.14988.1.1.3.14.0')
-            
-            # Total Memory - MikroTik OID 1.3.6.1.4.1.14988.1.1.3.10.0
-            total_memory = self._get_snmp_value(host, community, '1.3.6.1.4.1.14988.1.1.3.10.0')
+            tables = device.get('tables', DEFAULT_TABLES)
             
-            # Free Memory - MikroTik OID 1.3.6.1.4.1.14988.1.1.3.11.0
-            free_memory = self._get_snmp_value(host, community, '1.3.6.1.4.1.14988.1.1.3.11.0')
-            
-            # Calculate memory usage percentage
-            memory_usage = 0
-            if total_memory > 0:
-                memory_usage = round(((total_memory - free_memory) / total_memory) * 100, 2)
-            
-            # Collect interface metrics
-            # Get interface list - Standard SNMP OID 1.3.6.1.2.1.2.2
-            interface_metrics = []
-            
-            # We'd implement full SNMP walk here for interfaces
-            # For brevity, mocking with sample data
-            interface_metrics = [
-                {
-                    'name': 'ether1',
-                    'rx_bytes': 1024000,
-                    'tx_bytes': 512000,
-                    'status': True
-                },
-                {
-                    'name': 'wlan1',
-                    'rx_bytes': 256000,
-                    'tx_bytes': 128000,
-                    'status': True
-                }
-            ]
+            if 'system' in tables:
+                # Collect system metrics (CPU load, total and free memory) in one GET
+                with self.roundtrip_timer('snmp', device):
+                    cpu_load, total_memory, free_memory = self._get_snmp_values(host, community, SYSTEM_OIDS, port)
+                
+                # Calculate memory usage percentage
+                memory_usage = 0
+                if total_memory > 0:
+                    memory_usage = round(((total_memory - free_memory) / total_memory) * 100, 2)
+                
+                self._store_system_metrics(device, cpu_load, memory_usage)
             
-            # Store metrics in InfluxDB
-            self._store_system_metrics(device, cpu_load, memory_usage)
-            self._store_interface_metrics(device, interface_metrics)
+            if 'interfaces' in tables:
+                # Collect interface metrics
+                # Get interface list - Standard SNMP OID 1.3.6.1.2.1.2.2
+                # We'd implement full SNMP walk here for interfaces
+                # For brevity, mocking with sample data
+                interface_metrics = [
+                    {
+                        'name': 'ether1',
+                        'rx_bytes': 1024000,
+                        'tx_bytes': 512000,
+                        'status': True
+                    },
+                    {
+                        'name': 'wlan1',
+                        'rx_bytes': 256000,
+                        'tx_bytes': 128000,
+                        'status': True
+                    }
+                ]
+                
+                self._store_interface_metrics(device, interface_metrics)
             
         except Exception as e:
             logger.error(f"SNMP collection error for device {device['id']}: {str(e)}")
             raise
     
-    def _get_snmp_value(self, host, community, oid):
-        """Get a value from an SNMP OID"""
+    def _get_snmp_values(self, host, community, oids, port=161):
+        """
+        Get several SNMP OIDs from a device in a single GET request
+
+        Args:
+            host: Device address
+            community: SNMP community
+            oids: OIDs to fetch
+            port: SNMP port
+
+        Returns:
+            List with the value of each OID (0 for every OID on error)
+        """
         try:
-            error_indication, error_status, error_index, var_binds = next(
-                snmp.getCmd(
-                    snmp.SnmpEngine(),
-                    snmp.CommunityData(community),
-                    snmp.UdpTransportTarget((host, 161)),
-                    snmp.ContextData(),
-                    snmp.ObjectType(snmp.ObjectIdentity(oid))
-                )
-            )
+            with self._snmp_lock:
+                if hasattr(snmp, 'getCmd'):
+                    if self._snmp_engine is None:
+                        self._snmp_engine = snmp.SnmpEngine()
+                    error_indication, error_status, error_index, var_binds = next(
+                        snmp.getCmd(
+                            self._snmp_engine,
+                            snmp.CommunityData(community),
+                            snmp.UdpTransportTarget((host, port)),
+                            snmp.ContextData(),
+                            *[snmp.ObjectType(snmp.ObjectIdentity(oid)) for oid in oids]
+                        )
+                    )
+                else:
+                    if self._snmp_loop is None:
+                        self._snmp_loop = asyncio.new_event_loop()
+                    error_indication, error_status, error_index, var_binds = self._snmp_loop.run_until_complete(
+                        self._get_snmp_values_async(host, community, oids, port)
+                    )
             
             if error_indication:
                 logger.error(f"SNMP error: {error_indication}")
-                return 0
+                return [0] * len(oids)
                 
             if error_status:
                 logger.error(f"SNMP error: {error_status.prettyPrint()} at {var_binds[int(error_index)-1] if error_index else '?'}")
-                return 0
+                return [0] * len(oids)
             
-            for var_bind in var_binds:
-                return var_bind[1]
-                
-            return 0
+            values = [var_bind[1] for var_bind in var_binds]
+            return values + [0] * (len(oids) - len(values))
         except Exception as e:
             logger.error(f"SNMP get error: {str(e)}")
-            return 0
+            return [0] * len(oids)
+    
+    async def _get_snmp_values_async(self, host, community, oids, port):
+        """Get SNMP OIDs using the pysnmp >= 7 asyncio API"""
+        if self._snmp_engine is None:
+            self._snmp_engine = snmp_asyncio.SnmpEngine()
+        target = self._snmp_targets.get((host, port))
+        if target is None:
+            target = await snmp_asyncio.UdpTransportTarget.create((host, port), timeout=1, retries=0)
+            self._snmp_targets[(host, port)] = target
+        return await snmp_asyncio.get_cmd(
+            self._snmp_engine,
+            snmp_asyncio.CommunityData(community),
+            target,
+            snmp_asyncio.ContextData(),
+            *[snmp_asyncio.ObjectType(snmp_asyncio.ObjectIdentity(oid)) for oid in oids]
+        )
     
     def _store_system_metrics(self, device, cpu_load, memory_usage):
         """Store system metrics in InfluxDB"""
@@ -236,6 +330,9 @@ class Collector(BaseCollector):
         ]
         
         self.influx.write_data(data)
+        self.forecaster.observe('router_memory', device['id'], memory_usage)
+        self.observe_series(device, 'cpu_load', cpu_load)
+        self.observe_series(device, 'memory_usage', memory_usage)
         logger.debug(f"Stored system metrics for device {device['id']}")
     
     def _store_interface_metrics(self, device, interfaces):
@@ -257,17 +354,18 @@ class Collector(BaseCollector):
                     "status": 1 if iface['status'] else 0
                 }
             })
+            self.forecaster.observe('interface_rx', device['id'], iface['rx_bytes'], iface['name'])
+            self.forecaster.observe('interface_tx', device['id'], iface['tx_bytes'], iface['name'])
         
         self.influx.write_data(data)
+        self.observe_series(device, 'traffic', sum(float(iface['rx_bytes']) + float(iface['tx_bytes']) for iface in interfaces))
         logger.debug(f"Stored interface metrics for device {device['id']}")
         
     def _can_connect(self, host, port=22, timeout=1):
         """Check if we can connect to the host"""
         import socket
         try:
-            socket.setdefaulttimeout(timeout)
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((host, port))
+            s = socket.create_connection((host, port), timeout=timeout)
             s.close()
             return True
         except Exception:
@@ -312,8 +410,11 @@ class Collector(BaseCollector):
             }
         ]
         
-        # Store the simulated metrics
-        self._store_system_metrics(device, cpu_load, memory_usage)
-        self._store_interface_metrics(device, interfaces)
+        # Store the simulated metrics for the planned tables
+        tables = device.get('tables', DEFAULT_TABLES)
+        if 'system' in tables:
+            self._store_system_metrics(device, cpu_load, memory_usage)
+        if 'interfaces' in tables:
+            self._store_interface_metrics(device, interfaces)
         
         logger.debug(f"Generated and stored demo data for device {device['id']}")
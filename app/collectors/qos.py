@@ -6,6 +6,8 @@ import time
 import logging
 from . import BaseCollector
 from utils.influx import InfluxClient
+from utils.inventory import get_inventory
+from utils.units import parse_rate, parse_rate_pair, parse_number, parse_number_pair, parse_duration, parse_duration_pair
 
 # Optional: Use librouteros if available
 try:
@@ -26,6 +28,14 @@ except ImportError:
 # Configure logging
 logger = logging.getLogger("collectors.qos")
 
+# Properties fetched from /queue/simple and /queue/tree (configuration plus live counters)
+SIMPLE_QUEUE_PROPERTIES = ('name', 'target', 'parent', 'max-limit', 'limit-at', 'priority', 'disabled',
+                           'burst-limit', 'burst-threshold', 'burst-time',
+                           'bytes', 'packets', 'dropped', 'queued-bytes', 'queued-packets', 'rate')
+TREE_QUEUE_PROPERTIES = ('name', 'parent', 'packet-mark', 'max-limit', 'limit-at', 'priority', 'disabled',
+                         'burst-limit', 'burst-threshold', 'burst-time',
+                         'bytes', 'packets', 'dropped', 'queued-bytes', 'queued-packets', 'rate')
+
 class Collector(BaseCollector):
     """Collector for QoS metrics"""
     
@@ -34,6 +44,7 @@ class Collector(BaseCollector):
         self.interval = 60  # Collect every 60 seconds
         self.devices = []  # Will be populated in initialize()
         self.influx = None
+        self.counters = {}  # (device id, queue type, queue name) -> (time, counters) of the previous poll
         super().__init__(config)
     
     def initialize(self):
@@ -48,20 +59,8 @@ class Collector(BaseCollector):
             bucket=influx_config.get('bucket', 'my-bucket')
         )
         
-        # Load device list (in a real application, this would come from a database)
-        # For demo purposes, we'll hardcode a test device
-        self.devices = [
-            {
-                'id': 'mikrotik1',
-                'name': 'Main Router',
-                'host': '192.168.1.1',
-                'type': 'mikrotik',
-                'snmp_community': 'public',
-                'api_user': 'admin',
-                'api_password': 'password',
-                'use_api': HAVE_ROUTEROS
-            }
-        ]
+        # Load the devices (and the tables to poll on each) from the inventory
+        self.devices = get_inventory(self.config).plan('qos')
         
         logger.info(f"Initialized QoS collector with {len(self.devices)} devices")
     
@@ -70,60 +69,120 @@ class Collector(BaseCollector):
         start_time = time.time()
         logger.debug("Starting QoS metrics collection")
         
-        for device in self.devices:
-            try:
-                # Check if we're in demo mode or can't reach the device
-                if device.get('demo_mode', False) or not self._can_connect(device['host']):
-                    logger.info(f"Using demo data for QoS device {device['id']} (host: {device['host']})")
-                    self._collect_demo_data(device)
-                elif device.get('type') == 'mikrotik':
-                    if device.get('use_api', False) and HAVE_ROUTEROS:
-                        self._collect_mikrotik_api(device)
-                    elif HAVE_SNMP:
-                        self._collect_mikrotik_snmp(device)
-                    else:
-                        logger.warning(f"No collection method available for device {device['id']}")
-                # Add support for other device types as needed
-            except Exception as e:
-                logger.error(f"Error collecting QoS metrics for device {device['id']}: {str(e)}")
-                # Fallback to demo data on error
+        for device in self.due_devices():
+            with self.device_timer(device):
                 try:
-                    logger.info(f"Falling back to demo data for QoS device {device['id']}")
-                    self._collect_demo_data(device)
-                except Exception as demo_error:
-                    logger.error(f"Error generating QoS demo data: {str(demo_error)}")
+                    # Check if we're in demo mode or can't reach the device
+                    if device.get('demo_mode', False) or not self._can_connect(device['host'], self.probe_port(device)):
+                        logger.info(f"Using demo data for QoS device {device['id']} (host: {device['host']})")
+                        self.record_demo_fallback(device)
+                        self._collect_demo_data(device)
+                    elif device.get('type') == 'mikrotik':
+                        if device.get('use_api', False) and HAVE_ROUTEROS:
+                            self._collect_mikrotik_api(device)
+                        elif HAVE_SNMP:
+                            self._collect_mikrotik_snmp(device)
+                        else:
+                            logger.warning(f"No collection method available for device {device['id']}")
+                    # Add support for other device types as needed
+                except Exception as e:
+                    self.record_device_error(device)
+                    logger.error(f"Error collecting QoS metrics for device {device['id']}: {str(e)}")
+                    # Fallback to demo data on error
+                    try:
+                        logger.info(f"Falling back to demo data for QoS device {device['id']}")
+                        self.record_demo_fallback(device)
+                        self._collect_demo_data(device)
+                    except Exception as demo_error:
+                        logger.error(f"Error generating QoS demo data: {str(demo_error)}")
         
         elapsed = time.time() - start_time
         logger.debug(f"Completed QoS metrics collection in {elapsed:.2f} seconds")
     
     def _collect_mikrotik_api(self, device):
         """Collect QoS metrics using MikroTik API"""
+        api = None
         try:
             # Connect to RouterOS API
-            api = librouteros.connect(
-                host=device['host'],
-                username=device['api_user'],
-                password=device['api_password']
-            )
+            with self.roundtrip_timer('api', device):
+                api = librouteros.connect(
+                    host=device['host'],
+                    username=device['api_user'],
+                    password=device['api_password'],
+                    port=device.get('api_port', 8728)
+                )
             
-            # Collect queue metrics
-            simple_queues = api.path('/queue/simple').get()
+            # Fetch all simple queues and queue tree entries with their counters,
+            # one print per table
+            with self.roundtrip_timer('api', device):
+                simple_queues = tuple(api.path('/queue/simple').select(*SIMPLE_QUEUE_PROPERTIES))
+            with self.roundtrip_timer('api', device):
+                tree_queues = tuple(api.path('/queue/tree').select(*TREE_QUEUE_PROPERTIES))
+            now = time.monotonic()
             
             # Process queue metrics
             queue_metrics = []
             for queue in simple_queues:
-                queue_metrics.append({
+                # Simple queues report every value as "upload/download" (e.g. "5M/10M")
+                metrics = {
                     'name': queue.get('name', 'unknown'),
+                    'type': 'simple',
                     'target': queue.get('target', ''),
                     'parent': queue.get('parent', ''),
                     'max_limit': self._parse_limit(queue.get('max-limit', '0/0')),
                     'limit_at': self._parse_limit(queue.get('limit-at', '0/0')),
-                    'priority': int(queue.get('priority', 8)),
+                    'priority': int(str(queue.get('priority', 8)).split('/')[0]),
                     'disabled': queue.get('disabled', False)
+                }
+                burst = {}
+                for key, parser in (('burst-limit', parse_rate_pair), ('burst-threshold', parse_rate_pair),
+                                    ('burst-time', parse_duration_pair)):
+                    upload, download = parser(queue.get(key, '0/0'))
+                    burst[f"{key.replace('-', '_')}_upload"] = upload
+                    burst[f"{key.replace('-', '_')}_download"] = download
+                metrics['burst'] = burst
+                counters = {}
+                for key in ('bytes', 'packets', 'dropped', 'queued-bytes', 'queued-packets'):
+                    upload, download = parse_number_pair(queue.get(key, '0/0'))
+                    counters[f"{key.replace('-', '_')}_upload"] = upload
+                    counters[f"{key.replace('-', '_')}_download"] = download
+                metrics['counters'] = counters
+                metrics['rates'] = self._counter_rates(device, metrics, now, {
+                    'current_upload': ('bytes_upload', 8),
+                    'current_download': ('bytes_download', 8),
+                    'drop_rate_upload': ('dropped_upload', 1),
+                    'drop_rate_download': ('dropped_download', 1)
                 })
+                queue_metrics.append(metrics)
             
-            # Collect queue stats (not directly available in API,
-            # but can be accessed via traffic monitoring in a real implementation)
+            for queue in tree_queues:
+                max_limit = parse_rate(queue.get('max-limit', 0))
+                limit_at = parse_rate(queue.get('limit-at', 0))
+                metrics = {
+                    'name': queue.get('name', 'unknown'),
+                    'type': 'tree',
+                    'target': queue.get('packet-mark', ''),
+                    'parent': queue.get('parent', ''),
+                    # A tree queue shapes a single direction
+                    'max_limit': max_limit,
+                    'limit_at': limit_at,
+                    'priority': int(queue.get('priority', 8)),
+                    'disabled': queue.get('disabled', False),
+                    'burst': {
+                        'burst_limit': parse_rate(queue.get('burst-limit', 0)),
+                        'burst_threshold': parse_rate(queue.get('burst-threshold', 0)),
+                        'burst_time': parse_duration(queue.get('burst-time', 0))
+                    }
+                }
+                metrics['counters'] = {
+                    key.replace('-', '_'): parse_number(queue.get(key, 0))
+                    for key in ('bytes', 'packets', 'dropped', 'queued-bytes', 'queued-packets')
+                }
+                metrics['rates'] = self._counter_rates(device, metrics, now, {
+                    'current_rate': ('bytes', 8),
+                    'drop_rate': ('dropped', 1)
+                })
+                queue_metrics.append(metrics)
             
             # Store metrics in InfluxDB
             self._store_queue_metrics(device, queue_metrics)
@@ -131,6 +190,9 @@ class Collector(BaseCollector):
         except Exception as e:
             logger.error(f"API collection error for device {device['id']}: {str(e)}")
             raise
+        finally:
+            if api is not None:
+                api.close()
     
     def _collect_mikrotik_snmp(self, device):
         """Collect QoS metrics using SNMP"""
@@ -171,92 +233,107 @@ class Collector(BaseCollector):
             logger.error(f"SNMP collection error for device {device['id']}: {str(e)}")
             raise
     
-    def _parse_limit(self, limit_str):
+    def _counter_rates(self, device, queue, now, rates):
         """
-        Parse MikroTik bandwidth limit string (e.g., "10M/5M")
-        Returns a dict with download and upload values in bps
+        Compute per-second rates from the queue's counters and the previous poll
+        
+        Args:
+            device: Device dictionary
+            queue: Queue metrics with a `counters` dictionary
+            now: Monotonic time of this poll
+            rates: Mapping of rate field -> (counter name, multiplier)
+            
+        Returns:
+            Dictionary of rate fields (empty on the first poll or after a counter reset)
         """
-        try:
-            if '/' in limit_str:
-                download, upload = limit_str.split('/')
-            else:
-                download = upload = limit_str
-                
-            return {
-                'download': self._convert_to_bps(download),
-                'upload': self._convert_to_bps(upload)
-            }
-        except:
-            return {'download': 0, 'upload': 0}
+        key = (device['id'], queue['type'], queue['name'])
+        previous = self.counters.get(key)
+        self.counters[key] = (now, queue['counters'])
+        if previous is None or now <= previous[0]:
+            return {}
+        
+        elapsed = now - previous[0]
+        result = {}
+        for field, (counter, multiplier) in rates.items():
+            delta = queue['counters'][counter] - previous[1].get(counter, 0)
+            if delta < 0:
+                # Counters were reset (queue changed or router rebooted)
+                return {}
+            result[field] = delta * multiplier / elapsed
+        return result
     
-    def _convert_to_bps(self, value_str):
+    def _parse_limit(self, limit_str):
         """
-        Convert MikroTik bandwidth value to bps (bits per second)
-        Handles values like "10M", "1G", etc.
+        Parse MikroTik bandwidth limit string (e.g., "5M/10M")
+        Simple queues list the upload (target's outgoing) limit first.
+        Returns a dict with download and upload values in bps
         """
-        if not value_str or value_str == '0':
-            return 0
-            
-        try:
-            # Remove any non-numeric suffix
-            numeric_part = ''
-            unit_part = ''
-            
-            for char in value_str:
-                if char.isdigit() or char == '.':
-                    numeric_part += char
-                else:
-                    unit_part += char
-            
-            value = float(numeric_part)
-            
-            # Convert based on unit
-            unit = unit_part.upper()
-            if unit == 'K':
-                return int(value * 1000)
-            elif unit == 'M':
-                return int(value * 1000000)
-            elif unit == 'G':
-                return int(value * 1000000000)
-            else:
-                return int(value)
-        except:
-            return 0
+        upload, download = parse_rate_pair(limit_str)
+        return {'download': download, 'upload': upload}
     
     def _store_queue_metrics(self, device, queues):
         """Store QoS queue metrics in InfluxDB"""
         data = []
+        throughput = 0.0
         
         for queue in queues:
+            queue_type = queue.get('type', 'simple')
+            rates = queue.get('rates', {})
+            if queue_type == 'tree':
+                fields = {
+                    "max_limit": float(queue['max_limit']),
+                    "limit_at": float(queue['limit_at'])
+                }
+                limits = {'current_rate': ('utilization', queue['max_limit'])}
+            else:
+                fields = {
+                    "max_limit_download": float(queue['max_limit']['download']),
+                    "max_limit_upload": float(queue['max_limit']['upload']),
+                    "limit_at_download": float(queue['limit_at']['download']),
+                    "limit_at_upload": float(queue['limit_at']['upload'])
+                }
+                limits = {
+                    'current_download': ('utilization_download', queue['max_limit']['download']),
+                    'current_upload': ('utilization_upload', queue['max_limit']['upload'])
+                }
+            fields["disabled"] = 1 if queue['disabled'] else 0
+            for key, value in queue.get('burst', {}).items():
+                fields[key] = float(value)
+            
+            # Live counters and the rates derived from them
+            for key, value in queue.get('counters', {}).items():
+                fields[key] = int(value)
+            for key, value in rates.items():
+                fields[key] = float(value)
+            for key, (utilization, limit) in limits.items():
+                if key in rates:
+                    throughput += rates[key]
+                    if limit:
+                        fields[utilization] = round(rates[key] / limit * 100, 2)
+            
             data.append({
                 "measurement": "qos_queue",
                 "tags": {
                     "device_id": device['id'],
                     "device_name": device['name'],
                     "queue_name": queue['name'],
+                    "queue_type": queue_type,
                     "target": queue['target'],
                     "parent": queue['parent'],
                     "priority": queue['priority']
                 },
-                "fields": {
-                    "max_limit_download": float(queue['max_limit']['download']),
-                    "max_limit_upload": float(queue['max_limit']['upload']),
-                    "limit_at_download": float(queue['limit_at']['download']),
-                    "limit_at_upload": float(queue['limit_at']['upload']),
-                    "disabled": 1 if queue['disabled'] else 0
-                }
+                "fields": fields
             })
         
         self.influx.write_data(data)
+        self.observe_series(device, 'throughput', throughput)
         logger.debug(f"Stored QoS queue metrics for device {device['id']}")
         
     def _can_connect(self, host, port=22, timeout=1):
         """Check if we can connect to the host"""
         import socket
         try:
-            socket.setdefaulttimeout(timeout)
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((host, port))
+            s = socket.create_connection((host, port), timeout=timeout)
             s.close()
             return True
         except Exception:
@@ -341,8 +418,10 @@ class Collector(BaseCollector):
             usage_factor = max(0.05, min(0.95, usage_factor))  # Keep between 5% and 95%
             
             # Add current usage data to the queue config
-            queue['current_download'] = int(queue['max_limit']['download'] * usage_factor)
-            queue['current_upload'] = int(queue['max_limit']['upload'] * usage_factor)
+            queue['rates'] = {
+                'current_download': int(queue['max_limit']['download'] * usage_factor),
+                'current_upload': int(queue['max_limit']['upload'] * usage_factor)
+            }
             
             queue_metrics.append(queue)
             
@@ -9,6 +9,9 @@ import logging
 import platform
 from . import BaseCollector
 from utils.influx import InfluxClient
+from utils.forecast import CapacityForecaster
+from utils.sampler import SystemSampler, MountTable, ProcessMonitor
+from utils.stackmon import StackMonitor
 
 # Configure logging
 logger = logging.getLogger("collectors.system")
@@ -16,11 +19,19 @@ logger = logging.getLogger("collectors.system")
 class Collector(BaseCollector):
     """Collector for local system metrics"""
     
+    # Capacity forecast metrics fed by this collector
+    FORECAST_METRICS = ('memory', 'disk')
+    
     def __init__(self, config):
         """Initialize system collector"""
         self.interval = 60  # Collect every 60 seconds
         self.influx = None
         self.system_info = {}
+        self.forecaster = None
+        self.sampler = SystemSampler()
+        self.mounts = None
+        self.processes = None
+        self.stack = None
         super().__init__(config)
     
     def initialize(self):
@@ -46,6 +57,24 @@ class Collector(BaseCollector):
             'physical_cpu_cores': psutil.cpu_count(logical=False)
         }
         
+        self.forecaster = CapacityForecaster(self.config, self.influx, self.FORECAST_METRICS)
+        
+        # Filtered mount table, re-read only when something is (un)mounted
+        self.mounts = MountTable.from_config(self.config)
+        
+        # Optional CPU/RSS monitor of the monitoring stack and the busiest processes
+        if self.config.get('system', {}).get('processes', {}).get('enabled', False):
+            self.processes = ProcessMonitor.from_config(self.config)
+        
+        # Health and resources of influxd and the collectors themselves
+        if self.config.get('system', {}).get('stack', {}).get('enabled', True):
+            self.stack = StackMonitor.from_config(self.config)
+        
+        # Prime the counters so the first cycle already has a window
+        self.sampler.sample()
+        if self.processes:
+            self.processes.sample()
+        
         logger.info("Initialized system collector")
     
     def collect(self):
@@ -54,88 +83,89 @@ class Collector(BaseCollector):
         logger.debug("Starting system metrics collection")
         
         try:
-            # Collect CPU metrics
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_times = psutil.cpu_times_percent(interval=1)
+            # CPU, load, disk I/O and network rates over the window since the last cycle
+            sample = self.sampler.sample()
             
             # Collect memory metrics
             memory = psutil.virtual_memory()
             swap = psutil.swap_memory()
             
             # Collect disk metrics
-            disk_partitions = psutil.disk_partitions()
             disk_metrics = []
             
-            for partition in disk_partitions:
-                if partition.fstype:  # Skip empty partitions
-                    try:
-                        usage = psutil.disk_usage(partition.mountpoint)
-                        disk_metrics.append({
-                            'device': partition.device,
-                            'mountpoint': partition.mountpoint,
-                            'fstype': partition.fstype,
-                            'total': usage.total,
-                            'used': usage.used,
-                            'free': usage.free,
-                            'percent': usage.percent
-                        })
-                    except PermissionError:
-                        # Some mountpoints might not be accessible
-                        pass
-            
-            # Collect network metrics
-            net_io_counters = psutil.net_io_counters(pernic=True)
-            network_metrics = []
-            
-            for interface, counters in net_io_counters.items():
-                network_metrics.append({
-                    'interface': interface,
-                    'bytes_sent': counters.bytes_sent,
-                    'bytes_recv': counters.bytes_recv,
-                    'packets_sent': counters.packets_sent,
-                    'packets_recv': counters.packets_recv,
-                    'errin': counters.errin,
-                    'errout': counters.errout,
-                    'dropin': counters.dropin,
-                    'dropout': counters.dropout
-                })
+            for partition in self.mounts.get():
+                try:
+                    usage = psutil.disk_usage(partition.mountpoint)
+                    disk_metrics.append({
+                        'device': partition.device,
+                        'mountpoint': partition.mountpoint,
+                        'fstype': partition.fstype,
+                        'total': usage.total,
+                        'used': usage.used,
+                        'free': usage.free,
+                        'percent': usage.percent
+                    })
+                except OSError:
+                    # Some mountpoints might not be accessible or were just unmounted
+                    pass
             
             # Store metrics in InfluxDB
-            self._store_cpu_metrics(cpu_percent, cpu_times)
+            self._store_cpu_metrics(sample['cpu'], sample['per_cpu'], sample['load'])
             self._store_memory_metrics(memory, swap)
             self._store_disk_metrics(disk_metrics)
-            self._store_network_metrics(network_metrics)
+            self._store_disk_io_metrics(sample['disks'])
+            self._store_network_metrics(sample['nics'])
+            if self.processes:
+                self._store_process_metrics(self.processes.sample())
             
             # Check thresholds and trigger alerts if needed
+            cpu_percent = sample['cpu']['cpu_percent'] if sample['cpu'] else 0.0
             self._check_thresholds(cpu_percent, memory.percent, disk_metrics)
             
+            # Flag the monitoring stack itself before it becomes the bottleneck
+            if self.stack:
+                self._check_stack(self.stack.sample())
+            
+            # Update capacity forecasts with the new samples
+            self._update_forecasts(memory.percent, disk_metrics)
+            
         except Exception as e:
             logger.error(f"Error collecting system metrics: {str(e)}")
         
         elapsed = time.time() - start_time
         logger.debug(f"Completed system metrics collection in {elapsed:.2f} seconds")
     
-    def _store_cpu_metrics(self, cpu_percent, cpu_times):
-        """Store CPU metrics in InfluxDB"""
-        data = [
-            {
+    def _store_cpu_metrics(self, cpu, per_cpu, load):
+        """Store CPU, per-core and load average metrics in InfluxDB"""
+        tags = {
+            "hostname": self.system_info['hostname'],
+            "os": self.system_info['os'],
+            "type": "system"
+        }
+        data = []
+        
+        fields = {key: float(value) for key, value in load.items()}
+        if cpu:
+            fields.update({key: float(value) for key, value in cpu.items()})
+        if fields:
+            data.append({
                 "measurement": "cpu_metrics",
-                "tags": {
-                    "hostname": self.system_info['hostname'],
-                    "os": self.system_info['os'],
-                    "type": "system"
-                },
-                "fields": {
-                    "cpu_percent": float(cpu_percent),
-                    "user_percent": float(cpu_times.user),
-                    "system_percent": float(cpu_times.system),
-                    "idle_percent": float(cpu_times.idle)
-                }
-            }
-        ]
+                "tags": tags,
+                "fields": fields
+            })
         
-        self.influx.write_data(data)
-        logger.debug("Stored CPU metrics")
+        for core, breakdown in enumerate(per_cpu):
+            if not breakdown:
+                continue
+            data.append({
+                "measurement": "cpu_core_metrics",
+                "tags": dict(tags, core=str(core)),
+                "fields": {key: float(value) for key, value in breakdown.items()}
+            })
+        
+        if data:
+            self.influx.write_data(data)
+            logger.debug("Stored CPU metrics")
     
     def _store_memory_metrics(self, memory, swap):
         """Store memory metrics in InfluxDB"""
@@ -190,34 +220,104 @@ class Collector(BaseCollector):
         self.influx.write_data(data)
         logger.debug("Stored disk metrics")
     
-    def _store_network_metrics(self, network_metrics):
-        """Store network metrics in InfluxDB"""
+    def _store_disk_io_metrics(self, disks):
+        """Store disk I/O rates in InfluxDB"""
+        data = []
+        
+        for disk, rates in disks.items():
+            data.append({
+                "measurement": "disk_io_metrics",
+                "tags": {
+                    "hostname": self.system_info['hostname'],
+                    "os": self.system_info['os'],
+                    "disk": disk,
+                    "type": "system"
+                },
+                "fields": {key: float(value) for key, value in rates.items()}
+            })
+        
+        if data:
+            self.influx.write_data(data)
+            logger.debug("Stored disk I/O metrics")
+    
+    def _store_network_metrics(self, nics):
+        """Store network counters and rates in InfluxDB"""
         data = []
         
-        for net in network_metrics:
+        for interface, metrics in nics.items():
             data.append({
                 "measurement": "network_metrics",
                 "tags": {
                     "hostname": self.system_info['hostname'],
                     "os": self.system_info['os'],
-                    "interface": net['interface'],
+                    "interface": interface,
                     "type": "system"
                 },
-                "fields": {
-                    "bytes_sent": float(net['bytes_sent']),
-                    "bytes_recv": float(net['bytes_recv']),
-                    "packets_sent": float(net['packets_sent']),
-                    "packets_recv": float(net['packets_recv']),
-                    "errin": float(net['errin']),
-                    "errout": float(net['errout']),
-                    "dropin": float(net['dropin']),
-                    "dropout": float(net['dropout'])
-                }
+                "fields": {key: float(value) for key, value in metrics.items()}
             })
         
         self.influx.write_data(data)
         logger.debug("Stored network metrics")
     
+    def _store_process_metrics(self, groups):
+        """Store per-process-group CPU and memory in InfluxDB"""
+        data = []
+        
+        for name, group in groups.items():
+            data.append({
+                "measurement": "process_metrics",
+                "tags": {
+                    "hostname": self.system_info['hostname'],
+                    "process": name,
+                    "watched": "true" if group['watched'] else "false",
+                    "type": "system"
+                },
+                "fields": {
+                    "cpu_percent": float(group['cpu_percent']),
+                    "rss": float(group['rss']),
+                    "processes": float(group['processes']),
+                    "threads": float(group['threads'])
+                }
+            })
+        
+        if data:
+            self.influx.write_data(data)
+            logger.debug(f"Stored metrics of {len(data)} process groups")
+    
+    def _check_stack(self, metrics):
+        """Store monitoring stack metrics and raise or clear their alerts"""
+        from utils.alerting import send_alert, clear_alert, active_alerts
+        
+        hostname = self.system_info['hostname']
+        self.influx.write_data([{
+            "measurement": "stack_metrics",
+            "tags": {
+                "hostname": hostname,
+                "type": "system"
+            },
+            "fields": {key: float(value) for key, value in metrics.items()}
+        }])
+        
+        for resource, value, threshold, breached in self.stack.check(metrics):
+            if breached:
+                if resource == 'influx_health':
+                    message = f"Monitoring stack alert: InfluxDB at {self.stack.influx_url} is not healthy"
+                else:
+                    message = f"Monitoring stack alert: {resource} at {value} (threshold: {threshold})"
+                send_alert('stack', message, hostname, value, threshold, resource)
+            elif f"stack_{hostname}_{resource}" in active_alerts:
+                clear_alert(f"stack_{hostname}_{resource}")
+    
+    def _update_forecasts(self, memory_percent, disk_metrics):
+        """Feed usage samples into the capacity forecaster and publish forecasts"""
+        hostname = self.system_info['hostname']
+        
+        self.forecaster.observe('memory', hostname, memory_percent)
+        for disk in disk_metrics:
+            self.forecaster.observe('disk', hostname, disk['percent'], disk['mountpoint'])
+        
+        self.forecaster.publish()
+    
     def _check_thresholds(self, cpu_percent, memory_percent, disk_metrics):
         """Check if any metrics exceed defined thresholds"""
         from utils.alerting import send_alert
@@ -4,9 +4,13 @@ Collects metrics from internet connection (WAN) interfaces
 """
 import time
 import logging
-import subprocess
 from . import BaseCollector
 from utils.influx import InfluxClient
+from utils.inventory import get_inventory
+from utils.sharding import sharding
+from utils.icmp import PingEngine, summarize
+from utils.probes import Link, ProbeRunner, build_probe, DEFAULT_LINK
+from utils.histogram import LatencyHistogram
 
 # Configure logging
 logger = logging.getLogger("collectors.wan")
@@ -20,6 +24,8 @@ class Collector(BaseCollector):
         self.devices = []  # Will be populated in initialize()
         self.influx = None
         self.target_hosts = ['8.8.8.8', '1.1.1.1']  # Default ping targets
+        self.ping_engine = None
+        self.probe_runner = None
         super().__init__(config)
     
     def initialize(self):
@@ -34,32 +40,43 @@ class Collector(BaseCollector):
             bucket=influx_config.get('bucket', 'my-bucket')
         )
         
-        # Load device and interface information
-        # In a real application, this would come from a database
-        # For demo purposes, we'll hardcode some test data
-        self.devices = [
-            {
-                'id': 'mikrotik1',
-                'name': 'Main Router',
-                'interfaces': [
-                    {
-                        'name': 'ether1',
-                        'type': 'wan',
-                        'description': 'ISP1 Connection'
-                    },
-                    {
-                        'name': 'ether2',
-                        'type': 'wan',
-                        'description': 'ISP2 Backup'
-                    }
-                ]
-            }
-        ]
+        # Ping targets and the concurrent ICMP engine probing them
+        wan_config = self.config.get('wan', {})
+        self.target_hosts = wan_config.get('targets', self.target_hosts)
+        self.ping_engine = PingEngine.from_config(self.config)
+        
+        # Load the devices with configured WAN links from the inventory
+        self.devices = get_inventory(self.config).plan('wan')
+        
+        # TCP/HTTP/DNS latency probes, run over every WAN link of every device
+        probes = [probe for probe in (build_probe(spec) for spec in wan_config.get('probes', [])) if probe]
+        links = [
+            Link(
+                name=iface['description'] or iface['name'],
+                device_id=device['id'],
+                interface=iface['name'],
+                source_address=iface.get('source_address'),
+                bind_device=iface.get('bind_device')
+            )
+            for device in self.devices
+            for iface in device['interfaces']
+        ] or [Link(DEFAULT_LINK)]
+        self.probe_runner = ProbeRunner(
+            probes,
+            links,
+            timeout=wan_config.get('probe_timeout', 5.0),
+            concurrency=wan_config.get('probe_concurrency', 100)
+        )
         
-        logger.info(f"Initialized WAN collector with {len(self.devices)} devices")
+        logger.info(f"Initialized WAN collector with {len(self.devices)} devices, "
+                    f"{len(probes)} probes over {len(links)} links")
     
     def collect(self):
         """Collect WAN metrics"""
+        # Only one instance probes the shared WAN targets when sharding is enabled
+        if not sharding.owns(f"collector:{self.name}"):
+            return
+        
         start_time = time.time()
         logger.debug("Starting WAN metrics collection")
         
@@ -69,6 +86,13 @@ class Collector(BaseCollector):
         # Store ping metrics in InfluxDB
         self._store_ping_metrics(ping_results)
         
+        # Run the latency probes over each WAN link
+        probe_results = self._run_probes()
+        self._store_probe_metrics(probe_results)
+        
+        # Store this interval's latencies as mergeable histograms
+        self._store_latency_histograms(ping_results, probe_results)
+        
         # In a real implementation, we would also collect additional WAN metrics
         # from the actual devices, like bandwidth usage, connection state, etc.
         
@@ -76,88 +100,12 @@ class Collector(BaseCollector):
         logger.debug(f"Completed WAN metrics collection in {elapsed:.2f} seconds")
     
     def _measure_connectivity(self):
-        """Measure internet connectivity using ping"""
-        results = []
-        
-        for target in self.target_hosts:
-            try:
-                # Use specific inetutils-ping path we found with `which ping`
-                cmd_options = [
-                    ['/nix/store/p83llzv0lwnnblzc7h12dqdr7fmrmlcx-inetutils-2.5/bin/ping', '-c', '5', '-q', target],
-                    ['ping', '-c', '5', '-q', target]
-                ]
-                
-                for cmd in cmd_options:
-                    try:
-                        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                        stdout, stderr = process.communicate()
-                        if process.returncode == 0 or process.returncode == 1:
-                            # Parse ping output
-                            output = stdout.decode('utf-8')
-                            break
-                    except:
-                        continue
-                else:
-                    # All ping commands failed
-                    raise Exception("No working ping command found")
-                
-                # Check if ping was successful
-                if process.returncode == 0:
-                    # Extract packet loss
-                    packet_loss = 100.0
-                    for line in output.split('\n'):
-                        if 'packet loss' in line:
-                            try:
-                                packet_loss = float(line.split('%')[0].split(' ')[-1])
-                            except:
-                                packet_loss = 100.0
-                    
-                    # Extract round-trip times
-                    rtt_min = rtt_avg = rtt_max = rtt_mdev = 0.0
-                    for line in output.split('\n'):
-                        if 'rtt min/avg/max/mdev' in line:
-                            try:
-                                rtt_parts = line.split(' = ')[1].split('/')
-                                rtt_min = float(rtt_parts[0])
-                                rtt_avg = float(rtt_parts[1])
-                                rtt_max = float(rtt_parts[2])
-                                rtt_mdev = float(rtt_parts[3].split(' ')[0])
-                            except:
-                                pass
-                    
-                    results.append({
-                        'target': target,
-                        'success': True,
-                        'packet_loss': packet_loss,
-                        'rtt_min': rtt_min,
-                        'rtt_avg': rtt_avg,
-                        'rtt_max': rtt_max,
-                        'rtt_mdev': rtt_mdev
-                    })
-                else:
-                    # Ping failed
-                    results.append({
-                        'target': target,
-                        'success': False,
-                        'packet_loss': 100.0,
-                        'rtt_min': 0.0,
-                        'rtt_avg': 0.0,
-                        'rtt_max': 0.0,
-                        'rtt_mdev': 0.0
-                    })
-            except Exception as e:
-                logger.error(f"Error pinging {target}: {str(e)}")
-                results.append({
-                    'target': target,
-                    'success': False,
-                    'packet_loss': 100.0,
-                    'rtt_min': 0.0,
-                    'rtt_avg': 0.0,
-                    'rtt_max': 0.0,
-                    'rtt_mdev': 0.0
-                })
-        
-        return results
+        """Measure internet connectivity by pinging all targets concurrently"""
+        try:
+            return self.ping_engine.ping(self.target_hosts)
+        except Exception as e:
+            logger.error(f"Error pinging WAN targets: {str(e)}")
+            return [summarize(target, 0, []) for target in self.target_hosts]
     
     def _store_ping_metrics(self, ping_results):
         """Store ping metrics in InfluxDB"""
@@ -176,13 +124,86 @@ class Collector(BaseCollector):
                     "rtt_min": float(result['rtt_min']),
                     "rtt_avg": float(result['rtt_avg']),
                     "rtt_max": float(result['rtt_max']),
-                    "rtt_mdev": float(result['rtt_mdev'])
+                    "rtt_mdev": float(result['rtt_mdev']),
+                    "jitter": float(result['jitter'])
                 }
             })
         
         self.influx.write_data(data)
         logger.debug(f"Stored WAN connectivity metrics for {len(ping_results)} targets")
     
+    def _run_probes(self):
+        """Run the TCP/HTTP/DNS probes over all WAN links concurrently"""
+        try:
+            return self.probe_runner.run()
+        except Exception as e:
+            logger.error(f"Error running WAN probes: {str(e)}")
+            return []
+    
+    def _store_probe_metrics(self, probe_results):
+        """Store latency probe results in InfluxDB"""
+        data = []
+        
+        for result in probe_results:
+            if not result['success']:
+                logger.debug(f"{result['probe']} probe of {result['target']} over {result['link']} failed: {result['error']}")
+            fields = {
+                "success": 1 if result['success'] else 0,
+                "latency_ms": float(result['latency_ms'])
+            }
+            for field in ('connect_ms', 'tls_ms', 'ttfb_ms'):
+                if field in result:
+                    fields[field] = float(result[field])
+            for field in ('status_code', 'rcode', 'answers'):
+                if field in result:
+                    fields[field] = int(result[field])
+            data.append({
+                "measurement": "wan_probe",
+                "tags": {
+                    "device_id": result['device_id'],
+                    "link": result['link'],
+                    "interface": result['interface'],
+                    "probe": result['probe'],
+                    "target": result['target']
+                },
+                "fields": fields
+            })
+        
+        if data:
+            self.influx.write_data(data)
+            logger.debug(f"Stored {len(data)} WAN probe results")
+    
+    def _store_latency_histograms(self, ping_results, probe_results):
+        """
+        Store one log-linear latency histogram per target and interval
+        
+        Percentiles over any time range or group of targets are computed by
+        summing the bucket counts (see InfluxClient.get_latency_percentiles).
+        """
+        histograms = {}
+        for result in ping_results:
+            if result['rtts']:
+                histograms[(result['target'], 'ping', None)] = LatencyHistogram(result['rtts'])
+        for result in probe_results:
+            if result['success']:
+                key = (result['target'], result['probe'], result['link'])
+                histograms.setdefault(key, LatencyHistogram()).record(result['latency_ms'])
+        
+        data = []
+        for (target, probe, link), histogram in histograms.items():
+            tags = {"target": target, "probe": probe}
+            if link:
+                tags["link"] = link
+            data.append({
+                "measurement": "wan_latency",
+                "tags": tags,
+                "fields": histogram.to_fields()
+            })
+        
+        if data:
+            self.influx.write_data(data)
+            logger.debug(f"Stored {len(data)} WAN latency histograms")
+    
     def _collect_interface_metrics(self):
         """
         Collect interface metrics for WAN interfaces
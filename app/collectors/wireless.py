@@ -6,6 +6,10 @@ import time
 import logging
 from . import BaseCollector
 from utils.influx import InfluxClient
+from utils.inventory import get_inventory
+from utils.streaming import streams, COLLECTOR_PATHS
+from utils.client_tracker import ClientTracker, SIGNAL_BUCKETS, SNR_BUCKETS, PERCENTILES
+from utils.units import parse_number, parse_rate, parse_duration
 
 # Try to import SNMP libraries
 try:
@@ -34,6 +38,8 @@ class Collector(BaseCollector):
         self.interval = 60  # Collect every 60 seconds
         self.devices = []  # Will be populated in initialize()
         self.influx = None
+        # Client state for join/leave/roam events and change-driven writes
+        self.tracker = ClientTracker.from_config(config)
         super().__init__(config)
     
     def initialize(self):
@@ -48,20 +54,12 @@ class Collector(BaseCollector):
             bucket=influx_config.get('bucket', 'my-bucket')
         )
         
-        # Load device list (in a real application, this would come from a database)
-        # For demo purposes, we'll hardcode a test device
-        self.devices = [
-            {
-                'id': 'mikrotik1',
-                'name': 'Main Router',
-                'host': '192.168.1.1',
-                'type': 'mikrotik',
-                'snmp_community': 'public',
-                'api_user': 'admin',
-                'api_password': 'password',
-                'use_api': HAVE_ROUTEROS
-            }
-        ]
+        # Load the devices (and the tables to poll on each) from the inventory
+        self.devices = get_inventory(self.config).plan('wireless')
+        
+        # Record clients joining and leaving as they happen when streaming
+        if streams.enabled:
+            streams.add_listener('/interface/wireless/registration-table', self._on_registration_change)
         
         logger.info(f"Initialized wireless collector with {len(self.devices)} devices")
     
@@ -70,47 +68,62 @@ class Collector(BaseCollector):
         start_time = time.time()
         logger.debug("Starting wireless metrics collection")
         
-        for device in self.devices:
-            try:
-                # Check if we're in demo mode or can't reach the device
-                if device.get('demo_mode', False) or not self._can_connect(device['host']):
-                    logger.info(f"Using demo data for wireless device {device['id']} (host: {device['host']})")
-                    self._collect_demo_data(device)
-                elif device.get('type') == 'mikrotik':
-                    if device.get('use_api', False) and HAVE_ROUTEROS:
-                        self._collect_mikrotik_api(device)
-                    elif HAVE_SNMP:
-                        self._collect_mikrotik_snmp(device)
-                    else:
-                        logger.warning(f"No collection method available for device {device['id']}")
-                # Add support for other device types as needed
-            except Exception as e:
-                logger.error(f"Error collecting wireless metrics for device {device['id']}: {str(e)}")
-                # Fallback to demo data on error
+        for device in self.due_devices():
+            with self.device_timer(device):
                 try:
-                    logger.info(f"Falling back to demo data for wireless device {device['id']}")
-                    self._collect_demo_data(device)
-                except Exception as demo_error:
-                    logger.error(f"Error generating wireless demo data: {str(demo_error)}")
+                    # Check if we're in demo mode or can't reach the device
+                    if device.get('demo_mode', False) or not self._can_connect(device['host'], self.probe_port(device)):
+                        logger.info(f"Using demo data for wireless device {device['id']} (host: {device['host']})")
+                        self.record_demo_fallback(device)
+                        self._collect_demo_data(device)
+                    elif device.get('type') == 'mikrotik':
+                        if device.get('use_api', False) and HAVE_ROUTEROS:
+                            self._collect_mikrotik_api(device)
+                        elif HAVE_SNMP:
+                            self._collect_mikrotik_snmp(device)
+                        else:
+                            logger.warning(f"No collection method available for device {device['id']}")
+                    # Add support for other device types as needed
+                except Exception as e:
+                    self.record_device_error(device)
+                    logger.error(f"Error collecting wireless metrics for device {device['id']}: {str(e)}")
+                    # Fallback to demo data on error
+                    try:
+                        logger.info(f"Falling back to demo data for wireless device {device['id']}")
+                        self.record_demo_fallback(device)
+                        self._collect_demo_data(device)
+                    except Exception as demo_error:
+                        logger.error(f"Error generating wireless demo data: {str(demo_error)}")
         
         elapsed = time.time() - start_time
         logger.debug(f"Completed wireless metrics collection in {elapsed:.2f} seconds")
     
     def _collect_mikrotik_api(self, device):
         """Collect wireless metrics using MikroTik API"""
+        api = None
         try:
-            # Connect to RouterOS API
-            api = librouteros.connect(
-                host=device['host'],
-                username=device['api_user'],
-                password=device['api_password']
-            )
+            # Read the streamed mirror of the tables if it is in sync
+            paths = COLLECTOR_PATHS['wireless']
+            wireless_interfaces = streams.rows(device, '/interface/wireless', paths)
+            wireless_registrations = streams.rows(device, '/interface/wireless/registration-table', paths)
             
-            # Collect wireless interfaces
-            wireless_interfaces = api.path('/interface/wireless').get()
-            
-            # Collect wireless registration table (connected clients)
-            wireless_registrations = api.path('/interface/wireless/registration-table').get()
+            if wireless_interfaces is None or wireless_registrations is None:
+                # Connect to RouterOS API
+                with self.roundtrip_timer('api', device):
+                    api = librouteros.connect(
+                        host=device['host'],
+                        username=device['api_user'],
+                        password=device['api_password'],
+                        port=device.get('api_port', 8728)
+                    )
+                
+                # Collect wireless interfaces
+                with self.roundtrip_timer('api', device):
+                    wireless_interfaces = tuple(api.path('/interface/wireless'))
+                
+                # Collect wireless registration table (connected clients)
+                with self.roundtrip_timer('api', device):
+                    wireless_registrations = tuple(api.path('/interface/wireless/registration-table'))
             
             # Process wireless interfaces
             interface_metrics = []
@@ -119,34 +132,55 @@ class Collector(BaseCollector):
                     'name': iface.get('name', 'unknown'),
                     'mac_address': iface.get('mac-address', ''),
                     'ssid': iface.get('ssid', ''),
-                    'frequency': int(iface.get('frequency', 0)),
+                    'frequency': int(parse_number(iface.get('frequency', 0))),
                     'band': iface.get('band', ''),
                     'channel_width': iface.get('channel-width', ''),
                     'mode': iface.get('mode', ''),
-                    'tx_power': int(iface.get('tx-power', 0)),
+                    'tx_power': int(parse_number(iface.get('tx-power', 0))),
                     'status': iface.get('running', False)
                 })
             
             # Process wireless clients
-            client_metrics = []
-            for client in wireless_registrations:
-                client_metrics.append({
-                    'mac_address': client.get('mac-address', ''),
-                    'interface': client.get('interface', ''),
-                    'signal_strength': int(client.get('signal-strength', 0)),
-                    'signal_to_noise': int(client.get('signal-to-noise', 0)),
-                    'tx_rate': int(client.get('tx-rate', 0)),
-                    'rx_rate': int(client.get('rx-rate', 0)),
-                    'uptime': client.get('uptime', '')
-                })
+            client_metrics = [self._client_metrics(client) for client in wireless_registrations]
             
             # Store metrics in InfluxDB
             self._store_interface_metrics(device, interface_metrics)
-            self._store_client_metrics(device, client_metrics)
+            self._store_client_metrics(device, client_metrics, [iface['name'] for iface in interface_metrics])
             
         except Exception as e:
             logger.error(f"API collection error for device {device['id']}: {str(e)}")
             raise
+        finally:
+            if api is not None:
+                api.close()
+    
+    def _client_metrics(self, client):
+        """Convert a registration-table row into client metrics"""
+        return {
+            'mac_address': client.get('mac-address', ''),
+            'interface': client.get('interface', ''),
+            'signal_strength': int(parse_number(client.get('signal-strength', 0))),
+            'signal_to_noise': int(parse_number(client.get('signal-to-noise', 0))),
+            # Rates are reported as e.g. "144.4Mbps-20MHz/2S"; stored in kbps
+            'tx_rate': int(parse_rate(client.get('tx-rate', 0)) / 1000),
+            'rx_rate': int(parse_rate(client.get('rx-rate', 0)) / 1000),
+            'uptime': client.get('uptime', '')
+        }
+    
+    def _on_registration_change(self, device, event, row, previous):
+        """Track a streamed registration-table change and write its event right away"""
+        if event == 'remove':
+            change = self.tracker.remove(device['id'], row.get('mac-address', ''))
+            if change:
+                self._store_events(device, [change])
+            return
+        
+        client = self._client_metrics(row)
+        change, write = self.tracker.observe(device['id'], client)
+        if change:
+            self._store_events(device, [change])
+        if write:
+            self.influx.write_data(self._client_point(device, client))
     
     def _collect_mikrotik_snmp(self, device):
         """Collect wireless metrics using SNMP"""
@@ -187,7 +221,7 @@ class Collector(BaseCollector):
             
             # Store metrics in InfluxDB
             self._store_interface_metrics(device, interface_metrics)
-            self._store_client_metrics(device, client_metrics)
+            self._store_client_metrics(device, client_metrics, [iface['name'] for iface in interface_metrics])
             
         except Exception as e:
             logger.error(f"SNMP collection error for device {device['id']}: {str(e)}")
@@ -219,57 +253,111 @@ class Collector(BaseCollector):
         self.influx.write_data(data)
         logger.debug(f"Stored wireless interface metrics for device {device['id']}")
     
-    def _store_client_metrics(self, device, clients):
-        """Store wireless client metrics in InfluxDB"""
-        data = []
+    def _client_point(self, device, client):
+        """Build the wireless_client point of one client"""
+        return {
+            "measurement": "wireless_client",
+            "tags": {
+                "device_id": device['id'],
+                "device_name": device['name'],
+                "interface": client['interface'],
+                "mac_address": client['mac_address']
+            },
+            "fields": {
+                "signal_strength": float(client['signal_strength']),
+                "signal_to_noise": float(client['signal_to_noise']),
+                "tx_rate": float(client['tx_rate']),
+                "rx_rate": float(client['rx_rate']),
+                "uptime_seconds": float(parse_duration(client.get('uptime', 0)))
+            }
+        }
+    
+    def _store_client_metrics(self, device, clients, interfaces=()):
+        """
+        Store wireless client metrics in InfluxDB
         
-        for client in clients:
-            # Convert string uptime to seconds if possible
-            uptime_sec = 0
-            uptime = client.get('uptime', '')
-            if isinstance(uptime, str):
-                try:
-                    # Parse uptime string like "1h23m45s"
-                    hours = minutes = seconds = 0
-                    if 'h' in uptime:
-                        hours, uptime = uptime.split('h', 1)
-                        hours = int(hours)
-                    if 'm' in uptime:
-                        minutes, uptime = uptime.split('m', 1)
-                        minutes = int(minutes)
-                    if 's' in uptime:
-                        seconds = int(uptime.replace('s', ''))
-                    uptime_sec = hours * 3600 + minutes * 60 + seconds
-                except:
-                    uptime_sec = 0
-            
+        Full per-client points are only written for new, roamed or changed
+        clients (and every client at the tracker's slower full cadence);
+        per-interface aggregates and join/leave/roam events are written
+        every cycle.
+        
+        Args:
+            device: Device dictionary
+            clients: List of client metrics from the registration table
+            interfaces: Wireless interface names (reported with 0 clients if empty)
+        """
+        events, changed = self.tracker.update(device['id'], clients)
+        data = [self._client_point(device, client) for client in changed]
+        
+        # Per-interface distributions, so dashboards do not aggregate per-client series
+        summary = self.tracker.interface_summary(device['id'])
+        for name in interfaces:
+            summary.setdefault(name, {'clients': 0, 'signal_avg': 0.0, 'snr_avg': 0.0, 'signal_buckets': {},
+                                      'snr_buckets': {}, 'tx_rate': {}, 'rx_rate': {}})
+        for name, entry in summary.items():
+            fields = {
+                "clients": entry['clients'],
+                "signal_avg": float(entry['signal_avg']),
+                "snr_avg": float(entry['snr_avg'])
+            }
+            for _, label in SIGNAL_BUCKETS:
+                fields[f"signal_{label}"] = entry['signal_buckets'].get(label, 0)
+            for _, label in SNR_BUCKETS:
+                fields[f"snr_{label}"] = entry['snr_buckets'].get(label, 0)
+            for q in PERCENTILES:
+                fields[f"tx_rate_p{q}"] = float(entry['tx_rate'].get(q, 0.0))
+                fields[f"rx_rate_p{q}"] = float(entry['rx_rate'].get(q, 0.0))
             data.append({
-                "measurement": "wireless_client",
+                "measurement": "wireless_interface_clients",
                 "tags": {
                     "device_id": device['id'],
                     "device_name": device['name'],
-                    "interface": client['interface'],
-                    "mac_address": client['mac_address']
+                    "interface": name
                 },
-                "fields": {
-                    "signal_strength": float(client['signal_strength']),
-                    "signal_to_noise": float(client['signal_to_noise']),
-                    "tx_rate": float(client['tx_rate']),
-                    "rx_rate": float(client['rx_rate']),
-                    "uptime_seconds": float(uptime_sec)
-                }
+                "fields": fields
             })
         
         self.influx.write_data(data)
-        logger.debug(f"Stored wireless client metrics for device {device['id']}")
+        self._store_events(device, events)
+        self.observe_series(device, 'clients', len(clients))
+        if clients:
+            self.observe_series(device, 'signal_strength',
+                                sum(float(client['signal_strength']) for client in clients) / len(clients))
+        logger.debug(f"Stored wireless client metrics for device {device['id']} "
+                     f"({len(changed)} of {len(clients)} clients written, {len(events)} events)")
+    
+    def _store_events(self, device, events):
+        """Store client join/leave/roam events in InfluxDB"""
+        data = []
+        for event in events:
+            fields = {
+                "value": 1,
+                "signal_strength": float(event['signal_strength'])
+            }
+            if event['event'] == 'roam':
+                fields['from_device'] = event['from_device']
+                fields['from_interface'] = event['from_interface']
+            elif event['event'] == 'leave':
+                fields['connected_seconds'] = float(event['connected_seconds'])
+            data.append({
+                "measurement": "wireless_event",
+                "tags": {
+                    "device_id": device['id'],
+                    "device_name": device['name'],
+                    "interface": event['interface'],
+                    "mac_address": event['mac_address'],
+                    "event": event['event']
+                },
+                "fields": fields
+            })
+        if data:
+            self.influx.write_data(data)
         
     def _can_connect(self, host, port=22, timeout=1):
         """Check if we can connect to the host"""
         import socket
         try:
-            socket.setdefaulttimeout(timeout)
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((host, port))
+            s = socket.create_connection((host, port), timeout=timeout)
             s.close()
             return True
         except Exception:
@@ -314,11 +402,10 @@ class Collector(BaseCollector):
         # More clients during business hours (8-18)
         client_count = 3 if 8 <= hour_of_day <= 18 else 1
         
-        # Generate random client MAC addresses
+        # Generate client MAC addresses (stable per device so the tracker sees the same clients)
         client_macs = [
-            f"{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:" +
-            f"{random.randint(0, 255):02x}:{random.randint(0, 255):02x}:{random.randint(0, 255):02x}"
-            for _ in range(client_count)
+            ':'.join(f"{byte:02x}" for byte in random.Random(f"{device['id']}-{i}").randbytes(6))
+            for i in range(client_count)
         ]
         
         # Generate simulated wireless clients
@@ -357,6 +444,6 @@ class Collector(BaseCollector):
         
         # Store the simulated metrics
         self._store_interface_metrics(device, interface_metrics)
-        self._store_client_metrics(device, client_metrics)
+        self._store_client_metrics(device, client_metrics, [iface['name'] for iface in interface_metrics])
         
         logger.debug(f"Generated and stored demo wireless data for device {device['id']}")
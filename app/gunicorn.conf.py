@@ -0,0 +1,14 @@
+"""
+gunicorn settings for wsgi:api and wsgi:web, taken from the `serving` and
+`api` sections of config.yaml
+
+Send SIGHUP to the master process to reload workers gracefully.
+"""
+from main import load_config
+from utils.serving import gunicorn_options
+
+_config = load_config() or {}
+_api_config = _config.get('api', {})
+
+for _name, _value in gunicorn_options(_config, _api_config.get('host', '0.0.0.0'), _api_config.get('port', 8000)).items():
+    globals()[_name] = _value
@@ -9,6 +9,11 @@ import sys
 import time
 import threading
 import yaml
+from utils.profiling import profiler
+from utils.sharding import sharding
+from utils.streaming import streams
+from utils.supervisor import supervisor
+from utils.scheduler import configure_budget
 
 # Configure logging
 logging.basicConfig(
@@ -92,33 +97,79 @@ def initialize_collectors(config):
     
     return collectors
 
+def run_cycle(collector):
+    """Run one collector cycle, profiled if profiling is armed"""
+    if profiler.active:
+        profiler.run(collector.name, collector.run_cycle)
+    else:
+        collector.run_cycle()
+
 def run_collector(collector):
-    """Run a collector in a loop"""
-    while True:
-        try:
-            collector.collect()
-            # Wait for the next interval
-            time.sleep(60)  # Default 1-minute interval
-        except Exception as e:
-            logger.error(f"Error in collector {collector.__class__.__name__}: {str(e)}")
-            time.sleep(10)  # Wait a bit before retrying
+    """Run a collector in a loop under the supervisor (timeouts, backoff, quarantine)"""
+    supervisor.run(collector, cycle=lambda: run_cycle(collector))
+
+def start_collector(collector):
+    """Start a collector in a separate thread"""
+    thread = threading.Thread(
+        target=run_collector,
+        args=(collector,),
+        name=f"collector-{collector.__class__.__name__}"
+    )
+    thread.daemon = True
+    thread.start()
+    logger.info(f"Started collector: {collector.__class__.__name__}")
+    return thread
 
 def start_collectors(collectors):
     """Start all collectors in separate threads"""
-    threads = []
+    return {collector: start_collector(collector) for collector in collectors}
+
+def create_influx_client(config):
+    """Create an InfluxDB client from the configuration"""
+    from utils.influx import InfluxClient
     
-    for collector in collectors:
-        thread = threading.Thread(
-            target=run_collector,
-            args=(collector,),
-            name=f"collector-{collector.__class__.__name__}"
-        )
-        thread.daemon = True
-        thread.start()
-        threads.append(thread)
-        logger.info(f"Started collector: {collector.__class__.__name__}")
-    
-    return threads
+    influx_config = config.get('influxdb', {})
+    return InfluxClient(
+        host=influx_config.get('host', 'localhost'),
+        port=influx_config.get('port', 8086),
+        token=influx_config.get('token', 'YM_NhDux0lCLYdPjyypSDQzAtATgFUh3x38CPDB34CzW51AXE1H2Zj9Gvqh7OhzWm9tF6jFKBcdNS4jn72FgFw=='),
+        org=influx_config.get('org', 'my-org'),
+        bucket=influx_config.get('bucket', 'my-bucket')
+    )
+
+def create_telemetry_writer(config):
+    """Configure collector self-telemetry and return the client used to flush it"""
+    from utils.telemetry import telemetry
+    
+    telemetry.configure(config)
+    if not telemetry.enabled:
+        return None
+    
+    return create_influx_client(config)
+
+def start_worker_pool(config):
+    """Start collectors in worker processes writing through this process"""
+    from utils.workers import WorkerPool
+    
+    pool = WorkerPool(config, create_influx_client(config))
+    pool.start()
+    return pool
+
+def start_embedded_api(config):
+    """Start the API server inside the collector process, if enabled"""
+    if not config.get('api', {}).get('embedded', False):
+        return None
+    
+    from api import start_api_server
+    thread = threading.Thread(
+        target=start_api_server,
+        args=(config,),
+        name="api-server"
+    )
+    thread.daemon = True
+    thread.start()
+    logger.info("Started embedded API server")
+    return thread
 
 def main():
     """Main application entry point"""
@@ -130,28 +181,75 @@ def main():
         logger.error("Failed to load configuration, exiting.")
         return 1
     
+    worker_pool = None
     try:
-        # Initialize collectors
-        collectors = initialize_collectors(config)
+        # Enable cycle profiling from config or on signal
+        profiler.configure(config)
+        
+        # Set up self-telemetry before collectors start recording
+        telemetry_writer = create_telemetry_writer(config)
+        
+        # Supervise collectors (cycle timeouts, restart backoff, device quarantine)
+        supervisor.configure(config)
+        configure_budget(config)
+        status_writer = telemetry_writer or create_influx_client(config)
+        
+        # Join the shard membership so collectors only poll their slice of devices
+        sharding.configure(config)
+        sharding.start()
         
-        # Start collectors
-        collector_threads = start_collectors(collectors)
+        # Mirror fast-changing RouterOS tables with listen streams
+        streams.configure(config)
+        
+        # Run collectors as threads in this process, or as worker processes
+        # so CPU-heavy collection is not serialized by the GIL
+        collector_threads = {}
+        if config.get('runtime', {}).get('mode', 'threads') == 'processes':
+            worker_pool = start_worker_pool(config)
+        else:
+            # Initialize collectors
+            collectors = initialize_collectors(config)
+            
+            # Start collectors
+            collector_threads = start_collectors(collectors)
+        
+        # Serve the API (including /metrics) from the collector process so it
+        # can read the in-memory snapshot of the latest values
+        start_embedded_api(config)
         
         # Keep the main thread alive
         while True:
-            # Check if all collector threads are alive
-            for thread in collector_threads:
+            # Restart collector threads that died outside the supervised loop
+            for collector, thread in list(collector_threads.items()):
                 if not thread.is_alive():
                     logger.warning(f"Collector thread {thread.name} died, restarting...")
-                    # TODO: Implement proper restart mechanism
+                    supervisor.register(collector.name).restarts += 1
+                    collector_threads[collector] = start_collector(collector)
+            
+            # Restart worker processes that have exited (with backoff)
+            if worker_pool:
+                worker_pool.check()
+            
+            # Write collector self-telemetry and states to InfluxDB
+            if telemetry_writer:
+                from utils.telemetry import telemetry
+                telemetry.flush(telemetry_writer)
+            supervisor.publish(status_writer)
             
-            time.sleep(60)
+            time.sleep(5)
             
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt, shutting down...")
     except Exception as e:
         logger.error(f"An error occurred: {str(e)}")
         return 1
+    finally:
+        supervisor.stop()
+        if worker_pool:
+            worker_pool.stop()
+        streams.stop()
+        # Hand our devices over to the remaining instances right away
+        sharding.stop()
     
     return 0
 
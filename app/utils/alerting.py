@@ -9,6 +9,8 @@ import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from utils.influx import InfluxClient
+from utils.livefeed import livefeed
+from utils.versions import versions
 
 # Configure logging
 logger = logging.getLogger("utils.alerting")
@@ -59,9 +61,11 @@ def send_alert(alert_type, message, device_id, value, threshold, resource=None):
             'first_time': datetime.datetime.utcnow(),
             'last_time': datetime.datetime.utcnow()
         }
+        livefeed.publish_alert('firing', active_alerts[alert_id])
     
     # Log the alert
     logger.warning(f"ALERT: {message}")
+    versions.bump('alert_state')
     
     # Store in InfluxDB
     store_alert(alert_id, alert_type, device_id, message, value, threshold, resource)
@@ -81,7 +85,8 @@ def clear_alert(alert_id):
         store_alert_clear(alert_id)
         
         # Remove from active alerts
-        del active_alerts[alert_id]
+        livefeed.publish_alert('resolved', active_alerts.pop(alert_id))
+        versions.bump('alert_state')
         logger.info(f"Cleared alert {alert_id}")
 
 def store_alert(alert_id, alert_type, device_id, message, value, threshold, resource=None):
@@ -0,0 +1,298 @@
+"""
+Wireless client tracking
+Keeps compact per-client state keyed by MAC address, turns successive
+registration tables into join/leave/roam events and decides which clients
+need their full metrics written this cycle
+"""
+import time
+import logging
+import threading
+from utils.units import parse_duration
+
+# Configure logging
+logger = logging.getLogger("utils.client_tracker")
+
+# Signal strength buckets (dBm lower bound, label) for per-interface aggregates
+SIGNAL_BUCKETS = (
+    (-50, 'excellent'),
+    (-60, 'good'),
+    (-70, 'fair'),
+    (-80, 'weak'),
+    (None, 'poor')
+)
+
+# Signal-to-noise buckets (dB lower bound, label)
+SNR_BUCKETS = (
+    (40, 'excellent'),
+    (25, 'good'),
+    (15, 'fair'),
+    (10, 'weak'),
+    (None, 'poor')
+)
+
+# Rate percentiles stored per interface
+PERCENTILES = (50, 90, 99)
+
+
+def bucket_label(buckets, value):
+    """Return the label of the first bucket whose lower bound a value reaches"""
+    for bound, label in buckets:
+        if bound is None or value >= bound:
+            return label
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile
+
+    Args:
+        values: Sorted list of values
+        q: Percentile (0-100)
+
+    Returns:
+        Percentile value, or 0.0 for an empty list
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-q * len(values) // 100))
+    return values[min(rank, len(values)) - 1]
+
+
+class ClientState:
+    """Last known state of one wireless client"""
+
+    __slots__ = ('device_id', 'interface', 'signal_strength', 'signal_to_noise',
+                 'tx_rate', 'rx_rate', 'uptime', 'first_seen', 'last_seen', 'last_written',
+                 'written_signal', 'written_tx_rate', 'written_rx_rate')
+
+    def __init__(self, device_id, interface, now):
+        self.device_id = device_id
+        self.interface = interface
+        self.signal_strength = 0.0
+        self.signal_to_noise = 0.0
+        self.tx_rate = 0.0
+        self.rx_rate = 0.0
+        self.uptime = 0.0
+        self.first_seen = now
+        self.last_seen = now
+        self.last_written = 0.0
+        # Values of the last full write, so slow drift also triggers a write
+        self.written_signal = 0.0
+        self.written_tx_rate = 0.0
+        self.written_rx_rate = 0.0
+
+
+class ClientTracker:
+    """
+    Wireless clients of all devices polled by a collector
+
+    update() compares a device's registration table with the previous one and
+    returns the events (join, leave, roam between interfaces or devices) and
+    the clients whose full metrics should be written: new or roamed clients,
+    clients whose signal or rates changed noticeably, and every client once
+    per full_interval.
+    """
+
+    def __init__(self, full_interval=300, signal_delta=5, rate_delta=0.5, roam_window=60):
+        """
+        Args:
+            full_interval: Seconds between full writes of an unchanged client
+            signal_delta: Signal strength change (dB) that triggers a write
+            rate_delta: Relative tx/rx rate change that triggers a write
+            roam_window: Seconds within which a client leaving one device and
+                joining another counts as a roam
+        """
+        self.full_interval = full_interval
+        self.signal_delta = signal_delta
+        self.rate_delta = rate_delta
+        self.roam_window = roam_window
+        self.clients = {}  # MAC -> ClientState
+        self.device_clients = {}  # device id -> set of MACs
+        self._departed = {}  # MAC -> (device id, interface, time) of recent leaves
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a tracker from the `wireless` config section"""
+        wireless_config = config.get('wireless', {})
+        return cls(
+            full_interval=wireless_config.get('client_full_interval', 300),
+            signal_delta=wireless_config.get('client_signal_delta', 5),
+            rate_delta=wireless_config.get('client_rate_delta', 0.5),
+            roam_window=wireless_config.get('roam_window', 60)
+        )
+
+    def _changed(self, state, client):
+        """Return True if a client moved away from its last written values"""
+        if abs(state.written_signal - client['signal_strength']) >= self.signal_delta:
+            return True
+        for field, written in (('tx_rate', state.written_tx_rate), ('rx_rate', state.written_rx_rate)):
+            if abs(client[field] - written) > self.rate_delta * max(written, 1.0):
+                return True
+        return False
+
+    def observe(self, device_id, client, now=None):
+        """
+        Record one client seen on a device
+
+        Args:
+            device_id: Device ID
+            client: Client metrics (mac_address, interface, signal_strength,
+                signal_to_noise, tx_rate, rx_rate, uptime)
+            now: Current time (default time.time())
+
+        Returns:
+            Tuple of (event or None, True if the full metrics should be written)
+        """
+        now = time.time() if now is None else now
+        mac = client['mac_address']
+        with self._lock:
+            state = self.clients.get(mac)
+            event = None
+            write = False
+
+            if state is None:
+                state = self.clients[mac] = ClientState(device_id, client['interface'], now)
+                departed = self._departed.pop(mac, None)
+                if departed and now - departed[2] <= self.roam_window:
+                    event = {'event': 'roam', 'from_device': departed[0], 'from_interface': departed[1]}
+                else:
+                    event = {'event': 'join'}
+                write = True
+            elif state.device_id != device_id or state.interface != client['interface']:
+                event = {'event': 'roam', 'from_device': state.device_id, 'from_interface': state.interface}
+                self.device_clients.get(state.device_id, set()).discard(mac)
+                state.device_id = device_id
+                state.interface = client['interface']
+                write = True
+            else:
+                write = now - state.last_written >= self.full_interval or self._changed(state, client)
+
+            self.device_clients.setdefault(device_id, set()).add(mac)
+            state.signal_strength = client['signal_strength']
+            state.signal_to_noise = client['signal_to_noise']
+            state.tx_rate = client['tx_rate']
+            state.rx_rate = client['rx_rate']
+            state.uptime = parse_duration(client.get('uptime', 0))
+            state.last_seen = now
+            if write:
+                state.last_written = now
+                state.written_signal = client['signal_strength']
+                state.written_tx_rate = client['tx_rate']
+                state.written_rx_rate = client['rx_rate']
+
+        if event:
+            event.update(mac_address=mac, interface=client['interface'], signal_strength=client['signal_strength'])
+        return event, write
+
+    def remove(self, device_id, mac, now=None):
+        """
+        Record a client leaving a device
+
+        Returns:
+            Leave event, or None if the client was not known on the device
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self.clients.get(mac)
+            if state is None or state.device_id != device_id:
+                return None
+            del self.clients[mac]
+            self.device_clients.get(device_id, set()).discard(mac)
+            self._departed[mac] = (device_id, state.interface, now)
+        return {
+            'event': 'leave',
+            'mac_address': mac,
+            'interface': state.interface,
+            'signal_strength': state.signal_strength,
+            'connected_seconds': round(now - state.first_seen, 1)
+        }
+
+    def update(self, device_id, clients, now=None):
+        """
+        Compare a device's full registration table with its previous one
+
+        Args:
+            device_id: Device ID
+            clients: List of client metrics dictionaries
+            now: Current time (default time.time())
+
+        Returns:
+            Tuple of (list of events, list of clients to write in full)
+        """
+        now = time.time() if now is None else now
+        # The first table of a device is a baseline, not a wave of joins
+        with self._lock:
+            baseline = device_id not in self.device_clients
+        events = []
+        to_write = []
+        seen = set()
+        for client in clients:
+            seen.add(client['mac_address'])
+            event, write = self.observe(device_id, client, now)
+            if event and not (baseline and event['event'] == 'join'):
+                events.append(event)
+            if write:
+                to_write.append(client)
+
+        # Stream callbacks change the client sets from another thread, so
+        # take the departed clients under the lock before removing them
+        with self._lock:
+            departed = self.device_clients.setdefault(device_id, set()) - seen
+        for mac in departed:
+            event = self.remove(device_id, mac, now)
+            if event:
+                events.append(event)
+
+        self._prune(now)
+        return events, to_write
+
+    def _prune(self, now):
+        """Forget departed clients that can no longer roam"""
+        with self._lock:
+            expired = [mac for mac, departed in self._departed.items() if now - departed[2] > self.roam_window]
+            for mac in expired:
+                del self._departed[mac]
+
+    def interface_summary(self, device_id):
+        """
+        Aggregate the clients of a device per interface
+
+        Returns:
+            Dictionary of interface -> {'clients', 'signal_avg', 'snr_avg',
+            'signal_buckets', 'snr_buckets', 'tx_rate', 'rx_rate'} where the
+            bucket entries map bucket labels to client counts and the rate
+            entries map PERCENTILES to rates
+        """
+        samples = {}
+        with self._lock:
+            for mac in self.device_clients.get(device_id, ()):
+                state = self.clients[mac]
+                entry = samples.get(state.interface)
+                if entry is None:
+                    entry = samples[state.interface] = ([], [], [], [])
+                entry[0].append(state.signal_strength)
+                entry[1].append(state.signal_to_noise)
+                entry[2].append(state.tx_rate)
+                entry[3].append(state.rx_rate)
+
+        summary = {}
+        for interface, (signals, snrs, tx_rates, rx_rates) in samples.items():
+            signal_buckets = {label: 0 for _, label in SIGNAL_BUCKETS}
+            for signal in signals:
+                signal_buckets[bucket_label(SIGNAL_BUCKETS, signal)] += 1
+            snr_buckets = {label: 0 for _, label in SNR_BUCKETS}
+            for snr in snrs:
+                snr_buckets[bucket_label(SNR_BUCKETS, snr)] += 1
+            tx_rates.sort()
+            rx_rates.sort()
+            summary[interface] = {
+                'clients': len(signals),
+                'signal_avg': sum(signals) / len(signals),
+                'snr_avg': sum(snrs) / len(snrs),
+                'signal_buckets': signal_buckets,
+                'snr_buckets': snr_buckets,
+                'tx_rate': {q: percentile(tx_rates, q) for q in PERCENTILES},
+                'rx_rate': {q: percentile(rx_rates, q) for q in PERCENTILES}
+            }
+        return summary
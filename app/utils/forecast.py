@@ -0,0 +1,288 @@
+"""
+Capacity forecasting for the Network Monitoring System
+Fits rolling trends on usage series and predicts time-to-threshold
+"""
+import time
+import logging
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger("utils.forecast")
+
+# Value stored for seconds_to_threshold when the series is not heading towards
+# its threshold (flat or decreasing trend)
+NO_FORECAST = -1.0
+
+# Downsampled InfluxDB source of each metric in batch mode:
+# metric -> (measurement, field, device tag, resource tag)
+BATCH_SOURCES = {
+    'disk': ('disk_metrics', 'percent', 'hostname', 'mountpoint'),
+    'memory': ('memory_metrics', 'percent', 'hostname', None),
+    'router_memory': ('system_metrics', 'memory_usage', 'device_id', None),
+    'interface_rx': ('interface_metrics', 'rx_bytes', 'device_id', 'interface'),
+    'interface_tx': ('interface_metrics', 'tx_bytes', 'device_id', 'interface')
+}
+
+
+class TrendSeries:
+    """
+    Rolling window of (timestamp, value) samples for a single series
+
+    Keeps running sums so a least-squares fit over the window costs O(1)
+    per sample; the robust (Theil-Sen) fit is only computed on demand.
+    """
+
+    __slots__ = ('samples', 'origin', 'sum_t', 'sum_v', 'sum_tt', 'sum_tv', 'updated')
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.origin = None
+        self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+        self.updated = False
+
+    def add(self, timestamp, value):
+        """Add a sample, evicting the oldest one once the window is full"""
+        if self.origin is None:
+            self.origin = timestamp
+        t = timestamp - self.origin
+
+        if len(self.samples) == self.samples.maxlen:
+            old_t, old_v = self.samples[0]
+            self.sum_t -= old_t
+            self.sum_v -= old_v
+            self.sum_tt -= old_t * old_t
+            self.sum_tv -= old_t * old_v
+
+        self.samples.append((t, value))
+        self.sum_t += t
+        self.sum_v += value
+        self.sum_tt += t * t
+        self.sum_tv += t * value
+        self.updated = True
+
+    def linear_slope(self):
+        """Least-squares slope in units per second"""
+        n = len(self.samples)
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if n < 2 or denominator <= 0:
+            return 0.0
+        return (n * self.sum_tv - self.sum_t * self.sum_v) / denominator
+
+    def robust_slope(self):
+        """Theil-Sen slope (median of pairwise slopes) in units per second"""
+        points = list(self.samples)
+        slopes = []
+        for i in range(len(points)):
+            t1, v1 = points[i]
+            for t2, v2 in points[i + 1:]:
+                if t2 != t1:
+                    slopes.append((v2 - v1) / (t2 - t1))
+        if not slopes:
+            return 0.0
+        slopes.sort()
+        middle = len(slopes) // 2
+        if len(slopes) % 2:
+            return slopes[middle]
+        return (slopes[middle - 1] + slopes[middle]) / 2
+
+
+class CapacityForecaster:
+    """
+    Incremental time-to-threshold forecaster
+
+    Series are identified by a (metric, device_id, resource) key and are fed
+    from the collector sample stream, or in bulk from downsampled InfluxDB
+    data when running in batch mode.
+    """
+
+    def __init__(self, config, influx, metrics=None):
+        """
+        Initialize the forecaster
+
+        Args:
+            config: Application configuration
+            influx: InfluxClient used to publish forecasts and read batch data
+            metrics: Metrics fed by the owning collector; batch mode only
+                loads these, so two collectors never forecast the same series
+        """
+        forecast_config = config.get('forecasting', {})
+        self.enabled = forecast_config.get('enabled', True)
+        self.mode = forecast_config.get('mode', 'incremental')
+        self.method = forecast_config.get('method', 'linear')
+        self.window = forecast_config.get('window', 60)
+        self.min_samples = forecast_config.get('min_samples', 5)
+        self.alert_horizon = forecast_config.get('alert_horizon_hours', 24) * 3600
+        self.batch_interval = forecast_config.get('batch_interval', 900)
+        self.batch_range = forecast_config.get('batch_range', '-7d')
+        self.batch_every = forecast_config.get('batch_every', '15m')
+        # Default to the alerting thresholds so forecasts predict when an
+        # alert will fire; interface series are only forecast when configured
+        alert_thresholds = config.get('alerting', {}).get('threshold', {})
+        self.thresholds = forecast_config.get('thresholds', {
+            'disk': alert_thresholds.get('disk', 90),
+            'memory': alert_thresholds.get('memory', 85),
+            'router_memory': alert_thresholds.get('memory', 85)
+        })
+        self.metrics = tuple(metrics) if metrics is not None else tuple(BATCH_SOURCES)
+        self.influx = influx
+        self.series = {}
+        self.last_batch = 0
+
+    def threshold_for(self, metric):
+        """Return the configured threshold for a metric, or None if disabled"""
+        return self.thresholds.get(metric)
+
+    def observe(self, metric, device_id, value, resource='none', timestamp=None):
+        """
+        Feed a sample into the forecaster
+
+        Args:
+            metric: Metric name (disk, memory, router_memory, interface_rx, ...)
+            device_id: ID of the device or host the sample belongs to
+            value: Sample value
+            resource: Optional resource name (mountpoint, interface name)
+            timestamp: Sample time in seconds, defaults to now
+        """
+        if not self.enabled or self.mode != 'incremental' or self.threshold_for(metric) is None:
+            return
+
+        key = (metric, device_id, resource)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = TrendSeries(self.window)
+        series.add(timestamp if timestamp is not None else time.time(), float(value))
+
+    def forecast(self, key):
+        """
+        Compute the forecast for a single series
+
+        Args:
+            key: (metric, device_id, resource) tuple
+
+        Returns:
+            Dictionary with current value, slope and seconds to threshold,
+            or None if there are not enough samples
+        """
+        series = self.series.get(key)
+        if series is None or len(series.samples) < self.min_samples:
+            return None
+
+        threshold = float(self.threshold_for(key[0]))
+        slope = series.robust_slope() if self.method == 'robust' else series.linear_slope()
+        current = series.samples[-1][1]
+
+        if current >= threshold:
+            seconds_to_threshold = 0.0
+        elif slope > 0:
+            seconds_to_threshold = (threshold - current) / slope
+        else:
+            seconds_to_threshold = NO_FORECAST
+
+        return {
+            'metric': key[0],
+            'device_id': key[1],
+            'resource': key[2],
+            'current': current,
+            'threshold': threshold,
+            'slope_per_hour': slope * 3600,
+            'seconds_to_threshold': seconds_to_threshold,
+            'samples': len(series.samples)
+        }
+
+    def publish(self):
+        """
+        Publish forecasts for series updated since the last call
+
+        In batch mode this reloads the series from downsampled InfluxDB data
+        once every batch_interval seconds instead.
+        """
+        if not self.enabled:
+            return []
+
+        if self.mode == 'batch':
+            if time.time() - self.last_batch < self.batch_interval:
+                return []
+            self.last_batch = time.time()
+            self._load_batch()
+
+        forecasts = []
+        for key, series in self.series.items():
+            if not series.updated:
+                continue
+            series.updated = False
+            result = self.forecast(key)
+            if result:
+                forecasts.append(result)
+
+        if forecasts:
+            self._store_forecasts(forecasts)
+            self._check_forecasts(forecasts)
+
+        return forecasts
+
+    def _load_batch(self):
+        """Rebuild this forecaster's series from downsampled InfluxDB data"""
+        self.series = {}
+        for metric in self.metrics:
+            if metric not in BATCH_SOURCES or self.threshold_for(metric) is None:
+                continue
+            measurement, field, device_tag, resource_tag = BATCH_SOURCES[metric]
+
+            rows = self.influx.get_downsampled_series(
+                measurement, field, [tag for tag in (device_tag, resource_tag) if tag],
+                start_time=self.batch_range, every=self.batch_every
+            )
+            for key, points in rows.items():
+                tags = dict(key)
+                device_id = tags.get(device_tag, 'unknown')
+                resource = tags.get(resource_tag, 'none') if resource_tag else 'none'
+                series = self.series[(metric, device_id, resource)] = TrendSeries(len(points) or 1)
+                for timestamp, value in points:
+                    series.add(timestamp, value)
+
+        logger.debug(f"Loaded {len(self.series)} series for batch forecasting")
+
+    def _store_forecasts(self, forecasts):
+        """Store forecasts in InfluxDB"""
+        data = []
+
+        for result in forecasts:
+            data.append({
+                "measurement": "capacity_forecast",
+                "tags": {
+                    "metric": result['metric'],
+                    "device_id": result['device_id'],
+                    "resource": result['resource']
+                },
+                "fields": {
+                    "current": float(result['current']),
+                    "threshold": float(result['threshold']),
+                    "slope_per_hour": float(result['slope_per_hour']),
+                    "seconds_to_threshold": float(result['seconds_to_threshold'])
+                }
+            })
+
+        self.influx.write_data(data)
+        logger.debug(f"Stored {len(data)} capacity forecasts")
+
+    def _check_forecasts(self, forecasts):
+        """Raise or clear the alerts of series predicted to cross their threshold soon"""
+        from utils.alerting import send_alert, clear_alert, active_alerts
+
+        for result in forecasts:
+            seconds = result['seconds_to_threshold']
+            resource = result['resource'] if result['resource'] != 'none' else None
+            if 0 < seconds <= self.alert_horizon:
+                hours = seconds / 3600
+                message = (f"Capacity forecast alert: {result['metric']} on {result['device_id']}"
+                           f"{' ' + resource if resource else ''} will reach "
+                           f"{result['threshold']} in {hours:.1f} hours")
+                send_alert(f"forecast_{result['metric']}", message, result['device_id'],
+                           hours, self.alert_horizon / 3600, resource)
+            elif seconds == NO_FORECAST or seconds > self.alert_horizon:
+                # Recovered: no longer heading for the threshold within the horizon
+                alert_id = f"forecast_{result['metric']}_{result['device_id']}"
+                if resource:
+                    alert_id += f"_{resource}"
+                if alert_id in active_alerts:
+                    clear_alert(alert_id)
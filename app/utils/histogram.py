@@ -0,0 +1,144 @@
+"""
+Log-linear latency histograms
+HDR-style histograms with a fixed bucket layout: every power-of-two range
+above LOWEST is split into SUB_BUCKETS linear buckets, so any value is
+recorded with a relative error below 1/SUB_BUCKETS. Because the layout is
+fixed, histograms of different targets and intervals merge by adding
+bucket counts, and percentiles over any range come from the merged counts
+instead of averaged averages.
+"""
+import math
+
+# Smallest distinguishable latency in ms; smaller values share bucket 0
+LOWEST = 0.01
+
+# Linear buckets per power of two (relative error < 1/SUB_BUCKETS)
+SUB_BUCKETS = 16
+
+# InfluxDB field name prefix of bucket counts ("b<index>")
+FIELD_PREFIX = 'b'
+
+
+def bucket_index(value):
+    """Return the bucket index of a latency in ms"""
+    if value < LOWEST:
+        return 0
+    ratio = value / LOWEST
+    exponent = int(math.log2(ratio))
+    # Guard against log2 rounding at exact powers of two
+    if ratio < 2 ** exponent:
+        exponent -= 1
+    elif ratio >= 2 ** (exponent + 1):
+        exponent += 1
+    offset = min(SUB_BUCKETS - 1, int((ratio / 2 ** exponent - 1) * SUB_BUCKETS))
+    return 1 + exponent * SUB_BUCKETS + offset
+
+
+def bucket_bounds(index):
+    """Return the (lower, upper) latency bounds in ms of a bucket"""
+    if index <= 0:
+        return 0.0, LOWEST
+    exponent, offset = divmod(index - 1, SUB_BUCKETS)
+    base = LOWEST * 2 ** exponent
+    return base * (1 + offset / SUB_BUCKETS), base * (1 + (offset + 1) / SUB_BUCKETS)
+
+
+class LatencyHistogram:
+    """Sparse log-linear histogram of latencies in ms"""
+
+    __slots__ = ('counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, values=()):
+        self.counts = {}  # bucket index -> count
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        for value in values:
+            self.record(value)
+
+    def record(self, value, count=1):
+        """Record a latency (ms)"""
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Add the counts of another histogram to this one"""
+        for index, bucket_count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + bucket_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate a quantile
+
+        Args:
+            q: Quantile (0-1)
+
+        Returns:
+            Upper bound of the bucket holding the quantile, clamped to the
+            recorded min/max, or 0.0 for an empty histogram
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                value = bucket_bounds(index)[1]
+                if self.max is not None:
+                    value = min(value, self.max)
+                if self.min is not None:
+                    value = max(value, self.min)
+                return value
+        return self.max or 0.0
+
+    def mean(self):
+        """Return the mean latency, or 0.0 for an empty histogram"""
+        return self.sum / self.count if self.count else 0.0
+
+    def to_fields(self):
+        """Return InfluxDB fields: count, sum, min, max and the non-empty bucket counts"""
+        fields = {
+            'count': float(self.count),
+            'sum': float(self.sum),
+            'min': float(self.min or 0.0),
+            'max': float(self.max or 0.0)
+        }
+        for index, bucket_count in self.counts.items():
+            fields[f'{FIELD_PREFIX}{index}'] = float(bucket_count)
+        return fields
+
+    @classmethod
+    def from_fields(cls, fields):
+        """
+        Rebuild a histogram from InfluxDB fields
+
+        Args:
+            fields: Dictionary as produced by to_fields(), or the per-field
+                aggregates of a range (summed counts, min of min, max of max)
+
+        Returns:
+            LatencyHistogram
+        """
+        histogram = cls()
+        for name, value in fields.items():
+            if name.startswith(FIELD_PREFIX) and name[len(FIELD_PREFIX):].isdigit() and value:
+                histogram.counts[int(name[len(FIELD_PREFIX):])] = int(value)
+        histogram.count = int(fields.get('count') or sum(histogram.counts.values()))
+        histogram.sum = float(fields.get('sum') or 0.0)
+        if histogram.count:
+            histogram.min = fields.get('min')
+            histogram.max = fields.get('max')
+        return histogram
@@ -0,0 +1,267 @@
+"""
+ICMP probe engine
+Pings many targets concurrently from a single socket and measures each
+echo's round-trip time with a monotonic clock. Uses unprivileged datagram
+ICMP sockets where the kernel allows them (net.ipv4.ping_group_range), raw
+sockets when running as root, and the ping command as a last resort.
+"""
+import os
+import re
+import math
+import time
+import random
+import select
+import socket
+import struct
+import logging
+import subprocess
+
+# Configure logging
+logger = logging.getLogger("utils.icmp")
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+# "rtt min/avg/max/mdev = 0.045/0.061/0.083/0.013 ms" (iputils) or
+# "round-trip min/avg/max/stddev = ..." (BSD, busybox, inetutils)
+_PING_SUMMARY = re.compile(r'= ([\d.]+)/([\d.]+)/([\d.]+)(?:/([\d.]+))?')
+_PING_LOSS = re.compile(r'([\d.]+)% packet loss')
+# "icmp_seq=3 ttl=57 time=10.2 ms" (busybox prints "seq=3")
+_PING_REPLY = re.compile(r'seq=(\d+).*?time[=<]([\d.]+)')
+
+
+def checksum(data):
+    """Internet checksum of an ICMP message"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo(ident, seq, payload):
+    """Build an ICMP echo request"""
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum(header + payload), ident, seq) + payload
+
+
+def summarize(target, sent, rtts):
+    """
+    Compute ping statistics
+
+    Args:
+        target: Probed host
+        sent: Number of echo requests sent
+        rtts: Round-trip times (ms) of the received replies, in send order
+
+    Returns:
+        Dictionary with success, packet_loss, rtt_min/avg/max/mdev (ms),
+        jitter (mean difference between consecutive RTTs, ms) and the raw rtts
+    """
+    received = len(rtts)
+    result = {
+        'target': target,
+        'success': received > 0,
+        'sent': sent,
+        'received': received,
+        'packet_loss': 100.0 * (sent - received) / sent if sent else 100.0,
+        'rtt_min': 0.0,
+        'rtt_avg': 0.0,
+        'rtt_max': 0.0,
+        'rtt_mdev': 0.0,
+        'jitter': 0.0,
+        'rtts': list(rtts)
+    }
+    if rtts:
+        average = sum(rtts) / received
+        result['rtt_min'] = min(rtts)
+        result['rtt_avg'] = average
+        result['rtt_max'] = max(rtts)
+        # Same definition as iputils ping: sqrt(mean(rtt^2) - mean(rtt)^2)
+        result['rtt_mdev'] = math.sqrt(max(0.0, sum(rtt * rtt for rtt in rtts) / received - average * average))
+        if received > 1:
+            result['jitter'] = sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (received - 1)
+    return result
+
+
+class PingEngine:
+    """
+    Concurrent ICMP echo prober
+
+    Every round sends one echo request to each target; replies are matched
+    to requests by source address and sequence number, so a single socket
+    serves all targets.
+    """
+
+    def __init__(self, count=5, interval=0.2, timeout=2.0, payload_size=56):
+        """
+        Args:
+            count: Echo requests per target
+            interval: Seconds between rounds
+            timeout: Seconds to wait for replies after the last round
+            payload_size: ICMP payload bytes
+        """
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout
+        self.payload = bytes(payload_size)
+        self.method = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Create an engine from the `wan` config section"""
+        wan_config = config.get('wan', {})
+        return cls(
+            count=wan_config.get('ping_count', 5),
+            interval=wan_config.get('ping_interval', 0.2),
+            timeout=wan_config.get('ping_timeout', 2.0)
+        )
+
+    def _open_socket(self):
+        """
+        Open an ICMP socket
+
+        Returns:
+            Tuple of (socket, raw) or (None, False) if ICMP sockets are not permitted
+        """
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+        except OSError:
+            pass
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+        except OSError:
+            return None, False
+
+    def ping(self, targets):
+        """
+        Ping targets concurrently
+
+        Args:
+            targets: Host names or IPv4 addresses
+
+        Returns:
+            List of summarize() results in target order
+        """
+        addresses = {}
+        fallback = []
+        for target in targets:
+            try:
+                addresses[target] = socket.getaddrinfo(target, None, socket.AF_INET)[0][4][0]
+            except (socket.gaierror, IndexError):
+                # Not resolvable over IPv4 (e.g. an IPv6-only target)
+                fallback.append(target)
+
+        results = {}
+        sock, raw = self._open_socket() if addresses else (None, False)
+        if sock is None:
+            fallback.extend(addresses)
+            addresses = {}
+        else:
+            with sock:
+                self.method = 'raw' if raw else 'dgram'
+                results.update(self._ping_socket(sock, raw, addresses))
+
+        if fallback:
+            self.method = self.method or 'subprocess'
+            results.update(self._ping_subprocess(fallback))
+        return [results[target] for target in targets]
+
+    def _ping_socket(self, sock, raw, addresses):
+        """Run the echo rounds on an open ICMP socket"""
+        ident = (os.getpid() ^ random.getrandbits(16)) & 0xFFFF
+        first_seq = random.getrandbits(16)
+        targets_by_address = {}
+        for target, address in addresses.items():
+            targets_by_address.setdefault(address, []).append(target)
+
+        pending = {}  # (address, seq) -> (round, send time)
+        rtts = {address: {} for address in targets_by_address}  # address -> round -> rtt
+        sent = {address: 0 for address in targets_by_address}
+        sock.setblocking(False)
+
+        for round_index in range(self.count):
+            seq = (first_seq + round_index) & 0xFFFF
+            for address in targets_by_address:
+                try:
+                    sock.sendto(build_echo(ident, seq, self.payload), (address, 0))
+                    pending[(address, seq)] = (round_index, time.monotonic())
+                    sent[address] += 1
+                except OSError as e:
+                    logger.debug(f"Could not send echo to {address}: {str(e)}")
+            if round_index == self.count - 1:
+                self._receive(sock, raw, ident, pending, rtts, time.monotonic() + self.timeout, until_done=True)
+            else:
+                self._receive(sock, raw, ident, pending, rtts, time.monotonic() + self.interval)
+
+        results = {}
+        for address, targets in targets_by_address.items():
+            for target in targets:
+                # Replies can arrive out of order; jitter needs them in send order
+                results[target] = summarize(target, sent[address],
+                                            [rtts[address][index] for index in sorted(rtts[address])])
+        return results
+
+    def _receive(self, sock, raw, ident, pending, rtts, deadline, until_done=False):
+        """Collect echo replies until the deadline (or until nothing is pending with until_done)"""
+        while not (until_done and not pending):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                return
+            try:
+                packet, (address, _) = sock.recvfrom(2048)
+            except BlockingIOError:
+                continue
+            received_at = time.monotonic()
+
+            if raw:
+                # Raw sockets deliver the IP header and every ICMP message on the host
+                packet = packet[(packet[0] & 0x0F) * 4:]
+            if len(packet) < 8:
+                continue
+            icmp_type, _, _, reply_ident, seq = struct.unpack('!BBHHH', packet[:8])
+            # Datagram sockets rewrite the identifier and only deliver our replies
+            if icmp_type != ICMP_ECHO_REPLY or (raw and reply_ident != ident):
+                continue
+            sent = pending.pop((address, seq), None)
+            if sent is not None:
+                round_index, sent_at = sent
+                rtts[address][round_index] = (received_at - sent_at) * 1000.0
+
+    def _ping_subprocess(self, targets):
+        """Fall back to the ping command, running one process per target in parallel"""
+        processes = {}
+        for target in targets:
+            cmd = ['ping', '-c', str(self.count), '-i', str(max(self.interval, 0.2)),
+                   '-W', str(max(1, int(math.ceil(self.timeout)))), target]
+            try:
+                processes[target] = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except OSError as e:
+                logger.error(f"Error pinging {target}: {str(e)}")
+
+        results = {}
+        for target in targets:
+            process = processes.get(target)
+            if process is None:
+                results[target] = summarize(target, self.count, [])
+                continue
+            output = process.communicate()[0].decode('utf-8', errors='replace')
+            # Sort the replies by sequence number, as they are printed as they arrive
+            replies = sorted((int(seq), float(value)) for seq, value in _PING_REPLY.findall(output))
+            rtts = [rtt for _, rtt in replies]
+            result = summarize(target, self.count, rtts)
+            # Prefer the command's own summary when it printed one
+            summary = _PING_SUMMARY.search(output)
+            loss = _PING_LOSS.search(output)
+            if summary and rtts:
+                result['rtt_min'], result['rtt_avg'], result['rtt_max'] = (float(v) for v in summary.groups()[:3])
+                if summary.group(4):
+                    result['rtt_mdev'] = float(summary.group(4))
+            if loss:
+                result['packet_loss'] = float(loss.group(1))
+            results[target] = result
+        return results
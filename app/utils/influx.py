@@ -6,9 +6,21 @@ import time
 from typing import Dict, List, Optional, Any, Union
 from influxdb_client import InfluxDBClient, Point
 from influxdb_client.client.write_api import SYNCHRONOUS
+from utils.snapshot import snapshot
+from utils.telemetry import telemetry
+from utils.histogram import LatencyHistogram
+from utils.livefeed import livefeed
+from utils.versions import versions, DEVICE_MEASUREMENTS
 
 logger = logging.getLogger('utils.influx')
 
+# Measurements read by get_device_status() and get_alerts() (get_devices()
+# reads versions.DEVICE_MEASUREMENTS); the API's version stamps use the same names
+DEVICE_STATUS_MEASUREMENT = 'device_status'
+ALERT_MEASUREMENT = 'alert'
+
+_DEVICE_FILTER = ' or '.join(f'r._measurement == "{measurement}"' for measurement in sorted(DEVICE_MEASUREMENTS))
+
 class InfluxClient:
     """Client for interacting with InfluxDB"""
     
@@ -36,16 +48,39 @@ class InfluxClient:
             logger.error(f"Error connecting to InfluxDB: {str(e)}")
             raise
     
-    def write_data(self, data):
+    def write_data(self, data, lines=None):
         """
         Write metrics to InfluxDB
         
         Args:
             data: List of data points to write
+            lines: Optional line protocol already serialized from data
+                (written instead of converting data again)
         """
+        # Keep the latest values for the /metrics exposition endpoint
+        try:
+            snapshot.update(data)
+        except Exception as e:
+            logger.error(f"Error updating metrics snapshot: {str(e)}")
+        
+        # Push the new samples to live dashboard subscribers
+        try:
+            livefeed.publish(data)
+        except Exception as e:
+            logger.error(f"Error publishing to live feed: {str(e)}")
+        
+        # Advance the version stamps behind the API's ETags
+        try:
+            versions.observe(data)
+        except Exception as e:
+            logger.error(f"Error updating version stamps: {str(e)}")
+        
         try:
-            self.write_api.write(bucket=self.bucket, record=data)
+            with telemetry.timer('influx_write'):
+                self.write_api.write(bucket=self.bucket, record=lines if lines is not None else data)
+            telemetry.count('points_written', len(data) if isinstance(data, list) else 1)
         except Exception as e:
+            telemetry.count('influx_write_errors')
             logger.error(f"Error writing to InfluxDB: {str(e)}")
     
     def query(self, query):
@@ -75,7 +110,7 @@ class InfluxClient:
         query = f'''
         from(bucket: "{self.bucket}")
             |> range(start: -5m)
-            |> filter(fn: (r) => r._measurement == "device_status")
+            |> filter(fn: (r) => r._measurement == "{DEVICE_STATUS_MEASUREMENT}")
             |> last()
         '''
         
@@ -109,7 +144,7 @@ class InfluxClient:
         query = f'''
         from(bucket: "{self.bucket}")
             |> range(start: -1h)
-            |> filter(fn: (r) => r._measurement == "device" or r._measurement == "interface" or r._measurement == "wireless")
+            |> filter(fn: (r) => {_DEVICE_FILTER})
             |> group(columns: ["device_id"])
             |> distinct(column: "device_id")
         '''
@@ -323,7 +358,7 @@ class InfluxClient:
         query = f'''
         from(bucket: "{self.bucket}")
             |> range(start: {start_time}, stop: {end_time})
-            |> filter(fn: (r) => r._measurement == "qos" and r.device_id == "{device_id}")
+            |> filter(fn: (r) => r._measurement == "qos_queue" and r.device_id == "{device_id}")
             |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
             |> group(columns: ["queue_name"])
         '''
@@ -337,14 +372,27 @@ class InfluxClient:
             
             for table in result:
                 for record in table.records:
+                    values = record.values
+                    if values.get('queue_type') == 'tree':
+                        # Tree queues shape a single direction
+                        limit_up = limit_down = values.get('max_limit', 0)
+                        current_up = current_down = values.get('current_rate', 0)
+                    else:
+                        limit_up = values.get('max_limit_upload', 0)
+                        limit_down = values.get('max_limit_download', 0)
+                        current_up = values.get('current_upload', 0)
+                        current_down = values.get('current_download', 0)
                     queues.append({
-                        'name': record.values.get('queue_name', 'unknown'),
-                        'target': record.values.get('target', 'unknown'),
-                        'limit_up': record.values.get('limit_up', 0),
-                        'limit_down': record.values.get('limit_down', 0),
-                        'current_up': record.values.get('current_up', 0),
-                        'current_down': record.values.get('current_down', 0),
-                        'time': record.values.get('_time')
+                        'name': values.get('queue_name', 'unknown'),
+                        'type': values.get('queue_type', 'simple'),
+                        'target': values.get('target', 'unknown'),
+                        'limit_up': limit_up,
+                        'limit_down': limit_down,
+                        'current_up': current_up or 0,
+                        'current_down': current_down or 0,
+                        'dropped_up': values.get('dropped_upload', values.get('dropped', 0)) or 0,
+                        'dropped_down': values.get('dropped_download', values.get('dropped', 0)) or 0,
+                        'time': values.get('_time')
                     })
             
             return {'queues': queues}
@@ -352,6 +400,199 @@ class InfluxClient:
             logger.error(f"Error getting QoS metrics: {str(e)}")
             return {'queues': []}
     
+    def get_latency_percentiles(self, start_time='-24h', end_time='now()', target=None, probe=None, link=None,
+                                group_by=('target', 'probe', 'link'), percentiles=(50, 95, 99)):
+        """
+        Get WAN latency percentiles over a time range
+        
+        The per-interval histograms are merged by summing their bucket counts,
+        so the percentiles are exact to the bucket resolution for any range
+        and any grouping (e.g. all targets of a link).
+        
+        Args:
+            start_time: Start time for data range
+            end_time: End time for data range
+            target: Optional target to filter on
+            probe: Optional probe type to filter on ('ping', 'tcp', 'http', 'dns')
+            link: Optional WAN link to filter on
+            group_by: Tags whose histograms are kept apart (others are merged)
+            percentiles: Percentiles (0-100) to compute
+            
+        Returns:
+            List of dictionaries with the group tags, count, mean, min, max and
+            one "p<percentile>" entry per requested percentile
+        """
+        group_by = [tag for tag in group_by if tag in ('target', 'probe', 'link')]
+        filters = ''.join(
+            f' and r.{tag} == "{value}"'
+            for tag, value in (('target', target), ('probe', probe), ('link', link)) if value
+        )
+        group_columns = ', '.join(f'"{tag}"' for tag in group_by + ['_field'])
+        query = f'''
+        data = from(bucket: "{self.bucket}")
+            |> range(start: {start_time}, stop: {end_time})
+            |> filter(fn: (r) => r._measurement == "wan_latency"{filters})
+            |> group(columns: [{group_columns}])
+        counts = data |> filter(fn: (r) => r._field != "min" and r._field != "max") |> sum()
+        lows = data |> filter(fn: (r) => r._field == "min") |> min()
+        highs = data |> filter(fn: (r) => r._field == "max") |> max()
+        union(tables: [counts, lows, highs])
+        '''
+        
+        try:
+            result = self.query(query)
+            if not result:
+                return []
+            
+            groups = {}
+            for table in result:
+                for record in table.records:
+                    key = tuple(record.values.get(tag) for tag in group_by)
+                    groups.setdefault(key, {})[record.values.get('_field')] = record.values.get('_value')
+            
+            latencies = []
+            for key, fields in groups.items():
+                histogram = LatencyHistogram.from_fields(fields)
+                entry = dict(zip(group_by, key))
+                entry.update({
+                    'count': histogram.count,
+                    'mean': histogram.mean(),
+                    'min': histogram.min or 0.0,
+                    'max': histogram.max or 0.0
+                })
+                for q in percentiles:
+                    entry[f'p{q:g}'] = histogram.quantile(q / 100.0)
+                latencies.append(entry)
+            
+            return latencies
+        except Exception as e:
+            logger.error(f"Error getting latency percentiles: {str(e)}")
+            return []
+    
+    def get_downsampled_series(self, measurement, field, group_tags, start_time='-7d', every='15m'):
+        """
+        Get downsampled series for a measurement field in a single query
+        
+        Args:
+            measurement: Measurement name
+            field: Field name
+            group_tags: Tags identifying a series (e.g. ["device_id", "interface"])
+            start_time: Start time for data range
+            every: Aggregation window
+            
+        Returns:
+            Dictionary mapping a tuple of (tag, value) pairs to a list of
+            (timestamp, value) points
+        """
+        query = f'''
+        from(bucket: "{self.bucket}")
+            |> range(start: {start_time})
+            |> filter(fn: (r) => r._measurement == "{measurement}" and r._field == "{field}")
+            |> aggregateWindow(every: {every}, fn: mean, createEmpty: false)
+        '''
+        
+        try:
+            result = self.query(query)
+            if not result:
+                return {}
+            
+            series = {}
+            for table in result:
+                for record in table.records:
+                    key = tuple((tag, record.values.get(tag, 'unknown')) for tag in group_tags)
+                    value = record.values.get('_value')
+                    if value is None:
+                        continue
+                    series.setdefault(key, []).append((record.values.get('_time').timestamp(), float(value)))
+            
+            return series
+        except Exception as e:
+            logger.error(f"Error getting downsampled series: {str(e)}")
+            return {}
+    
+    def get_forecasts(self, device_id=None):
+        """
+        Get the latest capacity forecasts
+        
+        Args:
+            device_id: Optional ID of the device to filter on
+            
+        Returns:
+            List of forecasts
+        """
+        device_filter = f' and r.device_id == "{device_id}"' if device_id else ''
+        query = f'''
+        from(bucket: "{self.bucket}")
+            |> range(start: -1h)
+            |> filter(fn: (r) => r._measurement == "capacity_forecast"{device_filter})
+            |> last()
+            |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        '''
+        
+        try:
+            result = self.query(query)
+            if not result:
+                return []
+            
+            forecasts = []
+            for table in result:
+                for record in table.records:
+                    forecasts.append({
+                        'metric': record.values.get('metric', 'unknown'),
+                        'device_id': record.values.get('device_id', 'unknown'),
+                        'resource': record.values.get('resource', 'none'),
+                        'current': record.values.get('current', 0),
+                        'threshold': record.values.get('threshold', 0),
+                        'slope_per_hour': record.values.get('slope_per_hour', 0),
+                        'seconds_to_threshold': record.values.get('seconds_to_threshold', -1),
+                        'time': record.values.get('_time')
+                    })
+            
+            return forecasts
+        except Exception as e:
+            logger.error(f"Error getting forecasts: {str(e)}")
+            return []
+    
+    def get_collector_status(self):
+        """
+        Get the latest supervision state of every collector
+        
+        Returns:
+            Dictionary of collector name to state
+        """
+        query = f'''
+        from(bucket: "{self.bucket}")
+            |> range(start: -15m)
+            |> filter(fn: (r) => r._measurement == "collector_status")
+            |> last()
+            |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        '''
+        
+        try:
+            result = self.query(query)
+            if not result:
+                return {}
+            
+            states = {}
+            for table in result:
+                for record in table.records:
+                    name = record.values.get('collector', 'unknown')
+                    states[name] = {
+                        'name': name,
+                        'state': record.values.get('state', 'unknown'),
+                        'restarts': record.values.get('restarts', 0),
+                        'consecutive_failures': record.values.get('consecutive_failures', 0),
+                        'quarantined': record.values.get('quarantined', 0),
+                        'last_cycle_seconds': record.values.get('last_cycle_seconds', 0),
+                        'last_error': record.values.get('last_error') or None,
+                        'time': record.values.get('_time')
+                    }
+            
+            return states
+        except Exception as e:
+            logger.error(f"Error getting collector status: {str(e)}")
+            return {}
+    
     def get_alerts(self):
         """
         Get active alerts
@@ -363,7 +604,7 @@ class InfluxClient:
         query = f'''
         from(bucket: "{self.bucket}")
             |> range(start: -24h)
-            |> filter(fn: (r) => r._measurement == "alert" and r.active == "true")
+            |> filter(fn: (r) => r._measurement == "{ALERT_MEASUREMENT}" and r.active == "true")
             |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
             |> group(columns: ["alert_id"])
             |> last()
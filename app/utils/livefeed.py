@@ -0,0 +1,247 @@
+"""
+Live metric feed
+Fans the points written by the collectors and alert transitions out to
+Server-Sent Events subscribers (dashboards). The feed taps
+InfluxClient.write_data once; every point is serialized once no matter how
+many subscribers receive it, and subscribers are indexed by measurement so
+a batch only visits the subscriptions that want it. Slow subscribers lose
+their oldest messages instead of holding up the pipeline.
+"""
+import json
+import time
+import logging
+import datetime
+import threading
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger("utils.livefeed")
+
+# Pseudo-measurement of alert transitions
+ALERT_MEASUREMENT = 'alert'
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def format_event(event, payload):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'), default=_json_default)}\n\n"
+
+
+class Subscription:
+    """One subscriber's filters and bounded message queue"""
+
+    def __init__(self, devices=None, measurements=None, queue_size=1000):
+        """
+        Args:
+            devices: Device IDs to receive (None for all)
+            measurements: Measurements to receive (None for all); 'alert'
+                selects alert transitions
+            queue_size: Messages kept for a slow subscriber before the
+                oldest are dropped
+        """
+        self.devices = frozenset(devices) if devices else None
+        self.measurements = frozenset(measurements) if measurements else None
+        self.queue = deque(maxlen=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self._ready = threading.Condition()
+
+    def wants_device(self, device_id):
+        return self.devices is None or device_id in self.devices
+
+    def push(self, messages):
+        with self._ready:
+            overflow = len(self.queue) + len(messages) - self.queue.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+            self.queue.extend(messages)
+            self._ready.notify()
+
+    def next(self, timeout):
+        """
+        Wait for messages
+
+        Returns:
+            List of queued messages (empty on timeout)
+        """
+        with self._ready:
+            if not self.queue and not self.closed:
+                self._ready.wait(timeout)
+            messages = list(self.queue)
+            self.queue.clear()
+            return messages
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+
+class LiveFeed:
+    """Registry of live subscribers and the write-path tap feeding them"""
+
+    def __init__(self):
+        self.max_subscribers = 1000
+        self.queue_size = 1000
+        self.keepalive = 15
+        self.forward = None  # in worker processes: callable sending alert transitions to the main process
+        self._by_measurement = {}  # measurement -> set of subscriptions
+        self._wildcard = set()  # subscriptions to every measurement
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """Apply the `livefeed` config section"""
+        feed_config = config.get('livefeed', {})
+        self.max_subscribers = feed_config.get('max_subscribers', 1000)
+        self.queue_size = feed_config.get('queue_size', 1000)
+        self.keepalive = feed_config.get('keepalive', 15)
+
+    @property
+    def subscribers(self):
+        return self._count
+
+    def subscribe(self, devices=None, measurements=None):
+        """
+        Register a subscriber
+
+        Returns:
+            Subscription, or None when max_subscribers is reached
+        """
+        subscription = Subscription(devices, measurements, self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            if subscription.measurements is None:
+                self._wildcard.add(subscription)
+            else:
+                for measurement in subscription.measurements:
+                    self._by_measurement.setdefault(measurement, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscriber"""
+        subscription.close()
+        with self._lock:
+            if subscription.measurements is None:
+                if subscription not in self._wildcard:
+                    return
+                self._wildcard.discard(subscription)
+            else:
+                registered = False
+                for measurement in subscription.measurements:
+                    subscribers = self._by_measurement.get(measurement)
+                    if subscribers is not None and subscription in subscribers:
+                        registered = True
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del self._by_measurement[measurement]
+                if not registered:
+                    return
+            self._count -= 1
+
+    def _targets(self, measurement):
+        with self._lock:
+            subscribers = self._by_measurement.get(measurement)
+            if subscribers:
+                return list(subscribers) + list(self._wildcard) if self._wildcard else list(subscribers)
+            return list(self._wildcard)
+
+    def publish(self, data):
+        """
+        Fan written points out to subscribers
+
+        Args:
+            data: Point dictionary or list of point dictionaries as passed
+                to InfluxClient.write_data
+        """
+        if not self._count:
+            return
+        if isinstance(data, dict):
+            data = [data]
+        now = time.time()
+        targets_by_measurement = {}
+        pending = {}  # subscription -> messages of this batch
+        for point in data:
+            measurement = point.get('measurement')
+            targets = targets_by_measurement.get(measurement)
+            if targets is None:
+                targets = targets_by_measurement[measurement] = self._targets(measurement)
+            if not targets:
+                continue
+            tags = point.get('tags') or {}
+            device_id = tags.get('device_id') or tags.get('hostname')
+            message = None
+            for subscription in targets:
+                if not subscription.wants_device(device_id):
+                    continue
+                if message is None:
+                    message = format_event('sample', {
+                        'measurement': measurement,
+                        'device_id': device_id,
+                        'tags': tags,
+                        'fields': point.get('fields') or {},
+                        'time': point.get('time', now)
+                    })
+                messages = pending.get(subscription)
+                if messages is None:
+                    pending[subscription] = [message]
+                else:
+                    messages.append(message)
+
+        # One wake-up per subscriber and batch
+        for subscription, messages in pending.items():
+            subscription.push(messages)
+
+    def publish_alert(self, state, alert):
+        """
+        Send an alert transition to subscribers
+
+        Args:
+            state: 'firing' or 'resolved'
+            alert: Alert dictionary (id, type, device_id, message, value, ...)
+        """
+        if self.forward is not None:
+            self.forward(state, alert)
+            return
+        if not self._count:
+            return
+        message = None
+        for subscription in self._targets(ALERT_MEASUREMENT):
+            if not subscription.wants_device(alert.get('device_id')):
+                continue
+            if message is None:
+                message = format_event('alert', dict(alert, state=state))
+            subscription.push([message])
+
+    def stream(self, subscription):
+        """
+        Generate the Server-Sent Events of a subscription until the client disconnects
+
+        Yields:
+            SSE message strings, with a comment line every `keepalive` seconds
+        """
+        try:
+            yield "retry: 5000\n: subscribed\n\n"
+            reported = 0
+            while not subscription.closed:
+                messages = subscription.next(self.keepalive)
+                if subscription.dropped != reported:
+                    reported = subscription.dropped
+                    yield format_event('dropped', {'dropped': reported})
+                if messages:
+                    yield ''.join(messages)
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Global live feed
+livefeed = LiveFeed()
@@ -0,0 +1,333 @@
+"""
+WAN latency probes
+TCP connect, HTTP time-to-first-byte and DNS resolution probes, run
+concurrently on an asyncio loop. Every probe can be bound to the source
+address (or, with CAP_NET_RAW, the interface) of one WAN link so the same
+targets can be compared across ISPs.
+"""
+import ssl
+import time
+import random
+import socket
+import struct
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+# Configure logging
+logger = logging.getLogger("utils.probes")
+
+# Link name of probes that are not bound to a WAN link
+DEFAULT_LINK = 'default'
+
+DNS_TYPES = {'A': 1, 'NS': 2, 'CNAME': 5, 'MX': 15, 'TXT': 16, 'AAAA': 28}
+
+
+def _elapsed_ms(start):
+    return (time.monotonic() - start) * 1000.0
+
+
+class Link:
+    """A WAN link probes are bound to"""
+
+    def __init__(self, name, device_id='', interface='', source_address=None, bind_device=None):
+        """
+        Args:
+            name: Link name used as the `link` tag (e.g. "ISP1")
+            device_id: Router the link belongs to
+            interface: Router interface of the link (e.g. "ether1")
+            source_address: Local address whose traffic is routed over the link
+            bind_device: Local interface to bind to (SO_BINDTODEVICE)
+        """
+        self.name = name
+        self.device_id = device_id
+        self.interface = interface
+        self.source_address = source_address
+        self.bind_device = bind_device
+
+    async def connect(self, host, port, timeout):
+        """
+        Open a TCP connection from this link
+
+        Returns:
+            Tuple of (socket, connect time in ms)
+        """
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if self.source_address and ':' in self.source_address else socket.AF_INET
+        infos = await loop.getaddrinfo(host, port, family=family, type=socket.SOCK_STREAM)
+        address = infos[0][4]
+
+        sock = self.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+        except BaseException:
+            sock.close()
+            raise
+        return sock, _elapsed_ms(start)
+
+    def socket(self, family, kind):
+        """Create a socket bound to this link"""
+        sock = socket.socket(family, kind)
+        try:
+            if self.bind_device:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, self.bind_device.encode('utf-8'))
+            if self.source_address:
+                sock.bind((self.source_address, 0))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class Probe:
+    """Base class of latency probes"""
+
+    kind = None
+
+    def __init__(self, target):
+        self.target = target
+
+    async def measure(self, link, timeout):
+        """
+        Run the probe once over a link
+
+        Returns:
+            Dictionary of result fields; must include latency_ms
+        """
+        raise NotImplementedError
+
+    async def run(self, link, timeout):
+        """Run the probe and return a result dictionary, never raising"""
+        result = {
+            'probe': self.kind,
+            'target': self.target,
+            'link': link.name,
+            'device_id': link.device_id,
+            'interface': link.interface,
+            'success': False,
+            'latency_ms': 0.0,
+            'error': ''
+        }
+        try:
+            result.update(await asyncio.wait_for(self.measure(link, timeout), timeout))
+            result['success'] = True
+        except asyncio.TimeoutError:
+            result['error'] = 'timeout'
+        except Exception as e:
+            result['error'] = f"{e.__class__.__name__}: {str(e)}"
+        return result
+
+
+class TcpProbe(Probe):
+    """Time to complete a TCP handshake"""
+
+    kind = 'tcp'
+
+    def __init__(self, host, port):
+        super().__init__(f"{host}:{port}")
+        self.host = host
+        self.port = port
+
+    async def measure(self, link, timeout):
+        sock, connect_ms = await link.connect(self.host, self.port, timeout)
+        sock.close()
+        return {'latency_ms': connect_ms, 'connect_ms': connect_ms}
+
+
+class HttpProbe(Probe):
+    """Time to the first byte of an HTTP(S) response, split into connect, TLS and wait"""
+
+    kind = 'http'
+
+    def __init__(self, url, verify=True):
+        super().__init__(url)
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.ssl_context = None
+        if self.https:
+            self.ssl_context = ssl.create_default_context()
+            if not verify:
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+
+    async def measure(self, link, timeout):
+        start = time.monotonic()
+        sock, connect_ms = await link.connect(self.host, self.port, timeout)
+        tls_start = time.monotonic()
+        reader, writer = await asyncio.open_connection(
+            sock=sock,
+            ssl=self.ssl_context,
+            server_hostname=self.host if self.https else None
+        )
+        tls_ms = _elapsed_ms(tls_start) if self.https else 0.0
+        try:
+            request_start = time.monotonic()
+            writer.write(
+                f"GET {self.path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"User-Agent: mikrotik-monitor-probe\r\nConnection: close\r\n\r\n".encode('ascii')
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            first_byte = time.monotonic()
+        finally:
+            writer.close()
+
+        if not status_line:
+            raise ConnectionError("connection closed before response")
+        try:
+            status_code = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise ValueError(f"invalid status line {status_line[:40]!r}")
+        return {
+            'latency_ms': (first_byte - start) * 1000.0,
+            'connect_ms': connect_ms,
+            'tls_ms': tls_ms,
+            'ttfb_ms': (first_byte - request_start) * 1000.0,
+            'status_code': status_code
+        }
+
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, query_id):
+        self.query_id = query_id
+        self.response = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if len(data) >= 12 and struct.unpack('!H', data[:2])[0] == self.query_id and not self.response.done():
+            self.response.set_result(data)
+
+    def error_received(self, exc):
+        if not self.response.done():
+            self.response.set_exception(exc)
+
+
+class DnsProbe(Probe):
+    """Time for a DNS server to answer a query"""
+
+    kind = 'dns'
+
+    def __init__(self, name, server, port=53, record_type='A'):
+        super().__init__(f"{name}@{server}")
+        self.name = name
+        self.server = server
+        self.port = port
+        self.record_type = DNS_TYPES.get(str(record_type).upper(), 1)
+
+    def _query(self, query_id):
+        header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+        question = b''.join(
+            bytes([len(label)]) + label.encode('idna') for label in self.name.rstrip('.').split('.')
+        ) + b'\x00'
+        return header + question + struct.pack('!HH', self.record_type, 1)
+
+    async def measure(self, link, timeout):
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ':' in self.server else socket.AF_INET
+        sock = link.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        query_id = random.getrandbits(16)
+        transport, protocol = await loop.create_datagram_endpoint(lambda: _DnsProtocol(query_id), sock=sock)
+        try:
+            start = time.monotonic()
+            transport.sendto(self._query(query_id), (self.server, self.port))
+            response = await protocol.response
+            latency_ms = _elapsed_ms(start)
+        finally:
+            transport.close()
+
+        flags, _, answers = struct.unpack('!HHH', response[2:8])
+        rcode = flags & 0x0F
+        if rcode not in (0, 3):
+            raise ValueError(f"server returned rcode {rcode}")
+        return {'latency_ms': latency_ms, 'rcode': rcode, 'answers': answers}
+
+
+def build_probe(spec):
+    """
+    Create a probe from a config entry
+
+    Args:
+        spec: Dictionary such as {type: tcp, host: 1.1.1.1, port: 443},
+            {type: http, url: https://...} or {type: dns, name: example.com, server: 1.1.1.1}
+
+    Returns:
+        Probe instance, or None for an invalid entry
+    """
+    kind = spec.get('type')
+    try:
+        if kind == 'tcp':
+            return TcpProbe(spec['host'], int(spec.get('port', 443)))
+        if kind == 'http':
+            return HttpProbe(spec['url'], verify=spec.get('verify', True))
+        if kind == 'dns':
+            return DnsProbe(spec['name'], spec['server'], int(spec.get('port', 53)), spec.get('record_type', 'A'))
+    except KeyError as e:
+        logger.warning(f"Ignoring {kind} probe without {e}: {spec!r}")
+        return None
+    logger.warning(f"Ignoring probe of unknown type: {spec!r}")
+    return None
+
+
+class ProbeRunner:
+    """
+    Runs every probe over every link concurrently, bounded by a semaphore
+
+    Links with the same binding take the same path out of this host, so each
+    distinct binding is probed once and its results are reported for all of
+    its links. Links without a source address or bind device would all
+    follow the default route, so they are not reported per link: their
+    probes run once under a single `default` link.
+    """
+
+    def __init__(self, probes, links, timeout=5.0, concurrency=100):
+        self.probes = probes
+        self.links = links
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+        self.bindings = {}
+        unbound = []
+        for link in links:
+            if link.source_address or link.bind_device:
+                self.bindings.setdefault((link.source_address, link.bind_device), []).append(link)
+            else:
+                unbound.append(link)
+        if unbound:
+            self.bindings[(None, None)] = [Link(DEFAULT_LINK)]
+            if probes and any(link.name != DEFAULT_LINK for link in unbound):
+                logger.warning(f"WAN links {', '.join(link.name for link in unbound)} have no source_address "
+                               f"or bind_device; their probes use the default route and are reported "
+                               f"under link '{DEFAULT_LINK}'")
+
+    async def _run_all(self, bindings):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(probe, link):
+            async with semaphore:
+                return await probe.run(link, self.timeout)
+
+        return await asyncio.gather(*(bounded(probe, link) for link in bindings for probe in self.probes))
+
+    def run(self):
+        """
+        Run all probes once
+
+        Returns:
+            List of result dictionaries (one per probe and reported link)
+        """
+        if not self.probes or not self.bindings:
+            return []
+        representatives = [links[0] for links in self.bindings.values()]
+        measured = asyncio.run(self._run_all(representatives))
+
+        results = []
+        for index, links in enumerate(self.bindings.values()):
+            for result in measured[index * len(self.probes):(index + 1) * len(self.probes)]:
+                for link in links:
+                    results.append(dict(result, link=link.name, device_id=link.device_id, interface=link.interface))
+        return results
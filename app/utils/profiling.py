@@ -0,0 +1,201 @@
+"""
+Opt-in profiling of collector cycles
+Wraps collection cycles in cProfile plus a stack sampler for a number of
+cycles and dumps the aggregated results per collector
+"""
+import os
+import sys
+import time
+import pstats
+import signal
+import cProfile
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger("utils.profiling")
+
+# Default output directory (<project>/logs)
+DEFAULT_OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'logs'))
+
+
+class StackSampler:
+    """
+    Samples the stack of a single thread at a fixed interval
+
+    Produces counts of collapsed stacks ("frame;frame;frame") suitable for
+    flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a background thread"""
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread to exit"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+
+class CycleProfiler:
+    """
+    Profiles the next N cycles of every collector when armed
+
+    When not armed, run_collector only checks the `active` attribute, so the
+    mode costs nothing while it is off. cProfile is process-wide on Python
+    3.12+, so one cycle is profiled at a time; a collector whose cycle
+    overlaps another collector's profiled cycle is profiled on a later cycle.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.cycles = 5
+        self.pending = 0
+        self.sample_interval = 0.005
+        self.output_dir = DEFAULT_OUTPUT_DIR
+        self.remaining = {}
+        self.results = {}
+        self.forwards = []  # callables receiving the profiling signal (worker processes)
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    def configure(self, config):
+        """
+        Apply the profiling section of the application configuration
+
+        Args:
+            config: Application configuration
+        """
+        profiling_config = config.get('profiling', {})
+        self.cycles = profiling_config.get('cycles', 5)
+        self.sample_interval = profiling_config.get('sample_interval', 0.005)
+        output_dir = profiling_config.get('output_dir')
+        if output_dir:
+            self.output_dir = os.path.abspath(output_dir)
+
+        if profiling_config.get('enabled', False):
+            self.arm()
+
+        signal_name = profiling_config.get('signal', 'SIGUSR1')
+        signum = getattr(signal, signal_name, None) if signal_name else None
+        if signum is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(signum, self._on_signal)
+            logger.info(f"Send {signal_name} to profile the next {self.cycles} collector cycles")
+
+    def _on_signal(self, signum, frame):
+        self.arm()
+        for forward in self.forwards:
+            try:
+                forward(signum)
+            except Exception as e:
+                logger.error(f"Error forwarding profiling signal: {str(e)}")
+
+    def arm(self, cycles=None):
+        """Profile the next `cycles` cycles of every collector"""
+        with self._lock:
+            self.remaining = {}
+            self.results = {}
+            self.pending = cycles or self.cycles
+            self.active = True
+        logger.info(f"Profiling enabled for the next {self.pending} collector cycles")
+
+    def run(self, name, func):
+        """
+        Run one collector cycle under the profiler
+
+        Args:
+            name: Collector name used for the output files
+            func: Callable running the cycle
+        """
+        with self._lock:
+            remaining = self.remaining.setdefault(name, self.pending)
+        if remaining <= 0:
+            return func()
+
+        if not self._profiling.acquire(blocking=False):
+            return func()
+
+        profile = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        enabled = False
+        try:
+            sampler.start()
+            try:
+                profile.enable()
+                enabled = True
+            except ValueError as e:
+                # Another profiler (e.g. a debugger) owns the process
+                logger.warning(f"Cannot enable cProfile for collector {name}: {str(e)}")
+            return func()
+        finally:
+            if enabled:
+                profile.disable()
+            sampler.stop()
+            self._profiling.release()
+            self._record(name, profile if enabled else None, sampler.stacks)
+
+    def _record(self, name, profile, stacks):
+        """Aggregate the results of one cycle and dump them after the last one"""
+        with self._lock:
+            stats, collapsed = self.results.get(name, (None, {}))
+            if profile is not None:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            for stack, count in stacks.items():
+                collapsed[stack] = collapsed.get(stack, 0) + count
+            self.results[name] = (stats, collapsed)
+
+            self.remaining[name] -= 1
+            done = self.remaining[name] == 0
+            if done and all(value <= 0 for value in self.remaining.values()):
+                self.active = False
+
+        if done:
+            self._dump(name, stats, collapsed)
+
+    def _dump(self, name, stats, collapsed):
+        """Write pstats, a text summary and collapsed stacks to the output directory"""
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            base = os.path.join(self.output_dir, f"profile-{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+            if stats is not None:
+                stats.dump_stats(f"{base}.pstats")
+                with open(f"{base}.txt", 'w') as f:
+                    stats.stream = f
+                    stats.sort_stats('cumulative').print_stats(50)
+            with open(f"{base}.collapsed", 'w') as f:
+                for stack, count in sorted(collapsed.items()):
+                    f.write(f"{stack} {count}\n")
+
+            logger.info(f"Wrote profile for collector {name} to {base}.*")
+        except Exception as e:
+            logger.error(f"Error writing profile for collector {name}: {str(e)}")
+
+
+# Process-wide profiler used by run_collector
+profiler = CycleProfiler()
@@ -0,0 +1,50 @@
+"""
+RouterOS API wire codec
+Length-prefixed words and sentences as spoken on the RouterOS API port,
+shared by the table streaming client and the device simulator
+"""
+
+
+def encode_length(length):
+    """Encode a word length in RouterOS API format"""
+    if length < 0x80:
+        return length.to_bytes(1, 'big')
+    if length < 0x4000:
+        return (length | 0x8000).to_bytes(2, 'big')
+    if length < 0x200000:
+        return (length | 0xC00000).to_bytes(3, 'big')
+    if length < 0x10000000:
+        return (length | 0xE0000000).to_bytes(4, 'big')
+    return b'\xf0' + length.to_bytes(4, 'big')
+
+
+def encode_sentence(words):
+    """Encode a list of words as one API sentence"""
+    parts = []
+    for word in words:
+        data = word.encode('utf-8')
+        parts.append(encode_length(len(data)))
+        parts.append(data)
+    parts.append(b'\x00')
+    return b''.join(parts)
+
+
+async def read_sentence(reader):
+    """Read one API sentence from an asyncio stream reader and return its words"""
+    words = []
+    while True:
+        first = (await reader.readexactly(1))[0]
+        if first < 0x80:
+            length = first
+        elif first < 0xC0:
+            length = ((first & 0x3F) << 8) | (await reader.readexactly(1))[0]
+        elif first < 0xE0:
+            length = ((first & 0x1F) << 16) | int.from_bytes(await reader.readexactly(2), 'big')
+        elif first < 0xF0:
+            length = ((first & 0x0F) << 24) | int.from_bytes(await reader.readexactly(3), 'big')
+        else:
+            length = int.from_bytes(await reader.readexactly(4), 'big')
+
+        if length == 0:
+            return words
+        words.append((await reader.readexactly(length)).decode('utf-8', errors='replace'))
@@ -0,0 +1,384 @@
+"""
+Non-blocking system sampling
+Reads the cumulative CPU, disk and network counters once per cycle and
+turns them into percentages and rates from the deltas against the previous
+sample. Unlike psutil.cpu_percent(interval=...) nothing sleeps, and every
+metric of a cycle covers the same window. Also keeps a cached, filtered
+mount table and a per-process resource monitor.
+"""
+import os
+import time
+import select
+import fnmatch
+import psutil
+import logging
+import multiprocessing
+
+# Configure logging
+logger = logging.getLogger("utils.sampler")
+
+# Disks that are not physical devices
+SKIPPED_DISK_PREFIXES = ('loop', 'ram', 'zram', 'sr', 'fd')
+
+# Filesystems whose usage is never worth storing
+DEFAULT_EXCLUDE_FSTYPES = ('overlay', 'tmpfs', 'devtmpfs', 'squashfs', 'proc', 'sysfs', 'cgroup', 'cgroup2',
+                           'nsfs', 'autofs', 'fuse.lxcfs', 'devpts', 'mqueue', 'tracefs', 'debugfs')
+
+# Mountpoints of container runtimes and snaps
+DEFAULT_EXCLUDE_PATHS = ('/var/lib/docker/*', '/var/lib/containers/*', '/var/lib/kubelet/*', '/run/*', '/snap/*')
+
+MOUNTINFO = '/proc/self/mountinfo'
+
+
+def cpu_breakdown(previous, current):
+    """
+    Compute CPU time percentages between two psutil cpu_times samples
+
+    Args:
+        previous: Earlier cpu_times namedtuple
+        current: Later cpu_times namedtuple
+
+    Returns:
+        Dictionary with cpu_percent (busy time, as psutil.cpu_percent) and a
+        <field>_percent entry per CPU time field, or None if no time passed
+    """
+    deltas = {field: max(0.0, getattr(current, field) - getattr(previous, field)) for field in current._fields}
+    # guest time is already included in user/nice on Linux
+    total = sum(delta for field, delta in deltas.items() if field not in ('guest', 'guest_nice'))
+    if total <= 0:
+        return None
+    idle = deltas.get('idle', 0.0) + deltas.get('iowait', 0.0)
+    breakdown = {'cpu_percent': round(100.0 * (total - idle) / total, 2)}
+    for field, delta in deltas.items():
+        breakdown[f'{field}_percent'] = round(100.0 * delta / total, 2)
+    return breakdown
+
+
+def counter_rates(previous, current, elapsed, fields):
+    """
+    Compute per-second rates of cumulative counters
+
+    Args:
+        previous: Earlier counters namedtuple
+        current: Later counters namedtuple
+        elapsed: Seconds between the two samples
+        fields: Counter fields to compute rates of
+
+    Returns:
+        Dictionary of <field>_rate values, or None if a counter went backwards
+        (wrap or reset) or no time passed
+    """
+    if elapsed <= 0:
+        return None
+    rates = {}
+    for field in fields:
+        delta = getattr(current, field) - getattr(previous, field)
+        if delta < 0:
+            return None
+        rates[f'{field}_rate'] = delta / elapsed
+    return rates
+
+
+class SystemSampler:
+    """
+    Delta-based sampler of host CPU, load, disk I/O and network counters
+
+    sample() returns the metrics of the window since the previous call; the
+    first call only primes the counters and returns empty rates.
+    """
+
+    DISK_FIELDS = ('read_bytes', 'write_bytes', 'read_count', 'write_count')
+    NET_FIELDS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin', 'dropout')
+
+    def __init__(self):
+        self.last_time = None
+        self.last_cpu = None
+        self.last_per_cpu = None
+        self.last_disks = {}
+        self.last_nics = {}
+
+    def sample(self):
+        """
+        Take a sample
+
+        Returns:
+            Dictionary with 'elapsed' (window in seconds), 'cpu' (cpu_breakdown
+            of all CPUs or None), 'per_cpu' (list of breakdowns), 'load'
+            (load1/load5/load15 and per-core load1_per_core), 'disks'
+            (disk -> rates and busy_percent) and 'nics' (interface ->
+            raw counters plus rates once a window exists)
+        """
+        now = time.monotonic()
+        cpu = psutil.cpu_times()
+        per_cpu = psutil.cpu_times(percpu=True)
+        try:
+            disks = psutil.disk_io_counters(perdisk=True) or {}
+        except (OSError, RuntimeError) as e:
+            logger.debug(f"Disk I/O counters unavailable: {str(e)}")
+            disks = {}
+        nics = psutil.net_io_counters(pernic=True)
+
+        elapsed = now - self.last_time if self.last_time is not None else 0.0
+        result = {
+            'elapsed': elapsed,
+            'cpu': None,
+            'per_cpu': [],
+            'load': self._load(),
+            'disks': {},
+            'nics': {}
+        }
+
+        if self.last_cpu is not None:
+            result['cpu'] = cpu_breakdown(self.last_cpu, cpu)
+        if self.last_per_cpu is not None and len(self.last_per_cpu) == len(per_cpu):
+            result['per_cpu'] = [
+                cpu_breakdown(previous, current) for previous, current in zip(self.last_per_cpu, per_cpu)
+            ]
+
+        for disk, counters in disks.items():
+            if disk.startswith(SKIPPED_DISK_PREFIXES):
+                continue
+            previous = self.last_disks.get(disk)
+            rates = counter_rates(previous, counters, elapsed, self.DISK_FIELDS) if previous else None
+            if rates is None:
+                continue
+            busy_time = getattr(counters, 'busy_time', None)
+            if busy_time is not None:
+                # busy_time is in milliseconds (Linux, FreeBSD)
+                rates['busy_percent'] = min(100.0, max(0.0, (busy_time - previous.busy_time) / (elapsed * 10.0)))
+            result['disks'][disk] = rates
+
+        for nic, counters in nics.items():
+            metrics = {field: getattr(counters, field) for field in self.NET_FIELDS}
+            previous = self.last_nics.get(nic)
+            rates = counter_rates(previous, counters, elapsed, self.NET_FIELDS) if previous else None
+            if rates:
+                metrics.update(rates)
+            result['nics'][nic] = metrics
+
+        self.last_time = now
+        self.last_cpu = cpu
+        self.last_per_cpu = per_cpu
+        self.last_disks = disks
+        self.last_nics = nics
+        return result
+
+    def _load(self):
+        """Return the load averages, or an empty dictionary where unsupported"""
+        try:
+            load1, load5, load15 = os.getloadavg()
+        except (AttributeError, OSError):
+            return {}
+        cores = psutil.cpu_count(logical=True) or 1
+        return {'load1': load1, 'load5': load5, 'load15': load15, 'load1_per_core': load1 / cores}
+
+
+class MountTable:
+    """
+    Filtered list of mounted partitions, re-enumerated only when the mounts change
+
+    On Linux the kernel flags /proc/self/mountinfo with POLLPRI whenever a
+    filesystem is mounted or unmounted, so an unchanged table costs a single
+    zero-timeout poll instead of parsing every mount each cycle.
+    """
+
+    def __init__(self, include_fstypes=(), exclude_fstypes=DEFAULT_EXCLUDE_FSTYPES,
+                 include_paths=(), exclude_paths=DEFAULT_EXCLUDE_PATHS, one_per_device=True):
+        """
+        Args:
+            include_fstypes: Only keep these filesystem types (empty keeps all)
+            exclude_fstypes: Filesystem types to drop
+            include_paths: Only keep mountpoints matching these globs (empty keeps all)
+            exclude_paths: Mountpoint globs to drop
+            one_per_device: Keep only the first mountpoint of a device (bind mounts
+                report the same usage)
+        """
+        self.include_fstypes = frozenset(include_fstypes)
+        self.exclude_fstypes = frozenset(exclude_fstypes)
+        self.include_paths = tuple(include_paths)
+        self.exclude_paths = tuple(exclude_paths)
+        self.one_per_device = one_per_device
+        self.partitions = None
+        self._mountinfo = None
+        self._poller = None
+        self._watch()
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a mount table from the `system.disks` config section"""
+        disk_config = config.get('system', {}).get('disks', {})
+        return cls(
+            include_fstypes=disk_config.get('include_fstypes', ()),
+            exclude_fstypes=disk_config.get('exclude_fstypes', DEFAULT_EXCLUDE_FSTYPES),
+            include_paths=disk_config.get('include_paths', ()),
+            exclude_paths=disk_config.get('exclude_paths', DEFAULT_EXCLUDE_PATHS),
+            one_per_device=disk_config.get('one_per_device', True)
+        )
+
+    def _watch(self):
+        """Register for mount change notifications where the platform has them"""
+        if not hasattr(select, 'poll') or not os.path.exists(MOUNTINFO):
+            return
+        try:
+            self._mountinfo = open(MOUNTINFO, 'rb')
+            self._poller = select.poll()
+            self._poller.register(self._mountinfo, select.POLLPRI | select.POLLERR)
+        except OSError as e:
+            logger.debug(f"Cannot watch {MOUNTINFO}: {str(e)}")
+            self._mountinfo = None
+            self._poller = None
+
+    def _changed(self):
+        """Return True if the mounts may have changed since the last enumeration"""
+        if self.partitions is None or self._poller is None:
+            return True
+        if not self._poller.poll(0):
+            return False
+        # Reading the file to the end re-arms the notification
+        self._mountinfo.seek(0)
+        self._mountinfo.read()
+        return True
+
+    def _keep(self, partition):
+        """Apply the fstype and path filters to a partition"""
+        if self.include_fstypes and partition.fstype not in self.include_fstypes:
+            return False
+        if partition.fstype in self.exclude_fstypes:
+            return False
+        if self.include_paths and not any(fnmatch.fnmatch(partition.mountpoint, p) for p in self.include_paths):
+            return False
+        return not any(fnmatch.fnmatch(partition.mountpoint, p) for p in self.exclude_paths)
+
+    def get(self):
+        """
+        Return the filtered partitions
+
+        Returns:
+            List of psutil partition namedtuples
+        """
+        if not self._changed():
+            return self.partitions
+        if self._mountinfo is not None:
+            self._mountinfo.seek(0)
+            self._mountinfo.read()
+
+        partitions = []
+        devices = set()
+        for partition in psutil.disk_partitions(all=bool(self.include_fstypes)):
+            if not partition.fstype or not self._keep(partition):
+                continue
+            if self.one_per_device:
+                if partition.device in devices:
+                    continue
+                devices.add(partition.device)
+            partitions.append(partition)
+
+        if self.partitions is not None:
+            logger.info(f"Mount table changed, monitoring {len(partitions)} partitions")
+        self.partitions = partitions
+        return partitions
+
+
+def service_process():
+    """
+    Return the root process of this service
+
+    In a collector worker process (runtime.mode: processes) this is the
+    main process that started the workers, otherwise the current process.
+    """
+    parent = multiprocessing.parent_process()
+    return psutil.Process(parent.pid if parent is not None else None)
+
+
+class ProcessMonitor:
+    """
+    CPU and memory of the monitoring stack and the busiest processes
+
+    Processes are grouped by name; CPU usage is computed from cpu_times
+    deltas between cycles, like SystemSampler. The service's main process
+    and all of its descendants (collector workers) are reported as
+    "mikrotik-monitor", also when sampled from inside a worker.
+    """
+
+    ATTRS = ['pid', 'ppid', 'name', 'cpu_times', 'memory_info', 'num_threads']
+    SELF_NAME = 'mikrotik-monitor'
+
+    def __init__(self, top=5, watch=('influxd', 'grafana', 'grafana-server')):
+        """
+        Args:
+            top: Number of busiest other process groups to report
+            watch: Process names that are always reported
+        """
+        self.top = top
+        self.watch = frozenset(watch)
+        self.last_time = None
+        self.last_cpu = {}  # pid -> cumulative CPU seconds
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a monitor from the `system.processes` config section"""
+        process_config = config.get('system', {}).get('processes', {})
+        return cls(
+            top=process_config.get('top', 5),
+            watch=process_config.get('watch', ('influxd', 'grafana', 'grafana-server'))
+        )
+
+    def sample(self):
+        """
+        Sample all processes
+
+        Returns:
+            Dictionary of group name -> {'cpu_percent', 'rss', 'processes',
+            'threads', 'watched'} for the watched groups and the top groups by CPU
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_time if self.last_time is not None else 0.0
+        groups = {}
+        cpu = {}
+
+        infos = [process.info for process in psutil.process_iter(attrs=self.ATTRS, ad_value=None)]
+
+        # The service's process tree, from the parent pids of this scan
+        children = {}
+        for info in infos:
+            children.setdefault(info['ppid'], []).append(info['pid'])
+        service = set()
+        pending = [service_process().pid]
+        while pending:
+            pid = pending.pop()
+            if pid not in service:
+                service.add(pid)
+                pending.extend(children.get(pid, ()))
+
+        for info in infos:
+            if info['cpu_times'] is None:
+                continue
+            pid = info['pid']
+            seconds = info['cpu_times'].user + info['cpu_times'].system
+            cpu[pid] = seconds
+
+            if pid in service:
+                name = self.SELF_NAME
+            else:
+                name = info['name'] or str(pid)
+            group = groups.get(name)
+            if group is None:
+                group = groups[name] = {'cpu_percent': 0.0, 'rss': 0, 'processes': 0, 'threads': 0,
+                                        'watched': name in self.watch or name == self.SELF_NAME}
+            previous = self.last_cpu.get(pid)
+            if previous is not None and elapsed > 0:
+                group['cpu_percent'] += max(0.0, seconds - previous) * 100.0 / elapsed
+            group['rss'] += info['memory_info'].rss if info['memory_info'] else 0
+            group['processes'] += 1
+            group['threads'] += info['num_threads'] or 0
+
+        self.last_time = now
+        self.last_cpu = cpu
+
+        busiest = sorted(
+            # Kernel threads have no resident memory and are never interesting
+            (name for name, group in groups.items() if not group['watched'] and group['rss']),
+            key=lambda name: groups[name]['cpu_percent'],
+            reverse=True
+        )[:self.top]
+        return {name: group for name, group in groups.items() if group['watched'] or name in busiest}
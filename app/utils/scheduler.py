@@ -0,0 +1,258 @@
+"""
+Adaptive poll scheduling
+Gives every device its own poll interval: stable series are polled less
+often, volatile or alerting devices more often, unreachable devices back
+off exponentially, and all polls share a global polls/second budget
+"""
+import math
+import time
+import logging
+import threading
+from utils import alerting
+
+# Configure logging
+logger = logging.getLogger("utils.scheduler")
+
+
+class TokenBucket:
+    """Global polls/second budget shared by all collectors in the process"""
+
+    def __init__(self, rate=0, burst=None):
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate, burst=None):
+        """
+        Set the budget
+
+        Args:
+            rate: Polls per second (0 disables the budget)
+            burst: Bucket size (defaults to one second of polls)
+        """
+        with self._lock:
+            self.rate = rate
+            self.burst = burst if burst is not None else max(1, rate)
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    def acquire(self):
+        """Take one token, returning False if the budget is exhausted"""
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+# Shared budget for all schedulers in this process
+budget = TokenBucket()
+
+
+class DeviceSchedule:
+    """Scheduling state of one device"""
+
+    __slots__ = ('interval', 'next_due', 'failures', 'failed', 'series')
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_due = 0.0
+        self.failures = 0
+        self.failed = False
+        self.series = {}  # name -> [samples, ewma mean, ewma variance]
+
+    def volatility(self, min_samples=3):
+        """Return the largest coefficient of variation of the device's series, or None"""
+        values = [
+            math.sqrt(variance) / max(abs(mean), 1.0)
+            for samples, mean, variance in self.series.values()
+            if samples >= min_samples
+        ]
+        return max(values) if values else None
+
+
+class PollScheduler:
+    """
+    Per-device poll intervals for one collector
+
+    The collector asks for the devices that are due, polls them and the
+    scheduler picks each device's next interval from the outcome:
+
+    - unreachable or failed: base * 2^failures
+    - device with an active alert: alert_interval
+    - stable series (CV <= stable_cv): interval grows by 1.5x
+    - volatile series (CV >= volatile_cv): interval halves
+    - otherwise: interval moves back towards the collector's base interval
+
+    Intervals are always kept within [min_interval, max_interval].
+    """
+
+    def __init__(self, base_interval, min_interval=10, max_interval=300, alert_interval=10,
+                 stable_cv=0.05, volatile_cv=0.25, alpha=0.3, tick=1):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alert_interval = alert_interval
+        self.stable_cv = stable_cv
+        self.volatile_cv = volatile_cv
+        self.alpha = alpha
+        self.tick = tick
+        self.schedules = {}
+        self._alerting = set()
+        self._owned = ()  # ids of the devices offered to the last due()
+
+    @classmethod
+    def from_config(cls, config, base_interval):
+        """
+        Create a scheduler from the `scheduling` config section
+
+        Args:
+            config: Application configuration
+            base_interval: Collector's default interval in seconds
+
+        Returns:
+            PollScheduler, or None if adaptive scheduling is disabled
+        """
+        scheduling = config.get('scheduling', {})
+        if not scheduling.get('enabled', False):
+            return None
+        return cls(
+            base_interval,
+            min_interval=scheduling.get('min_interval', 10),
+            max_interval=scheduling.get('max_interval', 300),
+            alert_interval=scheduling.get('alert_interval', 10),
+            stable_cv=scheduling.get('stable_cv', 0.05),
+            volatile_cv=scheduling.get('volatile_cv', 0.25),
+            alpha=scheduling.get('ewma_alpha', 0.3),
+            tick=scheduling.get('tick', 1)
+        )
+
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _schedule(self, device_id):
+        schedule = self.schedules.get(device_id)
+        if schedule is None:
+            schedule = self.schedules[device_id] = DeviceSchedule(self._clamp(self.base_interval))
+        return schedule
+
+    def due(self, devices, now=None):
+        """
+        Return the devices to poll now, most overdue first
+
+        Devices that are due but do not fit in the global budget stay due
+        and are offered again on the next tick.
+
+        Args:
+            devices: Devices owned by the collector
+            now: Current time (default time.time())
+        """
+        now = time.time() if now is None else now
+        self._alerting = {alert.get('device_id') for alert in list(alerting.active_alerts.values())}
+
+        due = []
+        for device in devices:
+            schedule = self._schedule(device['id'])
+            if schedule.next_due <= now:
+                due.append((schedule.next_due, device))
+        due.sort(key=lambda item: item[0])
+        self._owned = [device['id'] for device in devices]
+
+        selected = []
+        for _, device in due:
+            if not budget.acquire():
+                break
+            selected.append(device)
+        return selected
+
+    def next_wakeup(self, now=None):
+        """
+        Seconds until the next device is due (at least one tick)
+
+        Called after the cycle, so it includes the next poll times that
+        complete() picked for the devices just polled; devices left over by
+        the budget are still due and wake the collector on the next tick.
+        """
+        now = time.time() if now is None else now
+        next_due = min((self.schedules[device_id].next_due for device_id in self._owned),
+                       default=now + self.base_interval)
+        return max(self.tick, next_due - now)
+
+    def observe(self, device_id, name, value):
+        """
+        Feed a sample of a device series into its volatility estimate
+
+        Args:
+            device_id: Device ID
+            name: Series name (e.g. 'cpu_load')
+            value: Sample value
+        """
+        series = self._schedule(device_id).series
+        state = series.get(name)
+        if state is None:
+            series[name] = [1, float(value), 0.0]
+            return
+        diff = float(value) - state[1]
+        increment = self.alpha * diff
+        state[0] += 1
+        state[1] += increment
+        state[2] = (1 - self.alpha) * (state[2] + diff * increment)
+
+    def failure(self, device_id):
+        """Mark the current poll of a device as failed (unreachable or error)"""
+        self._schedule(device_id).failed = True
+
+    def complete(self, device_id, now=None):
+        """Pick the next poll time of a device after a poll"""
+        now = time.time() if now is None else now
+        schedule = self._schedule(device_id)
+
+        if schedule.failed:
+            schedule.failures += 1
+            interval = self.base_interval * 2 ** min(schedule.failures, 16)
+        else:
+            schedule.failures = 0
+            volatility = schedule.volatility()
+            if device_id in self._alerting:
+                interval = self.alert_interval
+            elif volatility is None:
+                interval = self.base_interval
+            elif volatility <= self.stable_cv:
+                interval = schedule.interval * 1.5
+            elif volatility >= self.volatile_cv:
+                interval = schedule.interval / 2
+            else:
+                interval = (schedule.interval + self.base_interval) / 2
+
+        schedule.failed = False
+        schedule.interval = self._clamp(interval)
+        schedule.next_due = now + schedule.interval
+
+    def snapshot(self):
+        """Return the current interval of every device"""
+        return {
+            device_id: {
+                'interval': round(schedule.interval, 1),
+                'failures': schedule.failures,
+                'volatility': schedule.volatility()
+            }
+            for device_id, schedule in self.schedules.items()
+        }
+
+
+def configure_budget(config, share=1.0):
+    """
+    Configure the global polls/second budget
+
+    Args:
+        config: Application configuration (uses `scheduling.max_polls_per_second`)
+        share: Fraction of the budget available to this process (worker processes
+            split the budget between them)
+    """
+    scheduling = config.get('scheduling', {})
+    rate = scheduling.get('max_polls_per_second', 0) if scheduling.get('enabled', False) else 0
+    budget.configure(rate * share)
@@ -0,0 +1,293 @@
+"""
+HTTP serving for the API and web servers
+Runs a Flask app under gunicorn (pre-forked workers with the app, config and
+InfluxDB clients preloaded, keep-alive, graceful reload on SIGHUP) and falls
+back to the threaded Flask server when gunicorn is not installed or the app
+is served from a background thread. Also negotiates response compression
+and answers conditional GETs.
+"""
+import os
+import re
+import gzip
+import hashlib
+import logging
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# Configure logging
+logger = logging.getLogger("utils.serving")
+
+# Response types worth compressing
+COMPRESSIBLE_TYPES = frozenset((
+    'application/json', 'text/html', 'text/plain', 'text/css', 'text/csv',
+    'application/javascript', 'text/javascript', 'image/svg+xml'
+))
+
+# Compressed bodies kept per (ETag, encoding), so identical responses are compressed once
+COMPRESSED_CACHE_SIZE = 128
+
+# Token query parameter of event streams, masked in access logs
+_TOKEN_PARAM = re.compile(r'((?:^|[?&])access_token=)[^&\s]*')
+
+
+def redact_query(text):
+    """Mask access tokens in a request line or query string before it is logged"""
+    return _TOKEN_PARAM.sub(r'\1[redacted]', text) if text else text
+
+
+def choose_encoding(accept_encoding, available):
+    """
+    Pick a content encoding from an Accept-Encoding header
+
+    Args:
+        accept_encoding: Header value such as "gzip, deflate, br;q=0.9"
+        available: Encodings the server supports, in order of preference
+
+    Returns:
+        Encoding with the highest q-value (ties go to the earlier one in
+        available), or None if the client accepts none of them
+    """
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best = None
+    best_q = 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def enable_compression(app, config):
+    """
+    Compress responses of a Flask app with brotli (when installed) or gzip
+
+    Args:
+        app: Flask app
+        config: Application configuration (`serving.compression` section)
+    """
+    compression_config = config.get('serving', {}).get('compression', {})
+    if not compression_config.get('enabled', True):
+        return
+    min_size = compression_config.get('min_size', 1024)
+    level = compression_config.get('level', 6)
+    brotli_quality = compression_config.get('brotli_quality', 5)
+    available = ('br', 'gzip') if brotli is not None and compression_config.get('brotli', True) else ('gzip',)
+    cache = OrderedDict()
+    cache_lock = threading.Lock()
+
+    def encode(data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=brotli_quality)
+        return gzip.compress(data, compresslevel=level)
+
+    @app.after_request
+    def compress(response):
+        response.vary.add('Accept-Encoding')
+        if (response.is_streamed or response.direct_passthrough or
+                response.status_code < 200 or response.status_code in (204, 304) or
+                'Content-Encoding' in response.headers or
+                response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        from flask import request
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'), available)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        etag = response.headers.get('ETag')
+        body = None
+        if etag:
+            with cache_lock:
+                body = cache.get((etag, encoding))
+        if body is None:
+            body = encode(data, encoding)
+            if etag:
+                with cache_lock:
+                    cache[(etag, encoding)] = body
+                    if len(cache) > COMPRESSED_CACHE_SIZE:
+                        cache.popitem(last=False)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def make_etag(*parts):
+    """Build a weak ETag from version parts"""
+    digest = hashlib.blake2b('\0'.join(str(part) for part in parts).encode('utf-8'), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header with an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith('W/') else candidate) == opaque:
+            return True
+    return False
+
+
+def conditional(stamp):
+    """
+    Decorator answering conditional GETs of a Flask view
+
+    Args:
+        stamp: Callable returning a version stamp of the view's data, or
+            None when unknown. With a stamp the ETag is checked before the
+            view runs (no InfluxDB query for unchanged data); without one
+            the ETag is a hash of the response body, which still saves the
+            transfer.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            from flask import request, make_response
+
+            version = stamp()
+            etag = make_etag(request.full_path, version) if version is not None else None
+            if etag and etag_matches(request.headers.get('If-None-Match'), etag):
+                return _not_modified(etag)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            if etag is None:
+                etag = make_etag(request.full_path, hashlib.blake2b(response.get_data(), digest_size=16).hexdigest())
+                if etag_matches(request.headers.get('If-None-Match'), etag):
+                    return _not_modified(etag)
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated
+    return decorator
+
+
+def _not_modified(etag):
+    from flask import Response
+    return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+
+def gunicorn_options(config, host, port):
+    """
+    Build gunicorn settings from the `serving` config section
+
+    Returns:
+        Dictionary of gunicorn setting name -> value
+    """
+    serving_config = config.get('serving', {})
+    workers = serving_config.get('workers', 0) or (2 * (os.cpu_count() or 1) + 1)
+    return {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': serving_config.get('threads', 4),
+        'keepalive': serving_config.get('keepalive', 5),
+        'timeout': serving_config.get('timeout', 30),
+        'graceful_timeout': serving_config.get('graceful_timeout', 30),
+        'max_requests': serving_config.get('max_requests', 1000),
+        'max_requests_jitter': serving_config.get('max_requests_jitter', 100),
+        'backlog': serving_config.get('backlog', 2048),
+        'preload_app': True,
+        'logger_class': _gunicorn_logger_class
+    }
+
+
+def _gunicorn_logger_class():
+    """gunicorn logger that masks access tokens in the access log"""
+    from gunicorn.glogging import Logger
+
+    class RedactingLogger(Logger):
+        def atoms(self, resp, req, environ, request_time):
+            atoms = super().atoms(resp, req, environ, request_time)
+            for key in ('r', 'q'):
+                if key in atoms:
+                    atoms[key] = redact_query(atoms[key])
+            return atoms
+
+    return RedactingLogger
+
+
+def _run_gunicorn(app, options):
+    """Run a WSGI app under gunicorn in this process (blocks until shutdown)"""
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Application().run()
+
+
+def serve(app, config, host, port):
+    """
+    Serve a Flask app
+
+    Uses gunicorn when `serving.server` is 'gunicorn' (the default), it is
+    installed and this is the main thread (gunicorn manages its workers with
+    signals); otherwise the threaded Flask server with HTTP/1.1 keep-alive.
+
+    Args:
+        app: Flask app, with its config and clients already initialized so
+            pre-forked workers share them
+        config: Application configuration
+        host: Listen address
+        port: Listen port
+    """
+    server = config.get('serving', {}).get('server', 'gunicorn')
+    if server == 'gunicorn' and threading.current_thread() is threading.main_thread():
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            logger.warning("gunicorn is not installed (pip install gunicorn), using the Flask server")
+        else:
+            options = gunicorn_options(config, host, port)
+            logger.info(f"Serving {app.name} on {host}:{port} with gunicorn ({options['workers']} workers)")
+            _run_gunicorn(app, options)
+            return
+
+    from werkzeug.serving import WSGIRequestHandler
+
+    class RequestHandler(WSGIRequestHandler):
+        # HTTP/1.1 lets clients keep connections open between requests
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, code='-', size='-'):
+            self.path = redact_query(self.path)
+            self.requestline = redact_query(self.requestline)
+            super().log_request(code, size)
+
+    logger.info(f"Serving {app.name} on {host}:{port} with the Flask server")
+    app.run(host=host, port=port, threaded=True, use_reloader=False, request_handler=RequestHandler)
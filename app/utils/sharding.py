@@ -0,0 +1,300 @@
+"""
+Device sharding
+Splits the device inventory across collector instances with a consistent
+hash ring on device id. Instances find each other through heartbeat files
+in a shared directory (local disk, or a shared mount for several hosts).
+"""
+import os
+import json
+import time
+import bisect
+import socket
+import hashlib
+import logging
+import threading
+from utils.telemetry import telemetry
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Configure logging
+logger = logging.getLogger("utils.sharding")
+
+# Project root; relative store directories are resolved against it
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def _hash(key):
+    """Return a stable 64-bit hash of a string"""
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring
+
+    Every member is placed on the ring at `vnodes` points, so adding or
+    removing a member only moves about 1/N of the keys.
+    """
+
+    def __init__(self, members=(), vnodes=128):
+        self.vnodes = vnodes
+        self.members = tuple(sorted(members))
+        points = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        )
+        self._hashes = [point[0] for point in points]
+        self._owners = [point[1] for point in points]
+
+    def owner(self, key):
+        """Return the member owning a key, or None if the ring is empty"""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class FileMembershipStore:
+    """
+    Membership store backed by heartbeat files
+
+    Each instance keeps `<store_dir>/members/<instance>.json` fresh; members
+    whose heartbeat is older than member_timeout are considered gone and
+    their files are removed. Updates are serialized with an flock on
+    `<store_dir>/lock`.
+    """
+
+    def __init__(self, store_dir, member_timeout=30):
+        self.store_dir = store_dir
+        self.members_dir = os.path.join(store_dir, 'members')
+        self.lock_path = os.path.join(store_dir, 'lock')
+        self.member_timeout = member_timeout
+        os.makedirs(self.members_dir, exist_ok=True)
+
+    def _locked(self):
+        """Return an open lock file holding an exclusive lock"""
+        lock_file = open(self.lock_path, 'a')
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _member_path(self, instance_id):
+        return os.path.join(self.members_dir, f"{instance_id}.json")
+
+    def heartbeat(self, instance_id, info=None):
+        """
+        Refresh an instance's heartbeat and return the live members
+
+        Args:
+            instance_id: Instance identifier
+            info: Optional dictionary stored with the heartbeat
+
+        Returns:
+            Sorted list of live instance ids
+        """
+        with self._locked():
+            path = self._member_path(instance_id)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w') as file:
+                json.dump({'instance': instance_id, 'heartbeat': time.time(), **(info or {})}, file)
+            os.replace(temp_path, path)
+            return self.members(prune=True)
+
+    def members(self, prune=False):
+        """
+        Return the live members without heartbeating
+
+        Args:
+            prune: Remove the files of stale members (only under the lock)
+
+        Returns:
+            Sorted list of live instance ids
+        """
+        now = time.time()
+        members = []
+        for name in os.listdir(self.members_dir):
+            if not name.endswith('.json'):
+                continue
+            member_path = os.path.join(self.members_dir, name)
+            try:
+                with open(member_path, 'r') as file:
+                    heartbeat = json.load(file).get('heartbeat', 0)
+            except (OSError, ValueError):
+                continue
+            if now - heartbeat > self.member_timeout:
+                if prune:
+                    logger.info(f"Removing stale shard member {name[:-5]}")
+                    try:
+                        os.remove(member_path)
+                    except OSError:
+                        pass
+                continue
+            members.append(name[:-5])
+        return sorted(members)
+
+    def leave(self, instance_id):
+        """Remove an instance from the membership"""
+        with self._locked():
+            try:
+                os.remove(self._member_path(instance_id))
+            except OSError:
+                pass
+
+
+class ShardCoordinator:
+    """
+    Decides which devices this collector instance polls
+
+    Disabled by default, in which case every device is owned. When enabled a
+    heartbeat thread keeps the membership fresh and rebuilds the hash ring
+    whenever an instance joins or leaves.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.instance_id = None
+        self.vnodes = 128
+        self.heartbeat_interval = 10
+        self.store = None
+        self.ring = HashRing()
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._owned = {}
+        self.follower = False
+        self.local_ring = None
+        self.local_member = None
+
+    def configure(self, config):
+        """
+        Configure sharding from the application config
+
+        Args:
+            config: Application configuration (uses the `sharding` section)
+        """
+        shard_config = config.get('sharding', {})
+        self.enabled = shard_config.get('enabled', False)
+        self.instance_id = (shard_config.get('instance_id') or os.environ.get('NETMON_INSTANCE_ID')
+                            or f"{socket.gethostname()}-{os.getpid()}")
+        self.vnodes = shard_config.get('vnodes', 128)
+        self.heartbeat_interval = shard_config.get('heartbeat_interval', 10)
+        if self.enabled:
+            store_dir = os.path.join(PROJECT_DIR, shard_config.get('store_dir') or os.path.join('data', 'shards'))
+            self.store = FileMembershipStore(
+                store_dir,
+                shard_config.get('member_timeout', 3 * self.heartbeat_interval)
+            )
+
+    def set_local_slice(self, index, count):
+        """
+        Restrict this process to one slice of the instance's devices
+
+        Used by worker processes that split a collector's devices between
+        them; the slice is applied on top of the instance's shard.
+
+        Args:
+            index: Slice index (0 <= index < count)
+            count: Number of slices
+        """
+        with self._lock:
+            if count > 1:
+                self.local_ring = HashRing([str(i) for i in range(count)], self.vnodes)
+                self.local_member = str(index)
+            else:
+                self.local_ring = None
+                self.local_member = None
+            self.generation += 1
+            self._owned = {}
+
+    def start(self, follow=False):
+        """
+        Join the membership and start the heartbeat thread
+
+        Args:
+            follow: Only track the membership without heartbeating (worker
+                processes follow the membership of their parent instance)
+        """
+        if not self.enabled or self._thread:
+            return
+        self.follower = follow
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="shard-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(f"Sharding enabled as instance {self.instance_id} "
+                    f"({len(self.ring.members)} members)")
+
+    def stop(self):
+        """Stop heartbeating and leave the membership"""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if not self.follower:
+            self.store.leave(self.instance_id)
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing shard membership: {str(e)}")
+
+    def refresh(self):
+        """Heartbeat and rebuild the ring if the membership changed"""
+        if self.follower:
+            members = self.store.members()
+        else:
+            members = self.store.heartbeat(self.instance_id, {'pid': os.getpid(), 'host': socket.gethostname()})
+        if self.instance_id not in members:
+            members = sorted(members + [self.instance_id])
+
+        if tuple(members) != self.ring.members:
+            with self._lock:
+                self.ring = HashRing(members, self.vnodes)
+                self.generation += 1
+                self._owned = {}
+            telemetry.count('shard_rebalances')
+            logger.info(f"Shard membership changed: {len(members)} members ({', '.join(members)})")
+
+    def owns(self, key):
+        """Return True if this instance owns a key (device id or other work item)"""
+        if self.enabled and self.ring.owner(key) not in (self.instance_id, None):
+            return False
+        return self.local_ring is None or self.local_ring.owner(key) == self.local_member
+
+    def owned(self, devices):
+        """
+        Filter a device list down to the devices owned by this instance
+
+        Args:
+            devices: List of device dictionaries
+
+        Returns:
+            List of owned devices (cached until the membership or list changes)
+        """
+        if not self.enabled and self.local_ring is None:
+            return devices
+
+        key = id(devices)
+        with self._lock:
+            cached = self._owned.get(key)
+            if cached and cached[0] == len(devices):
+                return cached[1]
+            generation = self.generation
+
+        owned = [device for device in devices if self.owns(device['id'])]
+        with self._lock:
+            if generation == self.generation:
+                self._owned[key] = (len(devices), owned)
+        return owned
+
+
+# Shared coordinator used by all collectors
+sharding = ShardCoordinator()
@@ -0,0 +1,224 @@
+"""
+Latest-value metrics snapshot for the Network Monitoring System
+Keeps the most recent value of every collected series in memory and renders
+it in OpenMetrics text format for Prometheus scrapes
+"""
+import re
+import gzip
+import math
+import time
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger("utils.snapshot")
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Prefix for all exported metric families
+METRIC_PREFIX = 'netmon'
+
+# Tags identifying the device a point belongs to, in order of preference
+DEVICE_TAGS = ('device_id', 'hostname', 'target')
+
+# Seconds after which a series that stopped receiving points is dropped
+DEFAULT_STALE_AFTER = 600
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_:]')
+# Label names may not contain colons, unlike metric names
+_INVALID_LABEL_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _metric_name(measurement, field):
+    """Build a valid OpenMetrics family name from a measurement and field"""
+    return _INVALID_NAME_CHARS.sub('_', f"{METRIC_PREFIX}_{measurement}_{field}")
+
+
+def _label_name(tag):
+    """Build a valid label name ([a-zA-Z_][a-zA-Z0-9_]*) from a tag key"""
+    name = _INVALID_LABEL_CHARS.sub('_', str(tag))
+    if not name or name[0].isdigit():
+        name = '_' + name
+    return name
+
+
+def _escape_label_value(value):
+    """Escape a label value as required by the exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    """Format a sample value, spelling special floats the OpenMetrics way"""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class MetricsSnapshot:
+    """
+    In-memory snapshot of the latest value of every series
+
+    Label strings are computed once per distinct tag set and rendered text is
+    cached per (family, device) chunk, so a scrape only re-renders the chunks
+    that changed since the previous one. Series that received no point for
+    `stale_after` seconds (departed wireless clients, removed devices) are
+    dropped.
+    """
+
+    def __init__(self):
+        self.stale_after = DEFAULT_STALE_AFTER
+        self._lock = threading.Lock()
+        self._families = {}     # family -> device -> label string -> (value, monotonic time)
+        self._chunks = {}       # (family, device) -> rendered text
+        self._labels = {}       # tag tuple -> label string
+        self._names = {}        # (measurement, field) -> family
+        self._generation = 0
+        self._rendered = None   # (generation, text, gzipped text)
+        self._next_expiry = None
+
+    def configure(self, config):
+        """Apply the `api.metrics` config section"""
+        self.stale_after = config.get('api', {}).get('metrics', {}).get('stale_after', DEFAULT_STALE_AFTER)
+
+    def update(self, data):
+        """
+        Record the latest values from a batch of points
+
+        Args:
+            data: List of point dictionaries as passed to InfluxClient.write_data
+        """
+        if isinstance(data, dict):
+            data = [data]
+
+        now = time.monotonic()
+        with self._lock:
+            for point in data:
+                if not isinstance(point, dict):
+                    continue
+                measurement = point.get('measurement')
+                tags = point.get('tags', {})
+                fields = point.get('fields', {})
+                if not measurement or not fields:
+                    continue
+
+                tag_key = tuple(sorted((k, str(v)) for k, v in tags.items()))
+                labels = self._labels.get(tag_key)
+                if labels is None:
+                    labels = ','.join(f'{_label_name(k)}="{_escape_label_value(v)}"'
+                                      for k, v in tag_key)
+                    labels = self._labels[tag_key] = '{' + labels + '}' if labels else ''
+
+                device = ''
+                for tag in DEVICE_TAGS:
+                    if tag in tags:
+                        device = str(tags[tag])
+                        break
+
+                for field, value in fields.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    elif not isinstance(value, (int, float)):
+                        continue
+
+                    name_key = (measurement, field)
+                    family = self._names.get(name_key)
+                    if family is None:
+                        family = self._names[name_key] = _metric_name(measurement, field)
+
+                    self._families.setdefault(family, {}).setdefault(device, {})[labels] = (value, now)
+                    self._chunks.pop((family, device), None)
+
+            self._generation += 1
+            if self._next_expiry is None and self.stale_after:
+                self._next_expiry = now + self.stale_after
+
+    def _expire(self, now):
+        """Drop series older than stale_after (called with the lock held)"""
+        if self._next_expiry is None or now < self._next_expiry:
+            return
+        cutoff = now - self.stale_after
+        oldest = None
+        expired = False
+        for family in list(self._families):
+            devices = self._families[family]
+            for device in list(devices):
+                series = devices[device]
+                stale = [labels for labels, (_, seen) in series.items() if seen < cutoff]
+                for labels in stale:
+                    del series[labels]
+                if stale:
+                    expired = True
+                    self._chunks.pop((family, device), None)
+                    if not series:
+                        del devices[device]
+                        continue
+                seen = min(seen for _, seen in series.values())
+                oldest = seen if oldest is None else min(oldest, seen)
+            if not devices:
+                del self._families[family]
+        if expired:
+            self._generation += 1
+        self._next_expiry = oldest + self.stale_after if oldest is not None and self.stale_after else None
+
+    def render(self, target=None):
+        """
+        Render the snapshot in OpenMetrics text format
+
+        Args:
+            target: Optional device ID (or hostname / probe target) to filter on
+
+        Returns:
+            Exposition text
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            if target is None and self._rendered and self._rendered[0] == self._generation:
+                return self._rendered[1]
+
+            parts = []
+            for family in sorted(self._families):
+                devices = self._families[family]
+                if target is not None and target not in devices:
+                    continue
+
+                parts.append(f"# TYPE {family} gauge\n")
+                for device in ([target] if target is not None else devices):
+                    chunk = self._chunks.get((family, device))
+                    if chunk is None:
+                        chunk = ''.join(f"{family}{labels} {_format_value(value)}\n"
+                                        for labels, (value, _) in devices[device].items())
+                        self._chunks[(family, device)] = chunk
+                    parts.append(chunk)
+            parts.append("# EOF\n")
+            text = ''.join(parts)
+
+            if target is None:
+                self._rendered = (self._generation, text, None)
+            return text
+
+    def render_gzip(self, target=None):
+        """Render the snapshot and gzip it, reusing the cached body when unchanged"""
+        text = self.render(target)
+        if target is not None:
+            return gzip.compress(text.encode('utf-8'), compresslevel=1)
+
+        with self._lock:
+            if self._rendered and self._rendered[1] is text and self._rendered[2] is not None:
+                return self._rendered[2]
+        body = gzip.compress(text.encode('utf-8'), compresslevel=1)
+        with self._lock:
+            if self._rendered and self._rendered[1] is text:
+                self._rendered = (self._rendered[0], text, body)
+        return body
+
+    def series_count(self):
+        """Return the number of series held in the snapshot"""
+        with self._lock:
+            return sum(len(series) for devices in self._families.values() for series in devices.values())
+
+
+# Process-wide snapshot fed by InfluxClient.write_data
+snapshot = MetricsSnapshot()
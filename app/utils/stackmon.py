@@ -0,0 +1,228 @@
+"""
+Monitoring stack self-monitoring
+Tracks the resources and health of the local InfluxDB (RSS, open files,
+write latency from its /metrics endpoint, WAL size on disk) and of the
+collector processes, so the monitoring host is flagged before it becomes
+the bottleneck.
+"""
+import os
+import re
+import json
+import time
+import psutil
+import logging
+import urllib.request
+from utils.sampler import service_process
+
+# Configure logging
+logger = logging.getLogger("utils.stackmon")
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Prometheus sample line: name{labels} value
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{([^}]*)\})?\s+(\S+)')
+
+# Write endpoint request histogram in the InfluxDB /metrics output
+WRITE_DURATION = 'http_api_request_duration_seconds'
+WRITE_PATH = '/api/v2/write'
+
+DEFAULT_THRESHOLDS = {
+    'influxd_rss_mb': 2048,
+    'influxd_open_files_percent': 80,
+    'write_latency_ms': 500,
+    'wal_size_mb': 1024,
+    'collector_rss_mb': 512
+}
+
+
+def parse_metrics(text, names):
+    """
+    Sum the samples of selected Prometheus metrics
+
+    Args:
+        text: Prometheus text exposition
+        names: Dictionary of metric name -> required label substring (or '')
+
+    Returns:
+        Dictionary of metric name -> summed value over matching samples
+    """
+    totals = {}
+    for line in text.splitlines():
+        if not line or line[0] == '#':
+            continue
+        match = _SAMPLE.match(line)
+        if not match or match.group(1) not in names:
+            continue
+        if names[match.group(1)] not in (match.group(2) or ''):
+            continue
+        try:
+            totals[match.group(1)] = totals.get(match.group(1), 0.0) + float(match.group(3))
+        except ValueError:
+            continue
+    return totals
+
+
+def directory_size(path):
+    """Return the total size in bytes of the files below a directory"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        total += directory_size(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return total
+
+
+class StackMonitor:
+    """
+    Samples influxd and the collector processes once per system collector cycle
+
+    The influxd process is looked up once and re-discovered only after it
+    exits. Write latency is the mean duration of the /api/v2/write requests
+    InfluxDB served since the previous sample.
+    """
+
+    def __init__(self, influx_url='http://localhost:8086', data_dir=None, timeout=2.0,
+                 process_name='influxd', thresholds=None):
+        """
+        Args:
+            influx_url: Base URL of the InfluxDB HTTP API
+            data_dir: InfluxDB data directory (engine/wal is measured)
+            timeout: Seconds to wait for /health and /metrics
+            process_name: Name of the InfluxDB process
+            thresholds: Alert thresholds (see DEFAULT_THRESHOLDS)
+        """
+        self.influx_url = influx_url.rstrip('/')
+        self.data_dir = data_dir or os.path.join(PROJECT_DIR, 'data', 'influxdb')
+        self.timeout = timeout
+        self.process_name = process_name
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self._influxd = None
+        self._write_totals = None  # (sum seconds, count) of the previous sample
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a monitor from the `system.stack` and `influxdb` config sections"""
+        stack_config = config.get('system', {}).get('stack', {})
+        influx_config = config.get('influxdb', {})
+        default_url = f"http://{influx_config.get('host', 'localhost')}:{influx_config.get('port', 8086)}"
+        data_dir = stack_config.get('data_dir')
+        return cls(
+            influx_url=stack_config.get('influx_url', default_url),
+            data_dir=os.path.join(PROJECT_DIR, data_dir) if data_dir else None,
+            timeout=stack_config.get('timeout', 2.0),
+            process_name=stack_config.get('process_name', 'influxd'),
+            thresholds=stack_config.get('thresholds')
+        )
+
+    def _find_influxd(self):
+        """Return the influxd process, or None if it is not running on this host"""
+        if self._influxd is not None and self._influxd.is_running():
+            return self._influxd
+        self._influxd = None
+        for process in psutil.process_iter(attrs=['name']):
+            if process.info['name'] == self.process_name:
+                self._influxd = process
+                break
+        return self._influxd
+
+    def _get(self, path):
+        """GET an InfluxDB endpoint, returning (status, body, latency ms)"""
+        start = time.monotonic()
+        with urllib.request.urlopen(f"{self.influx_url}{path}", timeout=self.timeout) as response:
+            body = response.read()
+            return response.status, body, (time.monotonic() - start) * 1000.0
+
+    def sample(self):
+        """
+        Take a sample
+
+        Returns:
+            Dictionary of metric name -> value; influxd metrics are missing
+            when influxd does not run on this host or does not answer
+        """
+        metrics = {}
+
+        process = self._find_influxd()
+        if process is not None:
+            try:
+                with process.oneshot():
+                    metrics['influxd_rss'] = process.memory_info().rss
+                    metrics['influxd_open_files'] = process.num_fds() if hasattr(process, 'num_fds') else process.num_handles()
+                    soft_limit = process.rlimit(psutil.RLIMIT_NOFILE)[0] if hasattr(psutil, 'RLIMIT_NOFILE') else -1
+                if soft_limit > 0:
+                    metrics['influxd_open_files_percent'] = 100.0 * metrics['influxd_open_files'] / soft_limit
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+                logger.debug(f"Cannot inspect influxd: {str(e)}")
+
+        try:
+            status, body, latency = self._get('/health')
+            health = json.loads(body or b'{}')
+            metrics['health_ok'] = 1 if status == 200 and health.get('status') == 'pass' else 0
+            metrics['health_latency_ms'] = latency
+        except Exception as e:
+            logger.debug(f"InfluxDB health check failed: {str(e)}")
+            metrics['health_ok'] = 0
+
+        if metrics['health_ok']:
+            try:
+                _, body, _ = self._get('/metrics')
+                totals = parse_metrics(body.decode('utf-8', errors='replace'), {
+                    f'{WRITE_DURATION}_sum': WRITE_PATH,
+                    f'{WRITE_DURATION}_count': WRITE_PATH
+                })
+                current = (totals.get(f'{WRITE_DURATION}_sum', 0.0), totals.get(f'{WRITE_DURATION}_count', 0.0))
+                previous = self._write_totals
+                self._write_totals = current
+                if previous and current[1] > previous[1] and current[0] >= previous[0]:
+                    metrics['write_latency_ms'] = 1000.0 * (current[0] - previous[0]) / (current[1] - previous[1])
+                    metrics['writes'] = current[1] - previous[1]
+            except Exception as e:
+                logger.debug(f"Could not read InfluxDB metrics: {str(e)}")
+
+        wal_dir = os.path.join(self.data_dir, 'engine', 'wal')
+        if os.path.isdir(wal_dir):
+            metrics['wal_size'] = directory_size(wal_dir)
+
+        # The service's main process plus its worker processes (also when sampled from a worker)
+        root = service_process()
+        rss = root.memory_info().rss
+        for child in root.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+        metrics['collector_rss'] = rss
+        return metrics
+
+    def check(self, metrics):
+        """
+        Compare a sample with the thresholds
+
+        Returns:
+            List of (resource, value, threshold, breached) tuples; values are
+            in the thresholds' units (MB, ms, percent)
+        """
+        values = {
+            'influxd_rss_mb': metrics.get('influxd_rss', 0) / 1048576.0 if 'influxd_rss' in metrics else None,
+            'influxd_open_files_percent': metrics.get('influxd_open_files_percent'),
+            'write_latency_ms': metrics.get('write_latency_ms'),
+            'wal_size_mb': metrics.get('wal_size', 0) / 1048576.0 if 'wal_size' in metrics else None,
+            'collector_rss_mb': metrics['collector_rss'] / 1048576.0
+        }
+        results = []
+        for resource, value in values.items():
+            threshold = self.thresholds.get(resource)
+            if value is None or not threshold:
+                continue
+            results.append((resource, round(value, 2), threshold, value > threshold))
+        # An unreachable InfluxDB is always worth an alert
+        results.append(('influx_health', metrics['health_ok'], 1, not metrics['health_ok']))
+        return results
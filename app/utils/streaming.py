@@ -0,0 +1,383 @@
+"""
+RouterOS table streaming
+Keeps a local mirror of frequently changing RouterOS tables (wireless
+registrations, interfaces) up to date with `listen` commands instead of
+re-printing them on every poll, and reports row changes as they happen
+"""
+import time
+import socket
+import asyncio
+import hashlib
+import logging
+import binascii
+import threading
+from utils.telemetry import telemetry
+from utils.routeros_wire import encode_sentence, read_sentence
+
+# Configure logging
+logger = logging.getLogger("utils.streaming")
+
+# Tables mirrored for each collector that can read from the mirror
+COLLECTOR_PATHS = {
+    'mikrotik': ('/interface',),
+    'wireless': ('/interface/wireless', '/interface/wireless/registration-table')
+}
+
+# Reconnect delays (seconds) after a stream connection fails
+RECONNECT_BASE = 1
+RECONNECT_MAX = 60
+
+_BOOLEANS = {'yes': True, 'true': True, 'no': False, 'false': False}
+
+
+def _parse_value(value):
+    """Convert an attribute value the way librouteros does (ints and yes/no booleans)"""
+    try:
+        number = int(value)
+        if str(number) == value:
+            return number
+    except ValueError:
+        pass
+    return _BOOLEANS.get(value, value)
+
+
+def _parse_sentence(words):
+    """
+    Split a reply sentence into its parts
+
+    Returns:
+        Tuple of (reply word, tag, attribute dictionary)
+    """
+    tag = None
+    attributes = {}
+    for word in words[1:]:
+        if word.startswith('.tag='):
+            tag = word[5:]
+        elif word.startswith('='):
+            key, _, value = word[1:].partition('=')
+            attributes[key] = _parse_value(value)
+    return words[0] if words else '', tag, attributes
+
+
+class TableMirror:
+    """
+    Local copy of one RouterOS table, keyed by `.id`
+
+    Rows from `listen` replies are merged over the stored row; rows carrying
+    `.dead=true` are removed. The mirror is only used for snapshots once the
+    initial print has completed (`synced`).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = {}
+        self.synced = False
+        self.updated = 0
+
+    def apply(self, row):
+        """
+        Apply one row update
+
+        Returns:
+            Tuple of (event, row, previous row) where event is 'add', 'update'
+            or 'remove', or None if the row has no `.id`
+        """
+        row_id = row.get('.id')
+        if row_id is None:
+            return None
+        self.updated = time.time()
+
+        previous = self.rows.get(row_id)
+        if row.get('.dead'):
+            self.rows.pop(row_id, None)
+            return ('remove', previous or row, previous) if previous else None
+
+        merged = {**previous, **row} if previous else row
+        self.rows[row_id] = merged
+        return ('add' if previous is None else 'update', merged, previous)
+
+    def reset(self):
+        """Forget the rows before a new initial print"""
+        self.rows = {}
+        self.synced = False
+
+    def snapshot(self):
+        """Return the current rows"""
+        return list(self.rows.values())
+
+
+class DeviceStream:
+    """
+    Streams the mirrored tables of one device
+
+    A single API connection carries a tagged `listen` and `print` for every
+    table; the listen is sent first so no change between the two is missed.
+    Lost connections are retried with exponential backoff and the mirrors
+    stay unsynced (collectors fall back to polling) until the next print.
+    """
+
+    def __init__(self, manager, device):
+        self.manager = manager
+        self.device = device
+        self.mirrors = {}
+        self.tags = {}
+        self.connected = False
+        self.last_access = time.time()
+        self.task = None
+        self._writer = None
+        self._next_tag = 0
+
+    def add_paths(self, paths):
+        """Mirror additional tables, subscribing right away if connected"""
+        new_paths = [path for path in paths if path not in self.mirrors]
+        for path in new_paths:
+            self.mirrors[path] = TableMirror(path)
+            if self.connected:
+                self._subscribe(path)
+
+    def _subscribe(self, path):
+        """Send the listen and initial print of a table"""
+        self.mirrors[path].reset()
+        self._next_tag += 1
+        listen_tag = f"l{self._next_tag}"
+        print_tag = f"p{self._next_tag}"
+        self.tags[listen_tag] = (path, 'listen')
+        self.tags[print_tag] = (path, 'print')
+        self._writer.write(encode_sentence([f"{path}/listen", f".tag={listen_tag}"]))
+        self._writer.write(encode_sentence([f"{path}/print", f".tag={print_tag}"]))
+
+    async def run(self):
+        """Stream until cancelled, reconnecting after failures"""
+        failures = 0
+        while True:
+            try:
+                await self._session()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.debug(f"Stream to device {self.device['id']} failed: {str(e)}")
+            finally:
+                self._disconnect()
+
+            telemetry.count('stream_reconnects')
+            await asyncio.sleep(min(RECONNECT_BASE * 2 ** max(failures - 1, 0), self.manager.reconnect_max))
+
+    async def _session(self):
+        """Connect, log in, subscribe to every table and process replies"""
+        device = self.device
+        reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(device['host'], device.get('api_port', 8728)),
+            timeout=self.manager.connect_timeout
+        )
+        # Listens can be quiet for a long time; let TCP detect dead routers
+        sock = self._writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        await asyncio.wait_for(self._login(reader), timeout=self.manager.connect_timeout)
+        self.connected = True
+        self.tags = {}
+        for path in list(self.mirrors):
+            self._subscribe(path)
+        await self._writer.drain()
+        logger.debug(f"Streaming {len(self.mirrors)} tables from device {device['id']}")
+
+        while True:
+            reply, tag, attributes = _parse_sentence(await read_sentence(reader))
+            if reply == '!fatal':
+                raise ConnectionError(f"session terminated: {attributes}")
+            target = self.tags.get(tag)
+            if target is None:
+                continue
+            path, kind = target
+            mirror = self.mirrors[path]
+
+            if reply == '!re':
+                change = mirror.apply(attributes)
+                if change and mirror.synced:
+                    self.manager.dispatch(self.device, path, *change)
+            elif reply == '!trap':
+                raise ConnectionError(f"{kind} of {path} failed: {attributes.get('message', '')}")
+            elif reply == '!done':
+                if kind == 'listen':
+                    raise ConnectionError(f"listen of {path} ended")
+                mirror.synced = True
+                del self.tags[tag]
+
+    async def _login(self, reader):
+        """Log in with the plain method, answering a challenge from pre-6.43 routers"""
+        device = self.device
+        username = device.get('api_user', 'admin')
+        password = device.get('api_password', '')
+        self._writer.write(encode_sentence(['/login', f"=name={username}", f"=password={password}"]))
+
+        while True:
+            reply, _, attributes = _parse_sentence(await read_sentence(reader))
+            if reply == '!trap':
+                raise ConnectionError(f"login failed: {attributes.get('message', '')}")
+            if reply == '!done':
+                break
+
+        challenge = attributes.get('ret')
+        if challenge:
+            digest = hashlib.md5(b'\x00' + password.encode('utf-8') + binascii.unhexlify(str(challenge))).hexdigest()
+            self._writer.write(encode_sentence(['/login', f"=name={username}", f"=response=00{digest}"]))
+            reply, _, attributes = _parse_sentence(await read_sentence(reader))
+            if reply != '!done':
+                raise ConnectionError(f"login failed: {attributes.get('message', '')}")
+
+    def _disconnect(self):
+        self.connected = False
+        for mirror in self.mirrors.values():
+            mirror.synced = False
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class StreamManager:
+    """
+    Table streams for all devices of this process
+
+    Disabled by default. Streams run on one event loop thread and are started
+    on first use by a collector; a stream nobody has read for idle_timeout
+    seconds (e.g. a device moved to another shard) is closed.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.connect_timeout = 10
+        self.reconnect_max = RECONNECT_MAX
+        self.idle_timeout = 900
+        self.streams = {}
+        self.listeners = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """
+        Configure streaming from the application config
+
+        Args:
+            config: Application configuration (uses the `streaming` section)
+        """
+        streaming_config = config.get('streaming', {})
+        self.enabled = streaming_config.get('enabled', False)
+        self.connect_timeout = streaming_config.get('connect_timeout', 10)
+        self.reconnect_max = streaming_config.get('reconnect_max', RECONNECT_MAX)
+        self.idle_timeout = streaming_config.get('idle_timeout', 900)
+
+    def add_listener(self, path, callback):
+        """
+        Register a callback for changes of a table
+
+        The callback runs on the streaming thread as
+        callback(device, event, row, previous) with event 'add', 'update'
+        or 'remove'.
+        """
+        self.listeners.setdefault(path, []).append(callback)
+
+    def dispatch(self, device, path, event, row, previous):
+        """Pass a row change to the table's listeners"""
+        telemetry.count('stream_events')
+        for callback in self.listeners.get(path, ()):
+            try:
+                callback(device, event, row, previous)
+            except Exception as e:
+                logger.error(f"Error handling {path} change of device {device['id']}: {str(e)}")
+
+    def _start(self):
+        """Start the event loop thread"""
+        with self._lock:
+            if self._thread:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, name="table-streams", daemon=True)
+            self._thread.start()
+        logger.info("Started RouterOS table streaming")
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._reap())
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _reap(self):
+        """Close streams that are no longer read"""
+        while True:
+            await asyncio.sleep(60)
+            now = time.time()
+            for device_id, stream in list(self.streams.items()):
+                if now - stream.last_access > self.idle_timeout:
+                    stream.task.cancel()
+                    del self.streams[device_id]
+                    logger.info(f"Closed idle table stream of device {device_id}")
+
+    def _ensure(self, device, paths):
+        """Start (or extend) the stream of a device on the event loop"""
+        stream = self.streams.get(device['id'])
+        if stream is None:
+            stream = self.streams[device['id']] = DeviceStream(self, device)
+            stream.add_paths(paths)
+            stream.task = self._loop.create_task(stream.run())
+        else:
+            stream.add_paths(paths)
+
+    def rows(self, device, path, paths=None):
+        """
+        Return the mirrored rows of a device table
+
+        Starts streaming the device on first use.
+
+        Args:
+            device: Device dictionary
+            path: Table path (e.g. '/interface/wireless/registration-table')
+            paths: All tables to stream for the device (default just `path`)
+
+        Returns:
+            List of rows, or None if the mirror is not synced yet and the
+            caller should poll the table itself
+        """
+        if not self.enabled or not device.get('use_api', False):
+            return None
+        if self._thread is None:
+            self._start()
+
+        stream = self.streams.get(device['id'])
+        wanted = paths or (path,)
+        if stream is None or any(p not in stream.mirrors for p in wanted):
+            self._loop.call_soon_threadsafe(self._ensure, device, wanted)
+            return None
+
+        stream.last_access = time.time()
+        mirror = stream.mirrors.get(path)
+        if mirror is None or not mirror.synced:
+            return None
+        telemetry.count('stream_snapshot_reads')
+        return mirror.snapshot()
+
+    def stop(self):
+        """Close all streams and stop the event loop"""
+        if not self._thread:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        self._thread.join(5)
+        self._thread = None
+        self.streams = {}
+
+    async def _shutdown(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop.stop()
+
+
+# Shared stream manager used by all collectors
+streams = StreamManager()
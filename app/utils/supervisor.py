@@ -0,0 +1,341 @@
+"""
+Collector supervisor
+Runs collector cycles with a wall-clock timeout, restarts failed cycles and
+worker processes with exponential backoff, detects crash loops and
+quarantines devices that repeatedly break a cycle
+"""
+import time
+import logging
+import threading
+from collections import deque
+from utils.telemetry import telemetry
+
+# Configure logging
+logger = logging.getLogger("utils.supervisor")
+
+# Collector states and their numeric codes in the collector_status measurement
+STATES = {
+    'starting': 0,
+    'running': 1,
+    'backoff': 2,
+    'crashloop': 3,
+    'stopped': 4
+}
+
+# Delay between cycles of a healthy collector without an interval
+DEFAULT_CYCLE_DELAY = 60
+
+
+class RestartPolicy:
+    """
+    Exponential backoff with crash-loop detection
+
+    The n-th consecutive failure waits backoff_base * 2^(n-1) seconds (capped
+    at backoff_max). More than crashloop_failures failures within
+    crashloop_window seconds mark a crash loop, which waits crashloop_delay.
+    """
+
+    def __init__(self, backoff_base=10, backoff_max=600, crashloop_failures=5,
+                 crashloop_window=900, crashloop_delay=1800):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.crashloop_failures = crashloop_failures
+        self.crashloop_window = crashloop_window
+        self.crashloop_delay = crashloop_delay
+        self.consecutive = 0
+        self.crashlooping = False
+        self._failures = deque()
+
+    def failure(self, now=None):
+        """
+        Record a failure
+
+        Returns:
+            Seconds to wait before the next attempt
+        """
+        now = time.time() if now is None else now
+        self.consecutive += 1
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.crashloop_window:
+            self._failures.popleft()
+
+        self.crashlooping = len(self._failures) >= self.crashloop_failures
+        if self.crashlooping:
+            return self.crashloop_delay
+        return min(self.backoff_base * 2 ** (self.consecutive - 1), self.backoff_max)
+
+    def success(self):
+        """Record a successful attempt"""
+        self.consecutive = 0
+        self.crashlooping = False
+
+
+class Quarantine:
+    """
+    Devices excluded from polling after repeatedly failing
+
+    A device gets a strike when polling it fails (record_device_error) or
+    when a cycle times out while it is being polled; `strikes` strikes
+    within `window` seconds quarantine it for `duration` seconds.
+    """
+
+    def __init__(self, strikes=3, window=3600, duration=3600):
+        self.strikes = strikes
+        self.window = window
+        self.duration = duration
+        self._strikes = {}
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def strike(self, device_id, now=None):
+        """
+        Record a strike against a device
+
+        Returns:
+            True if the device is now quarantined
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            strikes = [t for t in self._strikes.get(device_id, ()) if now - t <= self.window]
+            strikes.append(now)
+            if len(strikes) >= self.strikes:
+                self._strikes.pop(device_id, None)
+                self._until[device_id] = now + self.duration
+                return True
+            self._strikes[device_id] = strikes
+            return False
+
+    def active(self, now=None):
+        """Return the set of currently quarantined device ids"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for device_id in [d for d, until in self._until.items() if until <= now]:
+                del self._until[device_id]
+                logger.info(f"Device {device_id} released from quarantine")
+            return set(self._until)
+
+
+class CollectorState:
+    """Supervision state of one collector (or collector worker)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = 'starting'
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_success = None
+        self.last_cycle_seconds = None
+        self.next_run = None
+        self.quarantined = []
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'restarts': self.restarts,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'last_success': self.last_success,
+            'last_cycle_seconds': self.last_cycle_seconds,
+            'next_run': self.next_run,
+            'quarantined': list(self.quarantined)
+        }
+
+
+class Supervisor:
+    """
+    Supervises collector run loops
+
+    run() replaces the plain `collect, sleep` loop: every cycle runs in its
+    own thread so a cycle stuck in a device call is abandoned after
+    cycle_timeout (it stops at the next device), failures back off
+    exponentially, and the state of every collector is kept for the status
+    API and the collector_status measurement.
+    """
+
+    def __init__(self):
+        self.cycle_timeout = 300
+        self.publish_interval = 60
+        self.policy_config = {}
+        self.quarantine_config = {}
+        self.states = {}
+        self.last_publish = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def configure(self, config):
+        """
+        Configure supervision from the application config
+
+        Args:
+            config: Application configuration (uses the `supervisor` section)
+        """
+        supervisor_config = config.get('supervisor', {})
+        self.cycle_timeout = supervisor_config.get('cycle_timeout', 300)
+        self.publish_interval = supervisor_config.get('publish_interval', 60)
+        self.policy_config = {
+            'backoff_base': supervisor_config.get('backoff_base', 10),
+            'backoff_max': supervisor_config.get('backoff_max', 600),
+            'crashloop_failures': supervisor_config.get('crashloop_failures', 5),
+            'crashloop_window': supervisor_config.get('crashloop_window', 900),
+            'crashloop_delay': supervisor_config.get('crashloop_delay', 1800)
+        }
+        quarantine_config = supervisor_config.get('quarantine', {})
+        self.quarantine_config = {
+            'strikes': quarantine_config.get('strikes', 3),
+            'window': quarantine_config.get('window', 3600),
+            'duration': quarantine_config.get('duration', 3600)
+        }
+
+    def restart_policy(self):
+        """Return a new RestartPolicy with the configured settings"""
+        return RestartPolicy(**self.policy_config)
+
+    def register(self, name):
+        """Return the state for a collector, creating it if needed"""
+        with self._lock:
+            if name not in self.states:
+                self.states[name] = CollectorState(name)
+            return self.states[name]
+
+    def update(self, name, state):
+        """Store a state reported by a collector worker process"""
+        collector_state = self.register(name)
+        with self._lock:
+            for key, value in state.items():
+                if key != 'name' and hasattr(collector_state, key):
+                    setattr(collector_state, key, value)
+
+    def stop(self):
+        """Stop all run loops after their current cycle"""
+        self._stop.set()
+
+    def run(self, collector, cycle=None, after_cycle=None, name=None):
+        """
+        Run a collector until stop() is called
+
+        Args:
+            collector: Collector instance
+            cycle: Callable running one cycle (default collector.run_cycle)
+            after_cycle: Optional callable receiving the CollectorState after each cycle
+            name: State name (default collector.name)
+        """
+        state = self.register(name or collector.name)
+        policy = self.restart_policy()
+        quarantine = Quarantine(**self.quarantine_config)
+        collector.quarantine = quarantine
+        cycle = cycle or collector.run_cycle
+
+        while not self._stop.is_set():
+            collector.quarantined = quarantine.active()
+            state.quarantined = sorted(collector.quarantined)
+
+            start = time.time()
+            error = self._run_once(collector, cycle)
+            state.last_cycle_seconds = round(time.time() - start, 3)
+
+            if error is None:
+                policy.success()
+                state.state = 'running'
+                state.consecutive_failures = 0
+                state.last_success = time.time()
+                # Collectors with adaptive scheduling wake up when their next device is due;
+                # others start a cycle every interval
+                next_cycle_delay = getattr(collector, 'next_cycle_delay', None)
+                delay = next_cycle_delay() if next_cycle_delay else None
+                if delay is None:
+                    delay = max(getattr(collector, 'interval', DEFAULT_CYCLE_DELAY) - state.last_cycle_seconds, 0)
+            else:
+                delay = policy.failure()
+                state.restarts += 1
+                state.consecutive_failures = policy.consecutive
+                state.last_error = error
+                state.state = 'crashloop' if policy.crashlooping else 'backoff'
+                telemetry.count('collector_restarts', collector=collector.name)
+                if policy.crashlooping:
+                    logger.error(f"Collector {collector.name} is crash looping "
+                                 f"({policy.consecutive} consecutive failures), next attempt in {delay}s: {error}")
+                else:
+                    logger.warning(f"Collector {collector.name} failed, retrying in {delay}s: {error}")
+
+            state.next_run = time.time() + delay
+            if after_cycle:
+                try:
+                    after_cycle(state)
+                except Exception as e:
+                    logger.error(f"Error after cycle of collector {collector.name}: {str(e)}")
+            self._stop.wait(delay)
+
+        state.state = 'stopped'
+
+    def _run_once(self, collector, cycle):
+        """
+        Run one cycle in a separate thread, bounded by cycle_timeout
+
+        Returns:
+            None on success, otherwise an error description
+        """
+        result = {}
+
+        def target():
+            try:
+                cycle()
+            except Exception as e:
+                result['error'] = f"{e.__class__.__name__}: {str(e)}"
+
+        thread = threading.Thread(target=target, name=f"cycle-{collector.name}", daemon=True)
+        thread.start()
+        thread.join(self.cycle_timeout or None)
+
+        if thread.is_alive():
+            # The stuck call cannot be interrupted; make the cycle stop at the next device
+            device_id = collector.current_device
+            collector.cancel_cycle()
+            telemetry.count('cycle_timeouts', collector=collector.name)
+            if device_id:
+                collector.strike_device(device_id)
+            return f"Cycle exceeded {self.cycle_timeout}s (stuck on device {device_id})"
+        return result.get('error')
+
+    def snapshot(self):
+        """Return the state of all supervised collectors"""
+        with self._lock:
+            return {name: state.to_dict() for name, state in self.states.items()}
+
+    def publish(self, influx, force=False):
+        """
+        Write collector states to the collector_status measurement
+
+        Args:
+            influx: InfluxClient to write with
+            force: Write even if publish_interval has not elapsed
+        """
+        if not force and time.time() - self.last_publish < self.publish_interval:
+            return
+        self.last_publish = time.time()
+
+        data = []
+        for name, state in self.snapshot().items():
+            data.append({
+                "measurement": "collector_status",
+                "tags": {
+                    "collector": name
+                },
+                "fields": {
+                    "state": state['state'],
+                    "state_code": STATES.get(state['state'], -1),
+                    "restarts": state['restarts'],
+                    "consecutive_failures": state['consecutive_failures'],
+                    "quarantined": len(state['quarantined']),
+                    "last_cycle_seconds": float(state['last_cycle_seconds'] or 0.0),
+                    "last_error": state['last_error'] or ""
+                }
+            })
+
+        if data:
+            influx.write_data(data)
+
+
+# Shared supervisor for all collectors in this process
+supervisor = Supervisor()
@@ -0,0 +1,220 @@
+"""
+Self-telemetry for the Network Monitoring System
+Timing histograms and counters for collectors, device polls and writes
+"""
+import time
+import random
+import bisect
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger("utils.telemetry")
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds"""
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Record a single duration"""
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+        return BUCKETS[-1]
+
+    def to_fields(self):
+        """Return InfluxDB fields with cumulative bucket counts"""
+        fields = {
+            'count': float(self.count),
+            'sum': float(self.sum),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99)
+        }
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, self.counts):
+            cumulative += bucket_count
+            fields[f'le_{bound}'] = float(cumulative)
+        fields['le_inf'] = float(self.count)
+        return fields
+
+
+class _Timer:
+    """Context manager recording the elapsed time into a histogram"""
+
+    __slots__ = ('registry', 'key', 'start')
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe_key(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    """No-op timer returned for unsampled measurements"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Telemetry:
+    """
+    Registry of timing histograms and counters
+
+    Histograms and counters are keyed by a metric name plus a tuple of label
+    pairs. Per-device and round-trip timings are sampled (sample_rate) to keep
+    the overhead low; cycle timings and counters are always recorded. In
+    worker processes `worker` names the process; it tags the flushed points
+    so workers of the same collector write separate series.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.sample_rate = 1.0
+        self.flush_interval = 60
+        self.worker = None
+        self.histograms = {}
+        self.counters = {}
+        self.workers = {}  # worker name -> snapshot forwarded by a worker process
+        self.last_flush = 0
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """Apply the telemetry section of the application configuration"""
+        telemetry_config = config.get('telemetry', {})
+        self.enabled = telemetry_config.get('enabled', True)
+        self.sample_rate = float(telemetry_config.get('sample_rate', 1.0))
+        self.flush_interval = telemetry_config.get('flush_interval', 60)
+
+    def observe_key(self, key, value):
+        """Record a duration for an already built histogram key"""
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def observe(self, name, value, **labels):
+        """Record a duration in seconds"""
+        if self.enabled:
+            self.observe_key((name, tuple(sorted(labels.items()))), value)
+
+    def timer(self, name, sampled=False, **labels):
+        """
+        Return a context manager timing the enclosed block
+
+        Args:
+            name: Histogram name
+            sampled: Apply sample_rate to this measurement
+            **labels: Labels identifying the series (collector, device_id, ...)
+        """
+        if not self.enabled or (sampled and self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return _NULL_TIMER
+        return _Timer(self, (name, tuple(sorted(labels.items()))))
+
+    def count(self, name, value=1, **labels):
+        """Increment a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        """
+        Return the current telemetry as plain data
+
+        Returns:
+            Dictionary with histograms and counters
+        """
+        with self._lock:
+            histograms = [
+                dict(labels, metric=name, count=h.count, sum=round(h.sum, 6),
+                     p50=h.quantile(0.5), p90=h.quantile(0.9), p99=h.quantile(0.99))
+                for (name, labels), h in self.histograms.items()
+            ]
+            counters = [
+                dict(labels, metric=name, value=value)
+                for (name, labels), value in self.counters.items()
+            ]
+            for worker, worker_snapshot in self.workers.items():
+                histograms.extend(dict(entry, worker=worker) for entry in worker_snapshot['histograms'])
+                counters.extend(dict(entry, worker=worker) for entry in worker_snapshot['counters'])
+        return {'histograms': histograms, 'counters': counters}
+
+    def update_worker(self, worker, worker_snapshot):
+        """Store the latest snapshot of a worker process (served by snapshot())"""
+        with self._lock:
+            self.workers[worker] = worker_snapshot
+
+    def flush(self, influx, force=False):
+        """
+        Write telemetry to the internal collector_telemetry measurement
+
+        Args:
+            influx: InfluxClient to write with
+            force: Write even if flush_interval has not elapsed
+        """
+        if not self.enabled or (not force and time.time() - self.last_flush < self.flush_interval):
+            return
+        self.last_flush = time.time()
+
+        extra = {'worker': self.worker} if self.worker else {}
+        with self._lock:
+            data = []
+            for (name, labels), histogram in self.histograms.items():
+                data.append({
+                    "measurement": "collector_telemetry",
+                    "tags": dict(labels, metric=name, kind="histogram", **extra),
+                    "fields": histogram.to_fields()
+                })
+            for (name, labels), value in self.counters.items():
+                data.append({
+                    "measurement": "collector_telemetry",
+                    "tags": dict(labels, metric=name, kind="counter", **extra),
+                    "fields": {"value": float(value)}
+                })
+
+        if data:
+            influx.write_data(data)
+            logger.debug(f"Stored {len(data)} telemetry series")
+
+
+# Process-wide telemetry registry
+telemetry = Telemetry()
@@ -0,0 +1,141 @@
+"""
+RouterOS value parsing
+Parses the rate, duration and number formats printed by RouterOS (limits
+like "10M/5M", PHY rates like "144.4Mbps-20MHz/2S", uptimes like
+"1w2d3h4m5s"). Parsed strings are memoized: a fleet only has a few hundred
+distinct limit strings, but they are parsed on every queue every cycle.
+"""
+import re
+from functools import lru_cache
+
+# Leading number with an optional unit prefix, e.g. "-65@HT20-7", "10M", "1.5Gbps"
+_NUMBER = re.compile(r'\s*([-+]?\d+(?:\.\d+)?)\s*([kKMGT]?)')
+
+# RouterOS uses decimal prefixes for rates; "K" is accepted as "k"
+_RATE_SCALE = {'': 1, 'k': 1000, 'K': 1000, 'M': 1000000, 'G': 1000000000, 'T': 1000000000000}
+
+# Duration parts such as "1w", "2d", "3h", "4m", "5s", "120ms", "300us"
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|us|w|d|h|m|s)')
+_DURATION_SCALE = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1, 'ms': 0.001, 'us': 0.000001}
+
+# Size of the memoization caches
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_number(value, scaled):
+    match = _NUMBER.match(value)
+    if not match:
+        return 0
+    number = float(match.group(1))
+    if scaled:
+        number *= _RATE_SCALE[match.group(2)]
+    return int(number) if number.is_integer() else number
+
+
+def parse_number(value):
+    """
+    Parse the leading number of a RouterOS value
+
+    Args:
+        value: Number or string such as "-65@HT20-7" or "2412"
+
+    Returns:
+        Parsed number (int when integral), or 0 if there is none
+    """
+    if isinstance(value, (int, float)):
+        return value
+    return _parse_number(str(value), False)
+
+
+def parse_rate(value):
+    """
+    Parse a RouterOS rate into bits per second
+
+    Args:
+        value: Number or string such as "10M", "512k", "1.5G" or "144.4Mbps-20MHz/2S"
+
+    Returns:
+        Rate in bps (int when integral), or 0 if the value cannot be parsed
+    """
+    if isinstance(value, (int, float)):
+        return value
+    return _parse_number(str(value), True)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_pair(value, parser):
+    first, separator, second = value.partition('/')
+    first = parser(first)
+    return first, (parser(second) if separator else first)
+
+
+def parse_rate_pair(value):
+    """
+    Parse an "upload/download" rate pair such as a simple queue max-limit
+
+    Args:
+        value: String such as "5M/10M" (a single value applies to both)
+
+    Returns:
+        Tuple of (upload, download) in bps
+    """
+    if isinstance(value, (int, float)):
+        return value, value
+    return _parse_pair(str(value), parse_rate)
+
+
+def parse_number_pair(value):
+    """
+    Parse an "upload/download" counter pair such as "1200/3400"
+
+    Returns:
+        Tuple of (upload, download)
+    """
+    if isinstance(value, (int, float)):
+        return value, value
+    return _parse_pair(str(value), parse_number)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_duration(value):
+    value = value.strip()
+    if ':' in value:
+        # "hh:mm:ss", optionally prefixed with days as "1d 00:05:12"
+        days, _, clock = value.rpartition(' ')
+        try:
+            seconds = sum(float(part) * scale for part, scale in zip(reversed(clock.split(':')), (1, 60, 3600)))
+        except ValueError:
+            return 0
+        seconds += _parse_duration(days) if days else 0
+    else:
+        seconds = sum(float(number) * _DURATION_SCALE[unit] for number, unit in _DURATION_PART.findall(value))
+    return int(seconds) if float(seconds).is_integer() else seconds
+
+
+def parse_duration(value):
+    """
+    Parse a RouterOS duration (uptimes, burst-time, timeouts) into seconds
+
+    Args:
+        value: Number of seconds or string such as "1w2d3h4m5s", "12m3s120ms",
+            "00:05:12" or "1d 00:05:12"
+
+    Returns:
+        Duration in seconds, or 0 if the value cannot be parsed
+    """
+    if isinstance(value, (int, float)):
+        return value
+    return _parse_duration(str(value or ''))
+
+
+def parse_duration_pair(value):
+    """
+    Parse an "upload/download" duration pair such as a burst-time of "8s/16s"
+
+    Returns:
+        Tuple of (upload, download) in seconds
+    """
+    if isinstance(value, (int, float)):
+        return value, value
+    return _parse_pair(str(value), parse_duration)
@@ -0,0 +1,116 @@
+"""
+Data version stamps for conditional API responses
+Tracks, from the write path, when each measurement last changed, which
+devices have recent samples and how often the alert state changed. API
+endpoints turn these counters into ETags, so an unchanged dashboard refresh
+is answered with 304 Not Modified without querying InfluxDB.
+"""
+import time
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger("utils.versions")
+
+# Measurements InfluxClient.get_devices() lists devices from
+DEVICE_MEASUREMENTS = frozenset(('device', 'interface', 'wireless'))
+
+# Window of InfluxClient.get_devices()
+DEVICE_WINDOW = 3600
+
+
+class VersionStamps:
+    """
+    Generation counters fed by InfluxClient.write_data
+
+    Stamps are only available once this process has written data (the
+    embedded API); otherwise stamp() returns None and endpoints fall back to
+    hashing their response bodies. Every stamp also includes the current
+    max_age time bucket, which bounds how long data written by other
+    processes (sharded instances) or rows aging out of a query's time range
+    can go unnoticed.
+    """
+
+    def __init__(self):
+        self.max_age = 60
+        self.active = False
+        self._generations = {}  # measurement or counter name -> generation
+        self._device_seen = {}  # device id -> monotonic time of the last sample
+        self._device_generation = 0
+        self._next_expiry = None
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """Apply the `api.etag` config section"""
+        self.max_age = config.get('api', {}).get('etag', {}).get('max_age', 60)
+
+    def observe(self, data):
+        """
+        Record a batch of written points
+
+        Args:
+            data: Point dictionary or list of point dictionaries
+        """
+        if isinstance(data, dict):
+            data = [data]
+        now = time.monotonic()
+        measurements = set()
+        with self._lock:
+            for point in data:
+                measurement = point.get('measurement')
+                measurements.add(measurement)
+                if measurement in DEVICE_MEASUREMENTS:
+                    device_id = (point.get('tags') or {}).get('device_id')
+                    if device_id is not None:
+                        if device_id not in self._device_seen:
+                            self._device_generation += 1
+                        self._device_seen[device_id] = now
+            for measurement in measurements:
+                self._generations[measurement] = self._generations.get(measurement, 0) + 1
+            if self._next_expiry is None:
+                self._next_expiry = now + DEVICE_WINDOW
+            self.active = True
+
+    def bump(self, name):
+        """Advance a named generation counter (e.g. 'alert_state')"""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def _expire_devices(self, now):
+        """Forget devices that dropped out of the get_devices() window"""
+        if self._next_expiry is None or now < self._next_expiry:
+            return
+        cutoff = now - DEVICE_WINDOW
+        expired = [device_id for device_id, seen in self._device_seen.items() if seen < cutoff]
+        for device_id in expired:
+            del self._device_seen[device_id]
+        if expired:
+            self._device_generation += 1
+        oldest = min(self._device_seen.values(), default=None)
+        self._next_expiry = oldest + DEVICE_WINDOW if oldest is not None else None
+
+    def stamp(self, *names, devices=False):
+        """
+        Build a version stamp
+
+        Args:
+            names: Measurements or counter names the response depends on
+            devices: Include the set of devices with recent samples
+
+        Returns:
+            Stamp string, or None if this process has not written any data
+        """
+        if not self.active:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            parts = [str(int(time.time() // self.max_age)) if self.max_age else '0']
+            if devices:
+                self._expire_devices(now)
+                parts.append(f"d{self._device_generation}")
+            parts.extend(f"{name}{self._generations.get(name, 0)}" for name in names)
+        return '-'.join(parts)
+
+
+# Global version stamps
+versions = VersionStamps()
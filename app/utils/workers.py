@@ -0,0 +1,307 @@
+"""
+Multi-process collector runtime
+Runs each collector (or a slice of a collector's devices) in its own worker
+process and forwards the points over a queue to a single writer in the
+main process
+"""
+import os
+import time
+import logging
+import importlib
+import threading
+import multiprocessing
+from influxdb_client import Point
+from utils.telemetry import telemetry
+from utils.sharding import sharding
+from utils.supervisor import supervisor
+from utils.scheduler import configure_budget
+from utils.streaming import streams
+from utils.profiling import profiler
+from utils.livefeed import livefeed
+from utils.versions import versions
+
+# Configure logging
+logger = logging.getLogger("utils.workers")
+
+# Points buffered by a worker before they are sent to the writer
+DEFAULT_BATCH_SIZE = 1000
+
+# Collectors without a device list always run as a single worker
+SINGLE_WORKER_MODULES = ('system', 'wan')
+
+
+class QueueWriter:
+    """
+    Stand-in for InfluxClient inside a worker process
+
+    write_data() timestamps and buffers points, serializing them to line
+    protocol in the worker so the conversion cost is spread over cores, and
+    flush() sends the batch to the writer in the main process. Queries are
+    passed through to the worker's own InfluxClient. Streaming listeners
+    write from their own thread, so the buffers are guarded by a lock.
+    """
+
+    def __init__(self, client, queue, batch_size=DEFAULT_BATCH_SIZE, serialize=True):
+        self.client = client
+        self.queue = queue
+        self.batch_size = batch_size
+        self.serialize = serialize
+        self._points = []
+        self._lines = []
+        self._lock = threading.Lock()
+
+    def write_data(self, data):
+        """Buffer points for the writer process"""
+        if isinstance(data, dict):
+            data = [data]
+
+        # Points without a timestamp get the collection time, not the (later) write time
+        now = time.time_ns()
+        data = [point if 'time' in point else {**point, 'time': now} for point in data]
+
+        lines = [Point.from_dict(point).to_line_protocol() for point in data] if self.serialize else None
+
+        with self._lock:
+            self._points.extend(data)
+            if lines:
+                self._lines.extend(lines)
+            full = len(self._points) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Send buffered points to the writer"""
+        with self._lock:
+            if not self._points:
+                return
+            points, lines = self._points, self._lines
+            self._points = []
+            self._lines = []
+        self.queue.put(('points', points, lines if self.serialize else None))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def _worker_main(config, module, index, count, points_queue, instance_id, budget_share=1.0):
+    """
+    Entry point of a collector worker process
+
+    Args:
+        config: Application configuration
+        module: Collector module name
+        index: Index of this worker's device slice
+        count: Number of workers for the collector
+        points_queue: Queue to the writer in the main process
+        instance_id: Shard instance id of the main process
+        budget_share: Fraction of the polls/second budget for this worker
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - %(name)s[{module}-{index}] - %(levelname)s - %(message)s'
+    )
+    runtime_config = config.get('runtime', {})
+
+    telemetry.configure(config)
+    telemetry.worker = f"{module}-{index}"
+    supervisor.configure(config)
+    configure_budget(config, budget_share)
+    # Profiled on profiling.enabled or the signal forwarded by the main process
+    profiler.forwards = []
+    profiler.configure(config)
+    streams.configure(config)
+
+    # Live subscribers are connected to the main process's API
+    livefeed.forward = lambda state, alert: points_queue.put(('alert', state, alert))
+
+    # Follow the instance's shard and take this worker's slice of it
+    sharding.configure(config)
+    sharding.instance_id = instance_id
+    sharding.set_local_slice(index, count)
+    sharding.start(follow=True)
+
+    collector = importlib.import_module(f'collectors.{module}').Collector(config)
+    collector.initialize()
+
+    writer = QueueWriter(
+        collector.influx, points_queue,
+        batch_size=runtime_config.get('batch_size', DEFAULT_BATCH_SIZE),
+        serialize=runtime_config.get('serialize_in_workers', True)
+    )
+    collector.influx = writer
+    if getattr(collector, 'forecaster', None) is not None:
+        collector.forecaster.influx = writer
+
+    logger.info(f"Worker {module}-{index} started with {len(collector.owned_devices())} devices")
+
+    def after_cycle(state):
+        # Forward the cycle's points, telemetry and supervision state to the main process
+        writer.flush()
+        telemetry.flush(writer)
+        writer.flush()
+        points_queue.put(('status', state.name, state.to_dict()))
+        if telemetry.enabled:
+            points_queue.put(('telemetry', state.name, telemetry.snapshot()))
+
+    def cycle():
+        if profiler.active:
+            profiler.run(f"{module}-{index}", collector.run_cycle)
+        else:
+            collector.run_cycle()
+
+    supervisor.run(collector, cycle=cycle, after_cycle=after_cycle, name=f"{module}-{index}")
+
+
+class WorkerPool:
+    """
+    Collector worker processes and the writer that drains their queue
+
+    Each enabled collector gets `runtime.workers` processes (overridden per
+    collector with `runtime.collector_workers`), each polling a slice of the
+    collector's devices. Dead workers are restarted by check().
+    """
+
+    def __init__(self, config, writer):
+        """
+        Args:
+            config: Application configuration
+            writer: InfluxClient used to write the forwarded points
+        """
+        runtime_config = config.get('runtime', {})
+        self.config = config
+        self.writer = writer
+        self.context = multiprocessing.get_context(runtime_config.get('start_method', 'spawn'))
+        self.queue = self.context.Queue(maxsize=runtime_config.get('queue_size', 1000))
+        self.processes = {}
+        self.policies = {}
+        self.pending = {}
+        self.process_restarts = {}
+        self._writer_thread = None
+
+        default_count = runtime_config.get('workers', 1)
+        collector_counts = runtime_config.get('collector_workers', {})
+        self.specs = []
+        for module in config.get('modules', []):
+            count = 1 if module in SINGLE_WORKER_MODULES else collector_counts.get(module, default_count)
+            self.specs.extend((module, index, count) for index in range(max(1, count)))
+
+    def start(self):
+        """Start the writer thread and all workers"""
+        self._writer_thread = threading.Thread(target=self._drain, name="worker-writer", daemon=True)
+        self._writer_thread.start()
+        for spec in self.specs:
+            self._spawn(spec)
+        profiler.forwards.append(self.signal)
+        logger.info(f"Started {len(self.specs)} collector worker processes")
+
+    def signal(self, signum):
+        """Send a signal to the workers that completed a cycle (and installed their handlers)"""
+        for spec, process in self.processes.items():
+            if process.is_alive() and supervisor.register(f"{spec[0]}-{spec[1]}").state != 'starting':
+                os.kill(process.pid, signum)
+
+    def _spawn(self, spec):
+        module, index, count = spec
+        supervisor.register(f"{module}-{index}").state = 'starting'
+        process = self.context.Process(
+            target=_worker_main,
+            args=(self.config, module, index, count, self.queue, sharding.instance_id, 1.0 / len(self.specs)),
+            name=f"worker-{module}-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[spec] = process
+
+    def check(self):
+        """
+        Restart workers that have exited, backing off exponentially
+
+        A worker that keeps dying is reported as crash looping and restarted
+        after the (longer) crash-loop delay.
+
+        Returns:
+            Number of workers restarted
+        """
+        now = time.time()
+        restarted = 0
+        for spec, process in list(self.processes.items()):
+            name = f"{spec[0]}-{spec[1]}"
+            if spec in self.pending:
+                if now >= self.pending[spec]:
+                    del self.pending[spec]
+                    self.process_restarts[spec] = self.process_restarts.get(spec, 0) + 1
+                    supervisor.register(name).restarts += 1
+                    self._spawn(spec)
+                    restarted += 1
+                continue
+            if process.is_alive():
+                continue
+
+            policy = self.policies.setdefault(spec, supervisor.restart_policy())
+            delay = policy.failure(now)
+            self.pending[spec] = now + delay
+
+            state = supervisor.register(name)
+            state.state = 'crashloop' if policy.crashlooping else 'backoff'
+            state.consecutive_failures = policy.consecutive
+            state.last_error = f"Worker process exited with code {process.exitcode}"
+            state.next_run = now + delay
+            telemetry.count('worker_restarts', collector=spec[0])
+            log = logger.error if policy.crashlooping else logger.warning
+            log(f"Collector worker {process.name} died (exit code {process.exitcode}), restarting in {delay}s")
+        return restarted
+
+    def stop(self, timeout=5):
+        """Stop all workers and flush the queue"""
+        if self.signal in profiler.forwards:
+            profiler.forwards.remove(self.signal)
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join(timeout)
+        self.processes = {}
+
+        if self._writer_thread:
+            self.queue.put(None)
+            self._writer_thread.join(timeout)
+            self._writer_thread = None
+
+    def _drain(self):
+        """Write batches forwarded by the workers"""
+        while True:
+            try:
+                item = self.queue.get()
+            except (EOFError, OSError):
+                break
+            if item is None:
+                break
+
+            if item[0] == 'status':
+                _, name, state = item
+                spec = next((spec for spec in self.specs if f"{spec[0]}-{spec[1]}" == name), None)
+                # Cycle restarts inside the worker plus restarts of the worker process
+                state['restarts'] = state.get('restarts', 0) + self.process_restarts.get(spec, 0)
+                supervisor.update(name, state)
+                # A worker that completes cycles again has recovered
+                if spec in self.policies and state.get('state') == 'running':
+                    self.policies[spec].success()
+                continue
+
+            if item[0] == 'alert':
+                _, alert_state, alert = item
+                livefeed.publish_alert(alert_state, alert)
+                # The worker's alert state changed; invalidate /api/alerts ETags
+                versions.bump('alert_state')
+                continue
+
+            if item[0] == 'telemetry':
+                _, name, worker_snapshot = item
+                telemetry.update_worker(name, worker_snapshot)
+                continue
+
+            _, points, lines = item
+            try:
+                self.writer.write_data(points, lines=lines)
+                telemetry.count('worker_batches')
+            except Exception as e:
+                logger.error(f"Error writing worker batch: {str(e)}")
@@ -12,6 +12,7 @@ import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.influx import InfluxClient
+from utils.serving import serve, enable_compression
 
 app = Flask(__name__, 
            static_folder='../../dashboards/static',
@@ -59,28 +60,39 @@ def api_alerts():
             return jsonify({'error': str(e)}), 500
     return jsonify({'alerts': []})
 
+def init_web(config):
+    """Initialize the InfluxDB client and response compression of the web app"""
+    global influx_client
+    
+    influx_config = config.get('influxdb', {})
+    influx_client = InfluxClient(
+        host=influx_config.get('host', 'localhost'),
+        port=influx_config.get('port', 8086),
+        token=influx_config.get('token', 'YM_NhDux0lCLYdPjyypSDQzAtATgFUh3x38CPDB34CzW51AXE1H2Zj9Gvqh7OhzWm9tF6jFKBcdNS4jn72FgFw=='),
+        org=influx_config.get('org', 'my-org'),
+        bucket=influx_config.get('bucket', 'my-bucket')
+    )
+    enable_compression(app, config)
+    print(f"Connected to InfluxDB at {influx_config.get('host', 'localhost')}:{influx_config.get('port', 8086)}")
+    return app
+
 def start_web_server(host='0.0.0.0', port=5000, debug=False):
     """Start the web server"""
-    global influx_client
+    config = {}
     
     # Initialize InfluxDB client
     try:
         from main import load_config
-        config = load_config()
-        influx_config = config.get('influxdb', {})
-        influx_client = InfluxClient(
-            host=influx_config.get('host', 'localhost'),
-            port=influx_config.get('port', 8086),
-            token=influx_config.get('token', 'YM_NhDux0lCLYdPjyypSDQzAtATgFUh3x38CPDB34CzW51AXE1H2Zj9Gvqh7OhzWm9tF6jFKBcdNS4jn72FgFw=='),
-            org=influx_config.get('org', 'my-org'),
-            bucket=influx_config.get('bucket', 'my-bucket')
-        )
-        print(f"Connected to InfluxDB at {influx_config.get('host', 'localhost')}:{influx_config.get('port', 8086)}")
+        config = load_config() or {}
+        init_web(config)
     except Exception as e:
         print(f"Warning: Could not initialize InfluxDB client: {str(e)}")
     
-    # Start the Flask app
-    app.run(host=host, port=port, debug=debug)
+    # Start the Flask app (the debug server reloads code, so it skips gunicorn)
+    if debug:
+        app.run(host=host, port=port, debug=debug)
+    else:
+        serve(app, config, host, port)
 
 if __name__ == '__main__':
     start_web_server()
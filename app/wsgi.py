@@ -0,0 +1,32 @@
+"""
+WSGI entry points for running the API and web servers under an external server
+
+    cd app && gunicorn -c gunicorn.conf.py wsgi:api
+    cd app && gunicorn -c gunicorn.conf.py --bind 0.0.0.0:5000 wsgi:web
+
+The configuration and InfluxDB clients are created at import time, so with
+preload_app every worker inherits them instead of loading them again.
+"""
+from main import load_config
+
+config = load_config() or {}
+
+
+def _create_api():
+    from api import init_api
+    return init_api(config)
+
+
+def _create_web():
+    from web.server import init_web
+    return init_web(config)
+
+
+def __getattr__(name):
+    # Only build the app that is asked for (wsgi:api or wsgi:web)
+    factories = {'api': _create_api, 'web': _create_web}
+    if name not in factories:
+        raise AttributeError(name)
+    application = factories[name]()
+    globals()[name] = application
+    return application
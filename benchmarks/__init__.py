@@ -0,0 +1 @@
+"""Benchmarks for the Network Monitoring System collection pipeline"""
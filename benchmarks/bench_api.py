@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for the API server
+
+Starts the API with a stand-in query backend (no InfluxDB needed) under each
+requested server mode, drives /api/devices and /api/devices/<id>/metrics
+from concurrent keep-alive clients, and reports requests/sec and latency
+percentiles as JSON.
+
+Usage:
+    python benchmarks/bench_api.py
+    python benchmarks/bench_api.py --servers flask,gunicorn --concurrency 32 --duration 10
+    python benchmarks/bench_api.py --backend-latency-ms 5 --workers 4 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import datetime
+import platform
+import threading
+import subprocess
+import http.client
+
+# Add the app and project directories to the path so we can import the API
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(PROJECT_DIR, 'app'))
+sys.path.append(PROJECT_DIR)
+
+from benchmarks.bench_pipeline import load_config, project_version
+
+DEFAULT_SERVERS = 'flask,gunicorn'
+ENDPOINTS = ('/api/devices', '/api/devices/router-0001/metrics')
+
+
+def serve(args):
+    """Run the API with the stand-in backend (the server side of the benchmark)"""
+    import api
+    from utils.serving import serve as serve_app
+    from benchmarks.sinks import StubQueryBackend
+
+    config = load_config()
+    config['serving'] = dict(config.get('serving', {}), server=args.serve)
+    if args.workers:
+        config['serving']['workers'] = args.workers
+    api.init_api(config)
+    # Created before the workers fork, like the real InfluxDB client
+    api.influx_client = StubQueryBackend(devices=args.backend_devices, latency_ms=args.backend_latency_ms)
+    serve_app(api.app, config, '127.0.0.1', args.port)
+    return 0
+
+
+def free_port():
+    """Return an unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20.0):
+    """Wait until a server accepts connections on a local port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, -(-q * len(values) // 100))) - 1]
+
+
+def run_load(port, path, token, concurrency, duration, compressed):
+    """
+    Drive one endpoint from concurrent keep-alive clients
+
+    Returns:
+        Dictionary with requests, requests_per_sec, errors, mean response
+        bytes and latency percentiles in ms
+    """
+    headers = {'Authorization': f'Bearer {token}'}
+    if compressed:
+        headers['Accept-Encoding'] = 'gzip'
+    latencies = []
+    counters = {'errors': 0, 'bytes': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        local = []
+        errors = 0
+        size = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            # Like real clients, retry once when the server closed a kept-alive connection
+            # (gunicorn recycles workers after max_requests)
+            for attempt in range(2):
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                    break
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            else:
+                errors += 1
+                continue
+            if response.status != 200:
+                errors += 1
+                continue
+            local.append((time.perf_counter() - start) * 1000.0)
+            size += len(body)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            counters['errors'] += errors
+            counters['bytes'] += size
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'endpoint': path,
+        'requests': len(latencies),
+        'requests_per_sec': len(latencies) / elapsed,
+        'errors': counters['errors'],
+        'response_bytes': counters['bytes'] / len(latencies) if latencies else 0,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else 0.0
+        }
+    }
+
+
+def bench_server(server, args, token):
+    """Start the API under one server mode and load-test every endpoint"""
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), '--serve', server, '--port', str(port),
+               '--workers', str(args.workers), '--backend-devices', str(args.backend_devices),
+               '--backend-latency-ms', str(args.backend_latency_ms)]
+    process = subprocess.Popen(command, cwd=os.path.join(PROJECT_DIR, 'app'),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f"{server} server did not start")
+        # Warm up connections and caches
+        run_load(port, ENDPOINTS[0], token, 2, 0.5, args.compressed)
+        return [
+            dict(run_load(port, path, token, args.concurrency, args.duration, args.compressed), server=server)
+            for path in ENDPOINTS
+        ]
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    """Run the benchmark and write the results"""
+    parser = argparse.ArgumentParser(description='Load-test the API server')
+    parser.add_argument('--servers', default=DEFAULT_SERVERS,
+                        help=f'Comma-separated server modes to compare (default: {DEFAULT_SERVERS})')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default: 16)')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per endpoint (default: 5)')
+    parser.add_argument('--workers', type=int, default=0, help='gunicorn workers (default: serving.workers or 2 x CPUs + 1)')
+    parser.add_argument('--backend-devices', type=int, default=100, help='Devices returned by the stand-in backend')
+    parser.add_argument('--backend-latency-ms', type=float, default=0.0, help='Stand-in backend query latency in ms')
+    parser.add_argument('--no-compression', dest='compressed', action='store_false',
+                        help='Do not send Accept-Encoding: gzip')
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    import jwt
+    logging.disable(logging.WARNING)
+    config = load_config()
+    token = jwt.encode(
+        {'username': 'bench', 'role': 'admin',
+         'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)},
+        config['api']['auth']['jwt_secret'],
+        algorithm='HS256'
+    )
+
+    results = {
+        'version': project_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'concurrency': args.concurrency,
+        'backend_latency_ms': args.backend_latency_ms,
+        'compressed': args.compressed,
+        'api': []
+    }
+
+    for server in [name.strip() for name in args.servers.split(',') if name.strip()]:
+        for result in bench_server(server, args, token):
+            results['api'].append(result)
+            print(f"{server:>9} {result['endpoint']:<34} {result['requests_per_sec']:8.0f} req/s "
+                  f"p50 {result['latency_ms']['p50']:6.1f} ms p99 {result['latency_ms']['p99']:6.1f} ms "
+                  f"{result['response_bytes']:7.0f} B {result['errors']} errors", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the collection-to-storage pipeline
+
+Drives the real collectors against simulated devices (demo data generators)
+and a stand-in write sink, and reports throughput, cycle latency, memory per
+device and line-protocol serialization cost as JSON.
+
+With --simulator the collectors poll simulated RouterOS API / SNMP devices
+on localhost instead, exercising the real network code paths.
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --devices 10,100 --collectors qos --output results.json
+    python benchmarks/bench_pipeline.py --simulator --method api --latency-ms 5 --devices 10,100
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+import statistics
+
+# Add the app and project directories to the path so we can import collectors
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(PROJECT_DIR, 'app'))
+sys.path.append(PROJECT_DIR)
+
+from benchmarks.sinks import MemorySink
+
+DEFAULT_DEVICES = '10,100,1000,5000'
+DEFAULT_COLLECTORS = 'mikrotik,wireless,qos'
+
+
+def load_config():
+    """Load config.yaml from the project, or an empty configuration"""
+    try:
+        import yaml
+        with open(os.path.join(PROJECT_DIR, 'config.yaml'), 'r') as file:
+            return yaml.safe_load(file) or {}
+    except Exception:
+        return {}
+
+
+def project_version():
+    """Return the project version from pyproject.toml"""
+    try:
+        import tomllib
+        with open(os.path.join(PROJECT_DIR, 'pyproject.toml'), 'rb') as file:
+            return tomllib.load(file)['project']['version']
+    except Exception:
+        return 'unknown'
+
+
+def simulated_devices(count):
+    """Build a list of demo-mode devices"""
+    return [
+        {
+            'id': f'sim{i:05d}',
+            'name': f'Simulated Router {i}',
+            'host': f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}',
+            'type': 'mikrotik',
+            'snmp_community': 'public',
+            'api_user': 'admin',
+            'api_password': 'password',
+            'use_api': False,
+            'demo_mode': True
+        }
+        for i in range(count)
+    ]
+
+
+def create_collector(name, config, sink, devices):
+    """
+    Create a collector wired to a write sink instead of InfluxDB
+
+    Args:
+        name: Collector module name
+        config: Application configuration
+        sink: Write sink
+        devices: Device list to poll
+    """
+    import importlib
+    module = importlib.import_module(f'collectors.{name}')
+    collector = module.Collector(config)
+    collector.influx = sink
+    collector.devices = devices
+    if hasattr(collector, 'forecaster'):
+        from utils.forecast import CapacityForecaster
+        collector.forecaster = CapacityForecaster(config, sink, collector.FORECAST_METRICS)
+    return collector
+
+
+def bench_cycles(name, config, device_count, cycles, devices=None):
+    """
+    Measure cycle latency, throughput and memory for one collector
+
+    Latency is timed in a plain pass; memory is measured in a second pass
+    under tracemalloc, whose per-allocation overhead would inflate the
+    timings.
+
+    Args:
+        devices: Optional device list (e.g. simulator devices), defaults to
+            demo-mode devices
+
+    Returns:
+        Dictionary with the results
+    """
+    devices = devices or simulated_devices(device_count)
+
+    # Timed pass, recording how many devices and points every cycle covered
+    sink = MemorySink()
+    collector = create_collector(name, config, sink, devices)
+    polled = []
+    due_devices = collector.due_devices
+
+    def counted_due_devices():
+        devices = due_devices()
+        polled.append(len(devices))
+        return devices
+
+    collector.due_devices = counted_due_devices
+    latencies = []
+    points_by_cycle = []
+    for _ in range(cycles):
+        points = sink.points
+        start = time.perf_counter()
+        collector.run_cycle()
+        latencies.append(time.perf_counter() - start)
+        points_by_cycle.append(sink.points - points)
+    points = sink.points
+
+    # Every timed cycle must poll every device, or later cycles time less work
+    if any(count != len(devices) for count in polled):
+        raise RuntimeError(f"{name} cycles polled {polled} of {len(devices)} devices; "
+                           f"disable adaptive scheduling for the benchmark")
+
+    # Memory pass; modules are already imported so their code is not counted
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    collector = create_collector(name, config, MemorySink(), devices)
+    for _ in range(cycles):
+        collector.run_cycle()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_time = sum(latencies)
+    return {
+        'collector': name,
+        'devices': device_count,
+        'cycles': cycles,
+        'points': points,
+        'points_per_cycle': points / cycles,
+        'points_by_cycle': points_by_cycle,
+        'points_per_sec': points / total_time if total_time else 0.0,
+        'cycle_latency_s': {
+            'min': min(latencies),
+            'mean': statistics.mean(latencies),
+            'max': max(latencies)
+        },
+        'retained_bytes_per_device': (retained - baseline) / device_count,
+        'peak_bytes_per_device': (peak - baseline) / device_count
+    }
+
+
+def bench_serialization(name, config, device_count, devices=None):
+    """
+    Measure the cost of converting one cycle of points to line protocol
+
+    Args:
+        devices: Optional device list (e.g. simulator devices), defaults to
+            demo-mode devices
+
+    Returns:
+        Dictionary with the results
+    """
+    sink = MemorySink(keep=True)
+    collector = create_collector(name, config, sink, devices or simulated_devices(device_count))
+    collector.run_cycle()
+
+    serializer = MemorySink(serialize=True)
+    serializer.write_data(sink.records)
+
+    return {
+        'collector': name,
+        'devices': device_count,
+        'points': serializer.points,
+        'seconds': serializer.serialize_seconds,
+        'ns_per_point': serializer.serialize_seconds * 1e9 / serializer.points if serializer.points else 0.0,
+        'bytes': serializer.serialized_bytes
+    }
+
+
+def main():
+    """Run the benchmark and write the results"""
+    parser = argparse.ArgumentParser(description='Benchmark the collection-to-storage pipeline')
+    parser.add_argument('--devices', default=DEFAULT_DEVICES,
+                        help=f'Comma-separated simulated device counts (default: {DEFAULT_DEVICES})')
+    parser.add_argument('--collectors', default=DEFAULT_COLLECTORS,
+                        help=f'Comma-separated collectors to run (default: {DEFAULT_COLLECTORS})')
+    parser.add_argument('--cycles', type=int, default=3, help='Cycles per measurement (default: 3)')
+    parser.add_argument('--serialization-devices', type=int, default=1000,
+                        help='Device count for the serialization benchmark (default: 1000)')
+    parser.add_argument('--simulator', action='store_true',
+                        help='Poll simulated RouterOS API / SNMP devices instead of demo data')
+    parser.add_argument('--method', choices=('api', 'snmp'), default='api',
+                        help='Collection method used with --simulator (default: api)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Simulated device latency in ms')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Simulated device jitter in ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='Simulated request loss (0-1)')
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    # Collectors log every demo-data device at INFO level
+    logging.disable(logging.WARNING)
+
+    config = load_config()
+    # Adaptive scheduling would skip the devices polled in the previous cycle,
+    # so every cycle after the first would time an empty loop
+    config['scheduling'] = {**config.get('scheduling', {}), 'enabled': False}
+    device_counts = [int(count) for count in args.devices.split(',') if count]
+    collectors = [name.strip() for name in args.collectors.split(',') if name.strip()]
+
+    results = {
+        'version': project_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'target': f'simulator-{args.method}' if args.simulator else 'demo',
+        'pipeline': [],
+        'serialization': []
+    }
+
+    simulator = None
+    if args.simulator:
+        from simulator import Simulator
+        simulator = Simulator(devices=max(device_counts + [args.serialization_devices]), latency_ms=args.latency_ms,
+                              jitter_ms=args.jitter_ms, loss=args.loss, churn_interval=0,
+                              snmp=args.method == 'snmp').start_background()
+
+    for name in collectors:
+        for count in device_counts:
+            devices = simulator.collector_devices(args.method)[:count] if simulator else None
+            result = bench_cycles(name, config, count, args.cycles, devices)
+            results['pipeline'].append(result)
+            print(f"{name:>10} {count:>6} devices: {result['cycle_latency_s']['mean'] * 1000:9.1f} ms/cycle "
+                  f"{result['points_per_sec']:10.0f} points/s "
+                  f"{result['retained_bytes_per_device']:8.0f} B/device", file=sys.stderr)
+
+        devices = simulator.collector_devices(args.method)[:args.serialization_devices] if simulator else None
+        serialization = bench_serialization(name, config, args.serialization_devices, devices)
+        results['serialization'].append(serialization)
+        print(f"{name:>10} serialization: {serialization['ns_per_point']:.0f} ns/point", file=sys.stderr)
+
+    if simulator:
+        simulator.stop_background()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Stand-in write sinks and query backends for benchmarks
+Replace InfluxClient so collectors and the API can run without an InfluxDB server
+"""
+import time
+import datetime
+from influxdb_client import Point
+
+
+class MemorySink:
+    """
+    Write sink that counts points instead of sending them to InfluxDB
+
+    Implements the write_data() interface of utils.influx.InfluxClient. With
+    serialize=True every batch is also converted to line protocol the same
+    way the InfluxDB write API does, and the time spent is recorded.
+    """
+
+    def __init__(self, serialize=False, keep=False):
+        self.serialize = serialize
+        self.keep = keep
+        self.points = 0
+        self.batches = 0
+        self.serialized_bytes = 0
+        self.serialize_seconds = 0.0
+        self.records = []
+
+    def write_data(self, data, lines=None):
+        """Record a batch of points (lines: optional pre-serialized line protocol)"""
+        if isinstance(data, dict):
+            data = [data]
+        self.points += len(data)
+        self.batches += 1
+
+        if self.keep:
+            self.records.extend(data)
+
+        if self.serialize and lines is not None:
+            self.serialized_bytes += sum(len(line) + 1 for line in lines)
+        elif self.serialize:
+            start = time.perf_counter()
+            lines = [Point.from_dict(point).to_line_protocol() for point in data]
+            self.serialize_seconds += time.perf_counter() - start
+            self.serialized_bytes += sum(len(line) + 1 for line in lines)
+
+    def reset(self):
+        """Clear all counters"""
+        self.__init__(self.serialize, self.keep)
+
+
+class StubQueryBackend:
+    """
+    Query backend that answers the API's InfluxClient calls with canned data
+
+    Implements get_devices() and get_device_metrics() of
+    utils.influx.InfluxClient; every call sleeps for latency_ms to stand in
+    for the InfluxDB round trip.
+    """
+
+    def __init__(self, devices=100, points=12, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        self.devices = [
+            {'id': f'router-{i:04d}', 'name': f'router-{i:04d}', 'type': 'mikrotik'}
+            for i in range(devices)
+        ]
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self.series = [
+            {'time': start + datetime.timedelta(minutes=5 * i), 'value': 20.0 + (i * 7) % 50}
+            for i in range(points)
+        ]
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_devices(self):
+        self._wait()
+        return list(self.devices)
+
+    def get_device_metrics(self, device_id, metric_type='all', start_time='-1h', end_time='now()'):
+        self._wait()
+        return {'cpu': self.series, 'memory': self.series}
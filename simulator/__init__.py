@@ -0,0 +1,16 @@
+"""
+Device simulator for load testing the Network Monitoring System
+Runs fake MikroTik RouterOS API endpoints and SNMP agents on local ports
+"""
+import os
+import sys
+
+# The simulator shares the RouterOS API wire codec with the application
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from simulator.devices import NetworkProfile, SimulatedDevice
+from simulator.routeros import RouterOSServer
+from simulator.snmp import SnmpAgent
+from simulator.runner import Simulator
@@ -0,0 +1,75 @@
+"""
+Run a fleet of simulated MikroTik devices
+
+Usage:
+    python -m simulator --devices 1000 --latency-ms 20 --jitter-ms 5 --loss 0.01 \
+        --inventory sim-devices.yaml
+"""
+import sys
+import asyncio
+import logging
+import argparse
+from simulator.runner import Simulator
+
+
+def main():
+    """Parse arguments and run the simulator until interrupted"""
+    parser = argparse.ArgumentParser(description='Simulated RouterOS API / SNMP devices for load testing')
+    parser.add_argument('--devices', type=int, default=10, help='Number of devices (default: 10)')
+    parser.add_argument('--host', default='127.0.0.1', help='Listen address (default: 127.0.0.1)')
+    parser.add_argument('--api-base-port', type=int, default=18728, help='First RouterOS API port (default: 18728)')
+    parser.add_argument('--snmp-base-port', type=int, default=11161, help='First SNMP port (default: 11161)')
+    parser.add_argument('--no-snmp', action='store_true', help='Do not start SNMP agents')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Response latency in ms')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Latency jitter (+/-) in ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='Probability of dropping a request (0-1)')
+    parser.add_argument('--interfaces', type=int, default=4, help='Ethernet interfaces per device')
+    parser.add_argument('--wireless-interfaces', type=int, default=2, help='Wireless interfaces per device')
+    parser.add_argument('--clients', type=int, default=10, help='Wireless clients per device')
+    parser.add_argument('--queues', type=int, default=5, help='Simple queues per device')
+    parser.add_argument('--tree-queues', type=int, default=3, help='Queue tree entries per device')
+    parser.add_argument('--churn-interval', type=float, default=1.0,
+                        help='Seconds between table changes for listen subscribers (0 disables)')
+    parser.add_argument('--churn-fraction', type=float, default=0.05,
+                        help='Fraction of devices changed per churn interval')
+    parser.add_argument('--community', default='public', help='SNMP community')
+    parser.add_argument('--inventory', help='Write a devices YAML file for the collectors to this path')
+    parser.add_argument('--method', choices=('api', 'snmp'), default='api',
+                        help='Collection method written to the inventory')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible runs')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    simulator = Simulator(
+        devices=args.devices, host=args.host, api_base_port=args.api_base_port,
+        snmp_base_port=args.snmp_base_port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        loss=args.loss, interfaces=args.interfaces, wireless_interfaces=args.wireless_interfaces,
+        clients=args.clients, queues=args.queues, tree_queues=args.tree_queues,
+        churn_interval=args.churn_interval, churn_fraction=args.churn_fraction,
+        community=args.community, snmp=not args.no_snmp, seed=args.seed
+    )
+
+    if args.inventory:
+        import yaml
+        with open(args.inventory, 'w') as file:
+            yaml.safe_dump({'devices': {'mikrotik': simulator.inventory(args.method)}}, file, sort_keys=False)
+        logging.info(f"Wrote inventory for {args.devices} devices to {args.inventory}")
+
+    async def run():
+        await simulator.start()
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
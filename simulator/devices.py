@@ -0,0 +1,325 @@
+"""
+Simulated MikroTik device state
+Generates RouterOS-formatted tables whose counters advance with time
+"""
+import time
+import random
+
+
+class NetworkProfile:
+    """Latency, jitter and loss applied to every simulated request"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, loss=0.0, seed=None):
+        """
+        Args:
+            latency_ms: Base response delay in milliseconds
+            jitter_ms: Uniform jitter added to the delay (+/-) in milliseconds
+            loss: Probability (0-1) that a request gets no response
+        """
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.loss = loss
+        self.rng = random.Random(seed)
+
+    def delay(self):
+        """Return the delay in seconds for one response"""
+        if not self.jitter:
+            return self.latency
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def dropped(self):
+        """Return True if this request should be dropped"""
+        return self.loss > 0 and self.rng.random() < self.loss
+
+
+def _format_rate(bps):
+    """Format a rate the way RouterOS prints limits (10M, 512k)"""
+    for suffix, factor in (('G', 1000000000), ('M', 1000000), ('k', 1000)):
+        if bps >= factor and bps % factor == 0:
+            return f"{bps // factor}{suffix}"
+    return str(bps)
+
+
+def _format_uptime(seconds):
+    """Format seconds as a RouterOS uptime string (1w2d3h4m5s)"""
+    seconds = int(seconds)
+    parts = []
+    for suffix, size in (('w', 604800), ('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            parts.append(f"{seconds // size}{suffix}")
+            seconds %= size
+    if seconds or not parts:
+        parts.append(f"{seconds}s")
+    return ''.join(parts)
+
+
+class SimulatedDevice:
+    """
+    A simulated RouterOS device
+
+    All values are returned as strings, exactly as they appear on the wire.
+    Tables can be churned (clients joining/leaving, links flapping) to drive
+    `listen` subscribers.
+    """
+
+    def __init__(self, index, interfaces=4, wireless_interfaces=2, clients=10, queues=5, tree_queues=3, seed=None):
+        """
+        Args:
+            index: Device number, used for the ID and the random seed
+            interfaces: Number of ethernet interfaces
+            wireless_interfaces: Number of wireless interfaces
+            clients: Number of registered wireless clients
+            queues: Number of simple queues
+            tree_queues: Number of queue tree entries
+        """
+        self.index = index
+        self.id = f"sim{index:05d}"
+        self.name = f"Simulated Router {index}"
+        self.rng = random.Random(seed if seed is not None else index)
+        self.started = time.time() - self.rng.randint(3600, 30 * 86400)
+        self.total_memory = 256 * 1024 * 1024
+        self.next_id = 1
+        self.listeners = {}
+
+        self.interfaces = []
+        for i in range(interfaces):
+            self.interfaces.append(self._new_interface(f"ether{i + 1}", 'ether'))
+        for i in range(wireless_interfaces):
+            row = self._new_interface(f"wlan{i + 1}", 'wlan')
+            row.update({
+                'ssid': f"sim-{index}-{i + 1}",
+                'frequency': str(2412 + 5 * i if i % 2 == 0 else 5180 + 20 * i),
+                'band': '2ghz-b/g/n' if i % 2 == 0 else '5ghz-a/n/ac',
+                'channel-width': '20MHz' if i % 2 == 0 else '20/40/80MHz-Ceee',
+                'mode': 'ap-bridge',
+                'tx-power': str(17 + i)
+            })
+            self.interfaces.append(row)
+
+        self.wireless = [row for row in self.interfaces if row['type'] == 'wlan']
+        self.clients = [self._new_client() for _ in range(clients if self.wireless else 0)]
+
+        self.simple_queues = []
+        for i in range(queues):
+            max_down = self.rng.choice((1, 2, 5, 10, 20, 50, 100)) * 1000000
+            max_up = max_down // self.rng.choice((1, 2, 4))
+            self.simple_queues.append({
+                '.id': self._next_id(),
+                'name': f"queue{i + 1}",
+                'target': f"192.168.{index % 250}.{i + 10}/32",
+                'parent': 'none',
+                'max-limit': f"{_format_rate(max_up)}/{_format_rate(max_down)}",
+                'limit-at': '0/0',
+                'burst-limit': '0/0',
+                'burst-threshold': '0/0',
+                'burst-time': '0s/0s',
+                'priority': '8/8',
+                'disabled': 'false',
+                '_max': (max_up, max_down),
+                '_load': self.rng.uniform(0.05, 0.9)
+            })
+
+        self.tree_queues = []
+        for i in range(tree_queues):
+            max_limit = self.rng.choice((10, 50, 100)) * 1000000
+            self.tree_queues.append({
+                '.id': self._next_id(),
+                'name': f"tree{i + 1}",
+                'parent': 'global',
+                'packet-mark': f"mark{i + 1}",
+                'limit-at': '0',
+                'max-limit': _format_rate(max_limit),
+                'priority': str(1 + i % 8),
+                'disabled': 'false',
+                '_max': max_limit,
+                '_load': self.rng.uniform(0.05, 0.9)
+            })
+
+    def _next_id(self):
+        value = f"*{self.next_id:X}"
+        self.next_id += 1
+        return value
+
+    def _new_interface(self, name, kind):
+        return {
+            '.id': self._next_id(),
+            'name': name,
+            'type': kind,
+            'mac-address': ':'.join(f"{self.rng.randint(0, 255):02X}" for _ in range(6)),
+            'running': 'true',
+            'disabled': 'false',
+            '_rate': self.rng.randint(100000, 50000000)
+        }
+
+    def _new_client(self):
+        interface = self.rng.choice(self.wireless)
+        return {
+            '.id': self._next_id(),
+            'interface': interface['name'],
+            'mac-address': ':'.join(f"{self.rng.randint(0, 255):02X}" for _ in range(6)),
+            '_signal': self.rng.randint(-85, -40),
+            '_joined': time.time() - self.rng.randint(60, 86400)
+        }
+
+    def _elapsed(self):
+        return time.time() - self.started
+
+    # RouterOS tables
+
+    def system_resource(self):
+        """Return the /system/resource row"""
+        elapsed = self._elapsed()
+        load = 10 + int(30 * abs(((elapsed / 600) % 2) - 1)) + self.rng.randint(0, 10)
+        free_memory = int(self.total_memory * (0.6 - 0.2 * abs(((elapsed / 3600) % 2) - 1)))
+        return {
+            'uptime': _format_uptime(elapsed),
+            'version': '7.12 (stable)',
+            'free-memory': str(free_memory),
+            'total-memory': str(self.total_memory),
+            'cpu': 'MIPS 1004Kc V2.15',
+            'cpu-count': '4',
+            'cpu-frequency': '880',
+            'cpu-load': str(load),
+            'free-hdd-space': str(8 * 1024 * 1024),
+            'total-hdd-space': str(16 * 1024 * 1024),
+            'architecture-name': 'mmips',
+            'board-name': 'hEX',
+            'platform': 'MikroTik'
+        }
+
+    def interface_rows(self):
+        """Return the /interface table"""
+        elapsed = self._elapsed()
+        rows = []
+        for iface in self.interfaces:
+            rx_bytes = int(iface['_rate'] * elapsed / 8)
+            tx_bytes = rx_bytes // 3
+            rows.append(dict(self._public(iface), **{
+                'rx-byte': str(rx_bytes),
+                'tx-byte': str(tx_bytes),
+                'rx-packet': str(rx_bytes // 800),
+                'tx-packet': str(tx_bytes // 600)
+            }))
+        return rows
+
+    def wireless_interface_rows(self):
+        """Return the /interface/wireless table"""
+        return [self._public(iface) for iface in self.wireless]
+
+    def registration_rows(self):
+        """Return the /interface/wireless/registration-table"""
+        return [self._client_row(client) for client in self.clients]
+
+    def _client_row(self, client):
+        signal = client['_signal'] + self.rng.randint(-3, 3)
+        tx_rate = self.rng.choice((65, 130, 144.4, 300, 433.3, 866.7))
+        rx_rate = self.rng.choice((54, 65, 130, 144.4, 300))
+        uptime = time.time() - client['_joined']
+        return dict(self._public(client), **{
+            'signal-strength': f"{signal}@HT20-7",
+            'signal-to-noise': str(signal + 95),
+            'tx-rate': f"{tx_rate}Mbps-20MHz/2S/SGI",
+            'rx-rate': f"{rx_rate}Mbps-20MHz/2S",
+            'uptime': _format_uptime(uptime),
+            'bytes': f"{int(uptime * 20000)},{int(uptime * 5000)}",
+            'packets': f"{int(uptime * 20)},{int(uptime * 8)}"
+        })
+
+    def simple_queue_rows(self):
+        """Return the /queue/simple table including live statistics"""
+        elapsed = self._elapsed()
+        rows = []
+        for queue in self.simple_queues:
+            max_up, max_down = queue['_max']
+            load = queue['_load']
+            rate_up, rate_down = int(max_up * load), int(max_down * load)
+            bytes_up, bytes_down = int(rate_up * elapsed / 8), int(rate_down * elapsed / 8)
+            rows.append(dict(self._public(queue), **{
+                'rate': f"{rate_up}/{rate_down}",
+                'packet-rate': f"{rate_up // 6400}/{rate_down // 9600}",
+                'bytes': f"{bytes_up}/{bytes_down}",
+                'packets': f"{bytes_up // 800}/{bytes_down // 1200}",
+                'dropped': f"{int(elapsed * load)}/{int(elapsed * load * 2)}",
+                'queued-bytes': f"{self.rng.randint(0, 15000)}/{self.rng.randint(0, 30000)}",
+                'queued-packets': f"{self.rng.randint(0, 10)}/{self.rng.randint(0, 20)}"
+            }))
+        return rows
+
+    def queue_tree_rows(self):
+        """Return the /queue/tree table including live statistics"""
+        elapsed = self._elapsed()
+        rows = []
+        for queue in self.tree_queues:
+            rate = int(queue['_max'] * queue['_load'])
+            total = int(rate * elapsed / 8)
+            rows.append(dict(self._public(queue), **{
+                'rate': str(rate),
+                'packet-rate': str(rate // 9600),
+                'bytes': str(total),
+                'packets': str(total // 1200),
+                'dropped': str(int(elapsed * queue['_load'])),
+                'queued-bytes': str(self.rng.randint(0, 30000)),
+                'queued-packets': str(self.rng.randint(0, 20))
+            }))
+        return rows
+
+    def monitor_traffic(self, name):
+        """Return a single /interface/monitor-traffic sample"""
+        for iface in self.interfaces:
+            if iface['name'] == name:
+                rate = int(iface['_rate'] * self.rng.uniform(0.5, 1.5))
+                return {
+                    'name': name,
+                    'rx-bits-per-second': str(rate),
+                    'tx-bits-per-second': str(rate // 3),
+                    'rx-packets-per-second': str(rate // 6400),
+                    'tx-packets-per-second': str(rate // 19200)
+                }
+        return None
+
+    def table(self, path):
+        """Return the rows for a print command path, or None if unknown"""
+        tables = {
+            '/system/resource': lambda: [self.system_resource()],
+            '/interface': self.interface_rows,
+            '/interface/wireless': self.wireless_interface_rows,
+            '/interface/wireless/registration-table': self.registration_rows,
+            '/queue/simple': self.simple_queue_rows,
+            '/queue/tree': self.queue_tree_rows
+        }
+        builder = tables.get(path)
+        return builder() if builder else None
+
+    @staticmethod
+    def _public(row):
+        return {key: value for key, value in row.items() if not key.startswith('_')}
+
+    # Churn for listen subscribers
+
+    def subscribe(self, path, callback):
+        """Register a callback receiving changed rows for a table"""
+        self.listeners.setdefault(path, set()).add(callback)
+
+    def unsubscribe(self, path, callback):
+        """Remove a table subscription"""
+        self.listeners.get(path, set()).discard(callback)
+
+    def churn(self):
+        """Apply one random change (client join/leave, link flap) and notify listeners"""
+        if self.wireless and self.rng.random() < 0.7:
+            path = '/interface/wireless/registration-table'
+            if self.clients and self.rng.random() < 0.5:
+                client = self.clients.pop(self.rng.randrange(len(self.clients)))
+                row = {'.id': client['.id'], '.dead': 'true'}
+            else:
+                client = self._new_client()
+                self.clients.append(client)
+                row = self._client_row(client)
+        else:
+            path = '/interface'
+            iface = self.rng.choice(self.interfaces)
+            iface['running'] = 'false' if iface['running'] == 'true' else 'true'
+            row = self._public(iface)
+
+        for callback in list(self.listeners.get(path, ())):
+            callback(row)
@@ -0,0 +1,145 @@
+"""
+Simulated RouterOS API server
+Implements the RouterOS API wire protocol (length-prefixed words) for login,
+print, monitor-traffic, listen and cancel commands
+"""
+import asyncio
+import logging
+from utils.routeros_wire import encode_sentence, read_sentence
+
+# Configure logging
+logger = logging.getLogger("simulator.routeros")
+
+
+def _attribute_words(row, proplist=None):
+    return [f"={key}={value}" for key, value in row.items() if proplist is None or key in proplist]
+
+
+class RouterOSServer:
+    """
+    RouterOS API endpoint for a single simulated device
+
+    Accepts any password for the configured username. Supported commands:
+    /login, <path>/print (with .proplist), /interface/monitor-traffic,
+    <path>/listen and /cancel, all with optional .tag multiplexing.
+    """
+
+    def __init__(self, device, profile, host='127.0.0.1', port=8728, username='admin'):
+        self.device = device
+        self.profile = profile
+        self.host = host
+        self.port = port
+        self.username = username
+        self.server = None
+
+    async def start(self):
+        """Start listening for API connections"""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def stop(self):
+        """Stop listening and close the server"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        session = {'logged_in': False, 'listeners': {}}
+        try:
+            while True:
+                words = await read_sentence(reader)
+                if not words:
+                    continue
+
+                if self.profile.dropped():
+                    # Simulated loss: the router never answers and the
+                    # client has to time out
+                    continue
+
+                delay = self.profile.delay()
+                if delay:
+                    await asyncio.sleep(delay)
+
+                self._dispatch(words, writer, session)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for path, callback in session['listeners'].values():
+                self.device.unsubscribe(path, callback)
+            writer.close()
+
+    def _dispatch(self, words, writer, session):
+        command = words[0]
+        attributes = {}
+        tag = None
+        proplist = None
+        for word in words[1:]:
+            if word.startswith('.tag='):
+                tag = word[5:]
+            elif word.startswith('=.proplist='):
+                proplist = set(word[11:].split(','))
+            elif word.startswith('='):
+                key, _, value = word[1:].partition('=')
+                attributes[key] = value
+
+        tag_words = [f".tag={tag}"] if tag is not None else []
+
+        def send(reply, extra=()):
+            writer.write(encode_sentence([reply] + list(extra) + tag_words))
+
+        if command == '/login':
+            if attributes.get('name') == self.username:
+                session['logged_in'] = True
+                send('!done')
+            else:
+                send('!trap', ['=message=invalid user name or password (6)'])
+                send('!done')
+            return
+
+        if not session['logged_in']:
+            send('!trap', ['=message=not logged in'])
+            send('!done')
+            return
+
+        path, _, verb = command.rpartition('/')
+
+        if command == '/interface/monitor-traffic':
+            for name in attributes.get('interface', '').split(','):
+                row = self.device.monitor_traffic(name)
+                if row is None:
+                    send('!trap', [f"=message=no such item ({name})"])
+                else:
+                    send('!re', _attribute_words(row, proplist))
+            send('!done')
+        elif verb == 'print':
+            rows = self.device.table(path)
+            if rows is None:
+                send('!trap', ['=message=no such command prefix'])
+            else:
+                for row in rows:
+                    send('!re', _attribute_words(row, proplist))
+            send('!done')
+        elif verb == 'listen':
+            if self.device.table(path) is None:
+                send('!trap', ['=message=no such command prefix'])
+                send('!done')
+                return
+
+            def callback(row, tag_words=tag_words):
+                writer.write(encode_sentence(['!re'] + _attribute_words(row, proplist) + tag_words))
+
+            session['listeners'][tag] = (path, callback)
+            self.device.subscribe(path, callback)
+        elif command == '/cancel':
+            target = attributes.get('tag')
+            listener = session['listeners'].pop(target, None)
+            if listener:
+                self.device.unsubscribe(*listener)
+                writer.write(encode_sentence(['!trap', '=category=2', '=message=interrupted', f".tag={target}"]))
+                writer.write(encode_sentence(['!done', f".tag={target}"]))
+            send('!done')
+        elif command == '/quit':
+            send('!fatal', ['session terminated on request'])
+        else:
+            send('!trap', ['=message=no such command'])
+            send('!done')
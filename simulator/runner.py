@@ -0,0 +1,157 @@
+"""
+Simulator runner
+Starts many simulated devices on consecutive localhost ports, either in the
+foreground or on a background event loop thread
+"""
+import random
+import asyncio
+import logging
+import threading
+from simulator.devices import NetworkProfile, SimulatedDevice
+from simulator.routeros import RouterOSServer
+from simulator.snmp import SnmpAgent
+
+# Configure logging
+logger = logging.getLogger("simulator.runner")
+
+
+class Simulator:
+    """
+    A fleet of simulated devices
+
+    Device i serves the RouterOS API on api_base_port + i and SNMP on
+    snmp_base_port + i. Every churn_interval seconds a random subset of devices
+    changes a table (client join/leave, link flap) to feed `listen` mirrors.
+    """
+
+    def __init__(self, devices=10, host='127.0.0.1', api_base_port=18728, snmp_base_port=11161,
+                 latency_ms=0.0, jitter_ms=0.0, loss=0.0, interfaces=4, wireless_interfaces=2,
+                 clients=10, queues=5, tree_queues=3, churn_interval=1.0, churn_fraction=0.05,
+                 community='public', username='admin', snmp=True, seed=None):
+        self.host = host
+        self.api_base_port = api_base_port
+        self.snmp_base_port = snmp_base_port
+        self.community = community
+        self.username = username
+        self.churn_interval = churn_interval
+        self.churn_fraction = churn_fraction
+        self.enable_snmp = snmp
+        self.profile = NetworkProfile(latency_ms, jitter_ms, loss, seed)
+        self.rng = random.Random(seed)
+        self.devices = [
+            SimulatedDevice(i, interfaces, wireless_interfaces, clients, queues, tree_queues,
+                            seed=None if seed is None else seed + i)
+            for i in range(devices)
+        ]
+        self.servers = []
+        self.loop = None
+        self.thread = None
+        self._churn_task = None
+
+    async def start(self):
+        """Start all API servers and SNMP agents on the running loop"""
+        for i, device in enumerate(self.devices):
+            server = RouterOSServer(device, self.profile, self.host, self.api_base_port + i, self.username)
+            await server.start()
+            self.servers.append(server)
+            if self.enable_snmp:
+                agent = SnmpAgent(device, self.profile, self.host, self.snmp_base_port + i, self.community)
+                await agent.start()
+                self.servers.append(agent)
+
+        if self.churn_interval:
+            self._churn_task = asyncio.get_running_loop().create_task(self._churn())
+
+        logger.info(f"Started {len(self.devices)} simulated devices on {self.host} "
+                    f"(API from port {self.api_base_port}, SNMP from port {self.snmp_base_port})")
+
+    async def stop(self):
+        """Stop all servers"""
+        if self._churn_task:
+            self._churn_task.cancel()
+        for server in self.servers:
+            await server.stop()
+        self.servers = []
+
+    async def _churn(self):
+        while True:
+            await asyncio.sleep(self.churn_interval)
+            count = max(1, int(len(self.devices) * self.churn_fraction))
+            for device in self.rng.sample(self.devices, min(count, len(self.devices))):
+                device.churn()
+
+    def start_background(self):
+        """Run the simulator on a new event loop in a daemon thread"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="simulator", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop_background(self):
+        """Stop a simulator started with start_background()"""
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def inventory(self, method='api', password='password'):
+        """
+        Return device entries in the config.yaml `devices.mikrotik` format
+
+        Args:
+            method: Collection method written to auth.method ('api' or 'snmp')
+            password: API password written for every device
+        """
+        return [
+            {
+                'id': device.id,
+                'name': device.name,
+                'address': self.host,
+                'auth': {
+                    'method': method,
+                    'username': self.username,
+                    'password': password,
+                    'port': self.api_base_port + i
+                },
+                'snmp': {
+                    'community': self.community,
+                    'port': self.snmp_base_port + i
+                },
+                'probe_port': self.api_base_port + i,
+                'collect': {
+                    'system': True,
+                    'interfaces': True,
+                    'wireless': True,
+                    'qos': True
+                }
+            }
+            for i, device in enumerate(self.devices)
+        ]
+
+    def collector_devices(self, method='api', password='password'):
+        """Return device dictionaries as used by the collectors"""
+        return [
+            {
+                'id': device.id,
+                'name': device.name,
+                'host': self.host,
+                'type': 'mikrotik',
+                'snmp_community': self.community,
+                'snmp_port': self.snmp_base_port + i,
+                'api_user': self.username,
+                'api_password': password,
+                'api_port': self.api_base_port + i,
+                'use_api': method == 'api',
+                'probe_port': self.api_base_port + i
+            }
+            for i, device in enumerate(self.devices)
+        ]
@@ -0,0 +1,260 @@
+"""
+Simulated SNMP v1/v2c agent
+Minimal BER codec serving the MikroTik and IF-MIB objects used by the
+collectors (Get, GetNext and GetBulk)
+"""
+import time
+import bisect
+import asyncio
+import logging
+
+# Configure logging
+logger = logging.getLogger("simulator.snmp")
+
+# BER / SNMP type tags
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+END_OF_MIB_VIEW = 0x82
+
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+GET_RESPONSE = 0xA2
+GET_BULK_REQUEST = 0xA5
+
+
+def _encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    data = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(data)]) + data
+
+
+def _tlv(tag, payload):
+    return bytes([tag]) + _encode_length(len(payload)) + payload
+
+
+def _encode_integer(value, tag=INTEGER):
+    if tag == INTEGER:
+        data = value.to_bytes(max(1, (value.bit_length() + 8) // 8), 'big', signed=True)
+    else:
+        data = value.to_bytes(max(1, (value.bit_length() + 8) // 8), 'big', signed=False)
+    return _tlv(tag, data)
+
+
+def _encode_oid(oid):
+    data = bytearray([40 * oid[0] + oid[1]])
+    for arc in oid[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        data.extend(reversed(chunk))
+    return _tlv(OBJECT_IDENTIFIER, bytes(data))
+
+
+def _encode_value(kind, value):
+    if kind == OCTET_STRING:
+        return _tlv(OCTET_STRING, value.encode('utf-8') if isinstance(value, str) else value)
+    if kind in (NULL, NO_SUCH_OBJECT, END_OF_MIB_VIEW):
+        return _tlv(kind, b'')
+    if kind == OBJECT_IDENTIFIER:
+        return _encode_oid(value)
+    return _encode_integer(int(value), kind)
+
+
+def _decode(data, offset):
+    """Decode one TLV, returning (tag, payload, next offset)"""
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[offset:offset + count], 'big')
+        offset += count
+    return tag, data[offset:offset + length], offset + length
+
+
+def _decode_oid(payload):
+    oid = [payload[0] // 40, payload[0] % 40]
+    arc = 0
+    for byte in payload[1:]:
+        arc = (arc << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            oid.append(arc)
+            arc = 0
+    return tuple(oid)
+
+
+def parse_oid(text):
+    """Parse a dotted OID string into a tuple"""
+    return tuple(int(arc) for arc in text.strip('.').split('.'))
+
+
+class SnmpAgent(asyncio.DatagramProtocol):
+    """
+    SNMP agent for a single simulated device
+
+    Requests with a wrong community are silently dropped, as real agents do.
+    """
+
+    def __init__(self, device, profile, host='127.0.0.1', port=161, community='public'):
+        self.device = device
+        self.profile = profile
+        self.host = host
+        self.port = port
+        self.community = community.encode('utf-8')
+        self.transport = None
+        self.oids = []
+        self.objects = {}
+        self._build_mib()
+
+    async def start(self):
+        """Start listening for SNMP requests"""
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+
+    async def stop(self):
+        """Close the agent socket"""
+        if self.transport:
+            self.transport.close()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def _build_mib(self):
+        """Register the objects served by this agent with value callbacks"""
+        device = self.device
+        mikrotik = (1, 3, 6, 1, 4, 1, 14988, 1, 1, 3)
+
+        def resource(key):
+            return lambda: int(device.system_resource()[key])
+
+        objects = {
+            (1, 3, 6, 1, 2, 1, 1, 1, 0): (OCTET_STRING, lambda: f"RouterOS {device.name}"),
+            (1, 3, 6, 1, 2, 1, 1, 3, 0): (TIMETICKS, lambda: int((time.time() - device.started) * 100)),
+            (1, 3, 6, 1, 2, 1, 1, 5, 0): (OCTET_STRING, lambda: device.id),
+            mikrotik + (10, 0): (GAUGE32, resource('total-memory')),
+            mikrotik + (11, 0): (GAUGE32, resource('free-memory')),
+            mikrotik + (14, 0): (INTEGER, resource('cpu-load')),
+            (1, 3, 6, 1, 2, 1, 2, 1, 0): (INTEGER, lambda: len(device.interfaces))
+        }
+
+        def interface_value(index, key, transform=int):
+            def getter():
+                row = device.interface_rows()[index]
+                return transform(row[key])
+            return getter
+
+        for index in range(len(device.interfaces)):
+            instance = index + 1
+            if_entry = (1, 3, 6, 1, 2, 1, 2, 2, 1)
+            ifx_entry = (1, 3, 6, 1, 2, 1, 31, 1, 1, 1)
+            objects[if_entry + (1, instance)] = (INTEGER, lambda instance=instance: instance)
+            objects[if_entry + (2, instance)] = (OCTET_STRING, interface_value(index, 'name', str))
+            objects[if_entry + (8, instance)] = (INTEGER, interface_value(
+                index, 'running', lambda value: 1 if value == 'true' else 2))
+            objects[if_entry + (10, instance)] = (COUNTER32, interface_value(
+                index, 'rx-byte', lambda value: int(value) & 0xFFFFFFFF))
+            objects[if_entry + (16, instance)] = (COUNTER32, interface_value(
+                index, 'tx-byte', lambda value: int(value) & 0xFFFFFFFF))
+            objects[ifx_entry + (1, instance)] = (OCTET_STRING, interface_value(index, 'name', str))
+            objects[ifx_entry + (6, instance)] = (COUNTER64, interface_value(index, 'rx-byte'))
+            objects[ifx_entry + (10, instance)] = (COUNTER64, interface_value(index, 'tx-byte'))
+
+        self.objects = objects
+        self.oids = sorted(objects)
+
+    def _get(self, oid):
+        entry = self.objects.get(oid)
+        if entry is None:
+            return oid, NO_SUCH_OBJECT, None
+        kind, getter = entry
+        return oid, kind, getter()
+
+    def _get_next(self, oid):
+        index = bisect.bisect_right(self.oids, oid)
+        if index >= len(self.oids):
+            return oid, END_OF_MIB_VIEW, None
+        return self._get(self.oids[index])
+
+    def datagram_received(self, data, addr):
+        try:
+            response = self._respond(data)
+        except Exception as e:
+            logger.debug(f"Malformed SNMP request from {addr}: {str(e)}")
+            return
+
+        if response is None or self.profile.dropped():
+            return
+
+        delay = self.profile.delay()
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+    def _respond(self, data):
+        _, message, _ = _decode(data, 0)
+        _, version, offset = _decode(message, 0)
+        _, community, offset = _decode(message, offset)
+        if community != self.community:
+            return None
+
+        pdu_type, pdu, _ = _decode(message, offset)
+        _, request_id, offset = _decode(pdu, 0)
+        _, field1, offset = _decode(pdu, offset)
+        _, field2, offset = _decode(pdu, offset)
+        _, varbind_list, _ = _decode(pdu, offset)
+
+        oids = []
+        offset = 0
+        while offset < len(varbind_list):
+            _, varbind, offset = _decode(varbind_list, offset)
+            _, oid, _ = _decode(varbind, 0)
+            oids.append(_decode_oid(oid))
+
+        if pdu_type == GET_REQUEST:
+            results = [self._get(oid) for oid in oids]
+        elif pdu_type == GET_NEXT_REQUEST:
+            results = [self._get_next(oid) for oid in oids]
+        elif pdu_type == GET_BULK_REQUEST:
+            non_repeaters = int.from_bytes(field1, 'big')
+            max_repetitions = int.from_bytes(field2, 'big')
+            results = [self._get_next(oid) for oid in oids[:non_repeaters]]
+            current = oids[non_repeaters:]
+            for _ in range(max_repetitions):
+                step = [self._get_next(oid) for oid in current]
+                results.extend(step)
+                current = [oid for oid, _, _ in step]
+                if all(kind == END_OF_MIB_VIEW for _, kind, _ in step):
+                    break
+        else:
+            return None
+
+        if version[0] == 0:
+            # SNMPv1 has no exception values; report noSuchName instead
+            for index, (_, kind, _) in enumerate(results):
+                if kind in (NO_SUCH_OBJECT, END_OF_MIB_VIEW):
+                    return self._encode_response(version, community, request_id, 2, index + 1,
+                                                 [(oid, NULL, None) for oid in oids])
+
+        return self._encode_response(version, community, request_id, 0, 0, results)
+
+    def _encode_response(self, version, community, request_id, error_status, error_index, results):
+        varbinds = b''.join(
+            _tlv(SEQUENCE, _encode_oid(oid) + _encode_value(kind, value))
+            for oid, kind, value in results
+        )
+        pdu = (_tlv(INTEGER, request_id) + _encode_integer(error_status) +
+               _encode_integer(error_index) + _tlv(SEQUENCE, varbinds))
+        message = _tlv(INTEGER, version) + _tlv(OCTET_STRING, community) + _tlv(GET_RESPONSE, pdu)
+        return _tlv(SEQUENCE, message)
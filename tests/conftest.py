@@ -0,0 +1,9 @@
+"""
+Test configuration
+The application modules import each other as top-level packages (utils,
+collectors), as they do when run from the app directory.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
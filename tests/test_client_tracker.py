@@ -0,0 +1,125 @@
+"""
+Tests for wireless client tracking
+"""
+import sys
+import threading
+
+from utils.client_tracker import ClientTracker, SIGNAL_BUCKETS, bucket_label, percentile
+
+
+def client(mac, interface='wlan1', signal=-60, snr=30, tx_rate=100e6, rx_rate=50e6):
+    return {
+        'mac_address': mac,
+        'interface': interface,
+        'signal_strength': signal,
+        'signal_to_noise': snr,
+        'tx_rate': tx_rate,
+        'rx_rate': rx_rate,
+        'uptime': '1h2m3s'
+    }
+
+
+def test_first_table_is_a_baseline():
+    tracker = ClientTracker()
+    events, to_write = tracker.update('r1', [client('aa'), client('bb')], now=0)
+    assert events == []
+    assert [entry['mac_address'] for entry in to_write] == ['aa', 'bb']
+    assert tracker.clients['aa'].uptime == 3723
+
+
+def test_join_and_leave_events():
+    tracker = ClientTracker()
+    tracker.update('r1', [client('aa')], now=0)
+    events, _ = tracker.update('r1', [client('aa'), client('bb')], now=10)
+    assert [(event['event'], event['mac_address']) for event in events] == [('join', 'bb')]
+
+    events, to_write = tracker.update('r1', [client('bb')], now=30)
+    assert [(event['event'], event['mac_address']) for event in events] == [('leave', 'aa')]
+    assert events[0]['connected_seconds'] == 30
+    assert to_write == []
+
+
+def test_roam_between_devices_within_the_window():
+    tracker = ClientTracker(roam_window=60)
+    tracker.update('r1', [client('aa')], now=0)
+    tracker.update('r2', [], now=0)
+    tracker.update('r1', [], now=10)
+    events, to_write = tracker.update('r2', [client('aa', interface='wlan2')], now=20)
+    assert events[0]['event'] == 'roam'
+    assert (events[0]['from_device'], events[0]['from_interface']) == ('r1', 'wlan1')
+    assert to_write
+
+    tracker.update('r2', [], now=30)
+    events, _ = tracker.update('r2', [client('aa')], now=200)
+    assert events[0]['event'] == 'join'
+
+
+def test_roam_between_interfaces_of_a_device():
+    tracker = ClientTracker()
+    tracker.update('r1', [client('aa')], now=0)
+    events, _ = tracker.update('r1', [client('aa', interface='wlan2')], now=10)
+    assert events[0]['event'] == 'roam'
+    assert events[0]['from_interface'] == 'wlan1'
+
+
+def test_unchanged_clients_are_written_once_per_full_interval():
+    tracker = ClientTracker(full_interval=300, signal_delta=5, rate_delta=0.5)
+    tracker.update('r1', [client('aa')], now=0)
+    assert tracker.update('r1', [client('aa', signal=-62)], now=10)[1] == []
+    assert tracker.update('r1', [client('aa', signal=-66)], now=20)[1] != []
+    assert tracker.update('r1', [client('aa', signal=-66, tx_rate=200e6)], now=30)[1] != []
+    assert tracker.update('r1', [client('aa', signal=-66, tx_rate=200e6)], now=40)[1] == []
+    assert tracker.update('r1', [client('aa', signal=-66, tx_rate=200e6)], now=330)[1] != []
+
+
+def test_interface_summary():
+    tracker = ClientTracker()
+    clients = [client(f"c{i}", signal=-45 - 10 * i, snr=45 - 10 * i, tx_rate=float(i)) for i in range(5)]
+    tracker.update('r1', clients + [client('x', interface='wlan2')], now=0)
+    summary = tracker.interface_summary('r1')
+    assert set(summary) == {'wlan1', 'wlan2'}
+    wlan1 = summary['wlan1']
+    assert wlan1['clients'] == 5
+    assert wlan1['signal_avg'] == -65
+    assert wlan1['signal_buckets'] == {'excellent': 1, 'good': 1, 'fair': 1, 'weak': 1, 'poor': 1}
+    assert wlan1['tx_rate'] == {50: 2.0, 90: 4.0, 99: 4.0}
+    assert tracker.interface_summary('unknown') == {}
+
+
+def test_buckets_and_percentiles():
+    assert bucket_label(SIGNAL_BUCKETS, -50) == 'excellent'
+    assert bucket_label(SIGNAL_BUCKETS, -95) == 'poor'
+    assert percentile([], 50) == 0.0
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile(list(range(1, 101)), 99) == 99
+
+
+def test_update_while_stream_callbacks_change_clients():
+    tracker = ClientTracker()
+    tracker.update('r1', [], now=0)
+    stop = threading.Event()
+    errors = []
+
+    def stream_callbacks():
+        i = 0
+        while not stop.is_set():
+            try:
+                tracker.observe('r1', client(f"s{i % 500}"), now=1)
+                tracker.remove('r1', f"s{(i + 250) % 500}", now=1)
+            except Exception as e:
+                errors.append(e)
+            i += 1
+
+    # Switch threads often so the callbacks run in the middle of update()
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=stream_callbacks)
+    thread.start()
+    try:
+        for _ in range(300):
+            tracker.update('r1', [client(f"p{i}") for i in range(50)], now=1)
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert not errors
@@ -0,0 +1,73 @@
+"""
+Tests for the log-linear latency histograms
+"""
+import math
+import random
+
+import pytest
+
+from utils.histogram import LatencyHistogram, bucket_index, bucket_bounds, LOWEST, SUB_BUCKETS
+
+
+def test_values_fall_inside_their_bucket():
+    value = LOWEST
+    while value < 100000:
+        lower, upper = bucket_bounds(bucket_index(value))
+        assert lower <= value < upper or math.isclose(value, upper)
+        assert (upper - lower) / lower <= 1.0 / SUB_BUCKETS + 1e-9
+        value *= 1.07
+
+
+def test_exact_powers_of_two_start_a_bucket():
+    for exponent in range(20):
+        value = LOWEST * 2 ** exponent
+        assert bucket_bounds(bucket_index(value))[0] == pytest.approx(value)
+
+
+def test_values_below_lowest_share_bucket_zero():
+    assert bucket_index(0.0) == 0
+    assert bucket_index(LOWEST / 2) == 0
+    assert bucket_bounds(0) == (0.0, LOWEST)
+
+
+def test_quantiles_within_bucket_error():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(5000)]
+    histogram = LatencyHistogram(values)
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[math.ceil(q * len(ordered)) - 1]
+        assert histogram.quantile(q) == pytest.approx(exact, rel=1.0 / SUB_BUCKETS)
+    assert histogram.quantile(1.0) == max(values)
+    assert histogram.quantile(0.0) >= min(values)
+    assert histogram.mean() == pytest.approx(sum(values) / len(values))
+
+
+def test_merge_equals_recording_everything():
+    rng = random.Random(11)
+    first = [rng.uniform(1, 50) for _ in range(300)]
+    second = [rng.uniform(20, 400) for _ in range(200)]
+    merged = LatencyHistogram(first).merge(LatencyHistogram(second))
+    combined = LatencyHistogram(first + second)
+    assert merged.counts == combined.counts
+    assert merged.count == 500
+    assert merged.min == min(first + second)
+    assert merged.max == max(first + second)
+    assert merged.sum == pytest.approx(combined.sum)
+
+
+def test_fields_round_trip():
+    histogram = LatencyHistogram([0.5, 1.2, 1.3, 80.0, 80.0, 2500.0])
+    restored = LatencyHistogram.from_fields(histogram.to_fields())
+    assert restored.counts == histogram.counts
+    assert restored.count == histogram.count
+    assert restored.sum == pytest.approx(histogram.sum)
+    assert (restored.min, restored.max) == (histogram.min, histogram.max)
+    assert restored.quantile(0.5) == histogram.quantile(0.5)
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.99) == 0.0
+    assert histogram.mean() == 0.0
+    assert LatencyHistogram.from_fields(histogram.to_fields()).count == 0
@@ -0,0 +1,119 @@
+"""
+Tests for the ICMP probe engine
+"""
+import struct
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from utils import icmp
+from utils.icmp import PingEngine, build_echo, checksum, summarize, ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY
+
+
+def test_checksum_of_message_with_checksum_is_zero():
+    packet = build_echo(0x1234, 7, b'payload!')
+    assert checksum(packet) == 0
+
+
+def test_checksum_pads_odd_lengths():
+    assert checksum(b'\x01') == checksum(b'\x01\x00')
+
+
+def test_build_echo_header():
+    packet = build_echo(0xBEEF, 42, bytes(56))
+    icmp_type, code, _, ident, seq = struct.unpack('!BBHHH', packet[:8])
+    assert (icmp_type, code, ident, seq) == (ICMP_ECHO_REQUEST, 0, 0xBEEF, 42)
+    assert len(packet) == 64
+
+
+def test_summarize_statistics():
+    result = summarize('192.0.2.1', 5, [10.0, 12.0, 11.0, 15.0])
+    assert result['success']
+    assert result['received'] == 4
+    assert result['packet_loss'] == pytest.approx(20.0)
+    assert (result['rtt_min'], result['rtt_max']) == (10.0, 15.0)
+    assert result['rtt_avg'] == pytest.approx(12.0)
+    assert result['rtt_mdev'] == pytest.approx((sum(v * v for v in (10, 12, 11, 15)) / 4 - 144) ** 0.5)
+    assert result['jitter'] == pytest.approx((2 + 1 + 4) / 3)
+
+
+def test_summarize_without_replies():
+    result = summarize('192.0.2.1', 3, [])
+    assert not result['success']
+    assert result['packet_loss'] == 100.0
+    assert result['rtt_avg'] == 0.0
+    assert summarize('192.0.2.1', 0, [])['packet_loss'] == 100.0
+
+
+def test_ping_loopback():
+    engine = PingEngine(count=3, interval=0.01, timeout=1.0)
+    results = engine.ping(['127.0.0.1', 'localhost'])
+    if engine.method == 'subprocess' and not results[0]['success']:
+        pytest.skip("ICMP sockets and the ping command are not available")
+    assert [result['target'] for result in results] == ['127.0.0.1', 'localhost']
+    for result in results:
+        assert result['success']
+        assert result['sent'] == 3
+        assert result['received'] == 3
+        assert result['packet_loss'] == 0.0
+        assert 0 < result['rtt_min'] <= result['rtt_avg'] <= result['rtt_max']
+
+
+class ReorderingSocket:
+    """Datagram ICMP socket stand-in that delivers the replies in a given order"""
+
+    def __init__(self, clock, send_times, replies):
+        self.clock = clock
+        self.send_times = send_times
+        self.replies = replies  # (round, receive time) in delivery order
+        self.sent = []
+        self.queue = []
+
+    def setblocking(self, flag):
+        pass
+
+    def sendto(self, packet, address):
+        seq = struct.unpack('!H', packet[6:8])[0]
+        self.clock.now = self.send_times[len(self.sent)]
+        self.sent.append(seq)
+        if len(self.sent) == len(self.send_times):
+            self.queue = list(self.replies)
+
+    def recvfrom(self, size):
+        round_index, received_at = self.queue.pop(0)
+        self.clock.now = received_at
+        return struct.pack('!BBHHH', ICMP_ECHO_REPLY, 0, 0, 0, self.sent[round_index]), ('192.0.2.1', 0)
+
+
+def test_out_of_order_replies_are_summarized_in_send_order(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(icmp, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    sock = ReorderingSocket(clock, [0.0, 0.001, 0.002], [(1, 0.011), (0, 0.030), (2, 0.052)])
+    monkeypatch.setattr(icmp, 'select', SimpleNamespace(
+        select=lambda readers, writers, errors, timeout: (readers if sock.queue else [], [], [])))
+
+    engine = PingEngine(count=3, interval=0.01, timeout=1.0)
+    result = engine._ping_socket(sock, False, {'192.0.2.1': '192.0.2.1'})['192.0.2.1']
+    assert result['rtts'] == pytest.approx([30.0, 10.0, 50.0])
+    assert result['jitter'] == pytest.approx(30.0)
+    assert result['packet_loss'] == 0.0
+
+
+def test_ping_command_replies_are_sorted_by_sequence(monkeypatch):
+    output = (b"PING 192.0.2.1 (192.0.2.1) 56(84) bytes of data.\n"
+              b"64 bytes from 192.0.2.1: icmp_seq=2 ttl=57 time=10.0 ms\n"
+              b"64 bytes from 192.0.2.1: icmp_seq=1 ttl=57 time=30.0 ms\n"
+              b"64 bytes from 192.0.2.1: icmp_seq=3 ttl=57 time=50.0 ms\n\n"
+              b"3 packets transmitted, 3 received, 0% packet loss, time 2003ms\n"
+              b"rtt min/avg/max/mdev = 10.0/30.0/50.0/16.3 ms\n")
+
+    class Process:
+        def communicate(self):
+            return output, b''
+
+    monkeypatch.setattr(subprocess, 'Popen', lambda *args, **kwargs: Process())
+    result = PingEngine(count=3)._ping_subprocess(['192.0.2.1'])['192.0.2.1']
+    assert result['rtts'] == [30.0, 10.0, 50.0]
+    assert result['jitter'] == pytest.approx(30.0)
+    assert result['rtt_mdev'] == 16.3
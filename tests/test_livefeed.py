@@ -0,0 +1,105 @@
+"""
+Tests for the live metric feed fan-out
+"""
+import json
+
+from utils.livefeed import LiveFeed, format_event
+
+
+def point(measurement, device_id, value=1.0):
+    return {'measurement': measurement, 'tags': {'device_id': device_id}, 'fields': {'value': value}, 'time': 0}
+
+
+def parse(message):
+    event, data = message.rstrip('\n').split('\n')
+    return event[len('event: '):], json.loads(data[len('data: '):])
+
+
+def test_format_event():
+    assert format_event('sample', {'a': 1}) == 'event: sample\ndata: {"a":1}\n\n'
+
+
+def test_subscribers_receive_only_their_measurements_and_devices():
+    feed = LiveFeed()
+    everything = feed.subscribe()
+    cpu = feed.subscribe(measurements=['cpu_metrics'])
+    r2 = feed.subscribe(devices=['r2'], measurements=['cpu_metrics', 'interface_metrics'])
+
+    feed.publish([point('cpu_metrics', 'r1'), point('interface_metrics', 'r2'), point('memory_metrics', 'r1')])
+
+    assert [parse(message)[1]['measurement'] for message in everything.next(0)] == [
+        'cpu_metrics', 'interface_metrics', 'memory_metrics']
+    assert [parse(message)[1]['device_id'] for message in cpu.next(0)] == ['r1']
+    assert [parse(message)[1]['measurement'] for message in r2.next(0)] == ['interface_metrics']
+
+
+def test_points_are_serialized_once_for_all_subscribers():
+    feed = LiveFeed()
+    first = feed.subscribe()
+    second = feed.subscribe(measurements=['cpu_metrics'])
+    feed.publish(point('cpu_metrics', 'r1'))
+    assert first.next(0)[0] is second.next(0)[0]
+
+
+def test_slow_subscribers_drop_their_oldest_messages():
+    feed = LiveFeed()
+    feed.queue_size = 3
+    subscription = feed.subscribe()
+    feed.publish([point('cpu_metrics', 'r1', value) for value in range(5)])
+    messages = subscription.next(0)
+    assert [parse(message)[1]['fields']['value'] for message in messages] == [2, 3, 4]
+    assert subscription.dropped == 2
+
+
+def test_subscriber_limit_and_unsubscribe():
+    feed = LiveFeed()
+    feed.max_subscribers = 2
+    first = feed.subscribe(measurements=['cpu_metrics'])
+    second = feed.subscribe()
+    assert feed.subscribe() is None
+
+    feed.unsubscribe(first)
+    feed.unsubscribe(first)
+    assert feed.subscribers == 1
+    assert first.closed
+    assert feed._by_measurement == {}
+    feed.unsubscribe(second)
+    assert feed.subscribers == 0
+
+
+def test_alert_transitions():
+    feed = LiveFeed()
+    alerts = feed.subscribe(measurements=['alert'])
+    other_device = feed.subscribe(devices=['r2'], measurements=['alert'])
+    samples = feed.subscribe(measurements=['cpu_metrics'])
+
+    feed.publish_alert('firing', {'id': 'cpu_r1', 'device_id': 'r1'})
+    event, payload = parse(alerts.next(0)[0])
+    assert event == 'alert'
+    assert payload == {'id': 'cpu_r1', 'device_id': 'r1', 'state': 'firing'}
+    assert other_device.next(0) == []
+    assert samples.next(0) == []
+
+
+def test_forwarded_alerts_are_not_published_locally():
+    feed = LiveFeed()
+    forwarded = []
+    feed.forward = lambda state, alert: forwarded.append((state, alert['id']))
+    subscription = feed.subscribe(measurements=['alert'])
+    feed.publish_alert('resolved', {'id': 'cpu_r1', 'device_id': 'r1'})
+    assert forwarded == [('resolved', 'cpu_r1')]
+    assert subscription.next(0) == []
+
+
+def test_stream_reports_drops_and_unsubscribes():
+    feed = LiveFeed()
+    feed.queue_size = 1
+    subscription = feed.subscribe()
+    feed.publish([point('cpu_metrics', 'r1'), point('cpu_metrics', 'r1', 2.0)])
+
+    stream = feed.stream(subscription)
+    assert next(stream).startswith('retry: ')
+    assert parse(next(stream)) == ('dropped', {'dropped': 1})
+    assert parse(next(stream))[1]['fields'] == {'value': 2.0}
+    stream.close()
+    assert feed.subscribers == 0
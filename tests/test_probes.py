@@ -0,0 +1,187 @@
+"""
+Tests for the WAN latency probes, run against local TCP, HTTP and DNS listeners
+"""
+import socket
+import struct
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.probes import Link, TcpProbe, HttpProbe, DnsProbe, ProbeRunner, build_probe, DEFAULT_LINK
+
+
+def run(probe, link=None, timeout=2.0):
+    return asyncio.run(probe.run(link or Link('test'), timeout))
+
+
+@pytest.fixture
+def tcp_port():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.fixture
+def http_port():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(204 if self.path == '/empty' else 200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dns_server():
+    """UDP server answering every query with one A record, or NXDOMAIN for missing.test"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(0.1)
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            try:
+                query, address = sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            nxdomain = b'\x07missing\x04test\x00' in query
+            header = struct.pack('!HHHHHH', struct.unpack('!H', query[:2])[0],
+                                 0x8183 if nxdomain else 0x8180, 1, 0 if nxdomain else 1, 0, 0)
+            answer = b'' if nxdomain else b'\xc0\x0c' + struct.pack('!HHIH', 1, 1, 60, 4) + bytes([192, 0, 2, 1])
+            sock.sendto(header + query[12:] + answer, address)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield sock.getsockname()[1]
+    stop.set()
+    thread.join()
+    sock.close()
+
+
+def test_tcp_probe_measures_connect(tcp_port):
+    result = run(TcpProbe('127.0.0.1', tcp_port))
+    assert result['success'], result['error']
+    assert result['probe'] == 'tcp'
+    assert result['target'] == f"127.0.0.1:{tcp_port}"
+    assert result['latency_ms'] > 0
+    assert result['connect_ms'] == result['latency_ms']
+
+
+def test_tcp_probe_reports_refused_connection(closed_port):
+    result = run(TcpProbe('127.0.0.1', closed_port))
+    assert not result['success']
+    assert 'ConnectionRefused' in result['error']
+    assert result['latency_ms'] == 0.0
+
+
+def test_tcp_probe_from_source_address(tcp_port):
+    result = run(TcpProbe('127.0.0.1', tcp_port), Link('isp1', source_address='127.0.0.1'))
+    assert result['success'], result['error']
+    assert result['link'] == 'isp1'
+
+
+def test_http_probe_measures_time_to_first_byte(http_port):
+    result = run(HttpProbe(f"http://127.0.0.1:{http_port}/empty"))
+    assert result['success'], result['error']
+    assert result['status_code'] == 204
+    assert result['tls_ms'] == 0.0
+    assert 0 < result['ttfb_ms'] <= result['latency_ms']
+    assert result['connect_ms'] <= result['latency_ms']
+
+
+def test_http_probe_reports_refused_connection(closed_port):
+    result = run(HttpProbe(f"http://127.0.0.1:{closed_port}/"))
+    assert not result['success']
+    assert result['error']
+
+
+def test_dns_probe_counts_answers(dns_server):
+    result = run(DnsProbe('example.test', '127.0.0.1', dns_server))
+    assert result['success'], result['error']
+    assert result['rcode'] == 0
+    assert result['answers'] == 1
+    assert result['latency_ms'] > 0
+
+
+def test_dns_probe_accepts_nxdomain(dns_server):
+    result = run(DnsProbe('missing.test', '127.0.0.1', dns_server))
+    assert result['success'], result['error']
+    assert result['rcode'] == 3
+    assert result['answers'] == 0
+
+
+def test_dns_probe_times_out_without_answer():
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(('127.0.0.1', 0))
+    try:
+        result = run(DnsProbe('example.test', '127.0.0.1', silent.getsockname()[1]), timeout=0.2)
+    finally:
+        silent.close()
+    assert not result['success']
+    assert result['error'] == 'timeout'
+
+
+def test_build_probe():
+    assert isinstance(build_probe({'type': 'tcp', 'host': '1.1.1.1'}), TcpProbe)
+    assert build_probe({'type': 'tcp', 'host': '1.1.1.1'}).port == 443
+    assert isinstance(build_probe({'type': 'http', 'url': 'https://example.com/'}), HttpProbe)
+    assert isinstance(build_probe({'type': 'dns', 'name': 'example.com', 'server': '1.1.1.1'}), DnsProbe)
+    assert build_probe({'type': 'dns', 'name': 'example.com'}) is None
+    assert build_probe({'type': 'icmp', 'host': '1.1.1.1'}) is None
+
+
+def test_runner_reports_unbound_links_once_under_default(tcp_port):
+    links = [Link('ISP1', 'router', 'ether1'), Link('ISP2', 'router', 'ether2')]
+    results = ProbeRunner([TcpProbe('127.0.0.1', tcp_port)], links).run()
+    assert [result['link'] for result in results] == [DEFAULT_LINK]
+    assert results[0]['success'], results[0]['error']
+
+
+def test_runner_reports_bound_links_separately(tcp_port, http_port):
+    probes = [TcpProbe('127.0.0.1', tcp_port), HttpProbe(f"http://127.0.0.1:{http_port}/")]
+    links = [
+        Link('ISP1', 'router', 'ether1', source_address='127.0.0.1'),
+        Link('ISP2', 'router', 'ether2', source_address='127.0.0.2'),
+        Link('ISP3', 'router', 'ether3')
+    ]
+    results = ProbeRunner(probes, links, timeout=2.0).run()
+    assert sorted((result['link'], result['probe']) for result in results) == [
+        ('ISP1', 'http'), ('ISP1', 'tcp'), ('ISP2', 'http'), ('ISP2', 'tcp'),
+        (DEFAULT_LINK, 'http'), (DEFAULT_LINK, 'tcp')
+    ]
+    assert all(result['success'] for result in results), [result['error'] for result in results]
+    assert {result['interface'] for result in results if result['link'] == 'ISP2'} == {'ether2'}
+
+
+def test_runner_shares_results_of_links_with_the_same_binding(tcp_port):
+    links = [Link('a', source_address='127.0.0.1'), Link('b', source_address='127.0.0.1')]
+    results = ProbeRunner([TcpProbe('127.0.0.1', tcp_port)], links).run()
+    assert sorted(result['link'] for result in results) == ['a', 'b']
+    assert results[0]['latency_ms'] == results[1]['latency_ms']
+
+
+def test_runner_without_probes_returns_nothing():
+    assert ProbeRunner([], [Link('ISP1')]).run() == []
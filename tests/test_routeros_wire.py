@@ -0,0 +1,36 @@
+"""
+Tests for the RouterOS API wire codec
+"""
+import asyncio
+
+import pytest
+
+from utils.routeros_wire import encode_length, encode_sentence, read_sentence
+
+
+def read(data):
+    async def decode():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_sentence(reader)
+    return asyncio.run(decode())
+
+
+@pytest.mark.parametrize('length, size', [
+    (0, 1), (0x7F, 1), (0x80, 2), (0x3FFF, 2), (0x4000, 3),
+    (0x1FFFFF, 3), (0x200000, 4), (0xFFFFFFF, 4), (0x10000000, 5)
+])
+def test_length_prefix_sizes(length, size):
+    assert len(encode_length(length)) == size
+
+
+@pytest.mark.parametrize('length', [0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000])
+def test_sentence_round_trip_across_length_boundaries(length):
+    words = ['/interface/print', '=x=' + 'a' * (length - 3), '.tag=7']
+    assert read(encode_sentence(words)) == words
+
+
+def test_empty_sentence_and_utf8_words():
+    assert encode_sentence([]) == b'\x00'
+    assert read(encode_sentence(['=comment=Phòng họp'])) == ['=comment=Phòng họp']
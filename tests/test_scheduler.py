@@ -0,0 +1,116 @@
+"""
+Tests for adaptive poll scheduling and the global poll budget
+"""
+import pytest
+
+from utils import alerting, scheduler
+from utils.scheduler import PollScheduler, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def unlimited_budget():
+    scheduler.budget.configure(0)
+    yield
+    scheduler.budget.configure(0)
+
+
+def devices(*ids):
+    return [{'id': device_id} for device_id in ids]
+
+
+def test_token_bucket_without_rate_never_limits():
+    bucket = TokenBucket()
+    assert all(bucket.acquire() for _ in range(1000))
+
+
+def test_token_bucket_limits_and_refills():
+    bucket = TokenBucket(rate=2)
+    assert bucket.acquire() and bucket.acquire()
+    assert not bucket.acquire()
+    bucket.updated -= 1.0  # one second later
+    assert bucket.acquire() and bucket.acquire()
+    assert not bucket.acquire()
+
+
+def test_from_config():
+    assert PollScheduler.from_config({}, 30) is None
+    schedule = PollScheduler.from_config({'scheduling': {'enabled': True, 'max_interval': 120}}, 30)
+    assert (schedule.base_interval, schedule.max_interval) == (30, 120)
+
+
+def test_new_devices_are_due_and_rescheduled_after_a_poll():
+    schedule = PollScheduler(30)
+    assert schedule.due(devices('a', 'b'), now=1000) == devices('a', 'b')
+    schedule.complete('a', now=1000)
+    assert schedule.due(devices('a', 'b'), now=1001) == devices('b')
+    assert schedule.due(devices('a', 'b'), now=1030) == devices('b', 'a')
+
+
+def test_most_overdue_devices_come_first():
+    schedule = PollScheduler(30)
+    schedule.complete('a', now=1000)
+    schedule.complete('b', now=990)
+    assert schedule.due(devices('a', 'b', 'c'), now=1100) == devices('c', 'b', 'a')
+
+
+def test_failures_back_off_exponentially_up_to_the_maximum():
+    schedule = PollScheduler(30, max_interval=300)
+    intervals = []
+    for _ in range(5):
+        schedule.failure('a')
+        schedule.complete('a', now=0)
+        intervals.append(schedule.schedules['a'].interval)
+    assert intervals == [60, 120, 240, 300, 300]
+
+    schedule.complete('a', now=0)
+    assert schedule.schedules['a'].interval == 30
+    assert schedule.schedules['a'].failures == 0
+
+
+def test_stable_series_are_polled_less_often():
+    schedule = PollScheduler(30, max_interval=60)
+    for _ in range(5):
+        schedule.observe('a', 'cpu_load', 10.0)
+        schedule.complete('a', now=0)
+    assert schedule.schedules['a'].interval == 60
+
+
+def test_volatile_series_are_polled_more_often():
+    schedule = PollScheduler(40, min_interval=10)
+    for value in (10, 90, 5, 95, 0, 100):
+        schedule.observe('a', 'cpu_load', value)
+    schedule.complete('a', now=0)
+    assert schedule.schedules['a'].interval == 20
+    schedule.complete('a', now=0)
+    schedule.complete('a', now=0)
+    assert schedule.schedules['a'].interval == 10
+
+
+def test_alerting_devices_use_the_alert_interval(monkeypatch):
+    monkeypatch.setattr(alerting, 'active_alerts', {'cpu_a': {'device_id': 'a'}})
+    schedule = PollScheduler(60, alert_interval=10)
+    schedule.due(devices('a', 'b'), now=0)
+    schedule.complete('a', now=0)
+    schedule.complete('b', now=0)
+    assert schedule.schedules['a'].interval == 10
+    assert schedule.schedules['b'].interval == 60
+
+
+def test_next_wakeup_only_considers_owned_devices():
+    schedule = PollScheduler(30, tick=1)
+    schedule.complete('gone', now=0)
+    schedule.schedules['gone'].next_due = 5
+    schedule.due(devices('a', 'b'), now=0)
+    schedule.complete('a', now=0)
+    schedule.complete('b', now=10)
+    assert schedule.next_wakeup(now=0) == 30
+    assert schedule.next_wakeup(now=35) == 1
+
+
+def test_budget_leaves_devices_due_for_the_next_tick():
+    scheduler.budget.configure(2)
+    schedule = PollScheduler(30)
+    assert schedule.due(devices('a', 'b', 'c'), now=0) == devices('a', 'b')
+    for device_id in ('a', 'b'):
+        schedule.complete(device_id, now=0)
+    assert schedule.next_wakeup(now=0) == 1
@@ -0,0 +1,100 @@
+"""
+Tests for response compression and conditional GETs
+"""
+import gzip
+
+import pytest
+from flask import Flask
+
+from utils.serving import choose_encoding, etag_matches, make_etag, conditional, enable_compression
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate, br', 'br'),
+    ('gzip;q=1.0, br;q=0.5', 'gzip'),
+    ('br;q=0.8, gzip;q=0.8', 'br'),
+    ('GZIP', 'gzip'),
+    ('*', 'br'),
+    ('*;q=0.1, gzip;q=0', 'br'),
+    ('gzip;q=0, br;q=0', None),
+    ('identity', None),
+    ('br;q=abc, gzip', 'gzip'),
+    ('', None),
+    (None, None)
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, ('br', 'gzip')) == expected
+
+
+def test_etag_matches_with_weak_comparison():
+    etag = make_etag('/api/devices', 'stamp')
+    assert etag.startswith('W/"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches('', etag)
+    assert not etag_matches(None, etag)
+    assert make_etag('/a', 1) != make_etag('/a', 2)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    state = {'version': 'v1', 'calls': 0, 'body': 'x' * 2000}
+
+    @app.route('/stamped')
+    @conditional(lambda: state['version'])
+    def stamped():
+        state['calls'] += 1
+        return {'body': state['body']}
+
+    @app.route('/unstamped')
+    @conditional(lambda: None)
+    def unstamped():
+        state['calls'] += 1
+        return {'body': state['body']}
+
+    enable_compression(app, {'serving': {'compression': {'brotli': False}}})
+    app.state = state
+    return app
+
+
+def test_stamped_view_is_not_run_for_a_matching_etag(app):
+    client = app.test_client()
+    response = client.get('/stamped')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert app.state['calls'] == 1
+
+    response = client.get('/stamped', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert app.state['calls'] == 1
+
+    app.state['version'] = 'v2'
+    response = client.get('/stamped', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_unstamped_view_hashes_the_body(app):
+    client = app.test_client()
+    etag = client.get('/unstamped').headers['ETag']
+    assert client.get('/unstamped', headers={'If-None-Match': etag}).status_code == 304
+    assert app.state['calls'] == 2
+
+    app.state['body'] = 'y' * 2000
+    assert client.get('/unstamped', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_compression_is_negotiated(app):
+    client = app.test_client()
+    response = client.get('/stamped', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()).startswith(b'{"body":"xxx')
+
+    response = client.get('/stamped', headers={'Accept-Encoding': 'br'})
+    assert 'Content-Encoding' not in response.headers
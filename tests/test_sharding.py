@@ -0,0 +1,95 @@
+"""
+Tests for device sharding with the consistent hash ring
+"""
+import os
+import json
+import time
+from collections import Counter
+
+from utils.sharding import HashRing, FileMembershipStore, ShardCoordinator
+
+KEYS = [f"router-{i:05d}" for i in range(10000)]
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().owner('router-1') is None
+
+
+def test_owner_is_stable_and_order_independent():
+    first = HashRing(['a', 'b', 'c'])
+    second = HashRing(['c', 'a', 'b'])
+    assert [first.owner(key) for key in KEYS] == [second.owner(key) for key in KEYS]
+
+
+def test_keys_are_spread_across_members():
+    ring = HashRing([f"instance-{i}" for i in range(4)])
+    counts = Counter(ring.owner(key) for key in KEYS)
+    assert len(counts) == 4
+    assert all(1500 < count < 3500 for count in counts.values()), counts
+
+
+def test_adding_a_member_moves_about_one_nth_of_the_keys():
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b', 'c', 'd'])
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+    # Keys only move to the new member
+    assert all(after.owner(key) == 'd' for key in moved)
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_store_heartbeat_prunes_stale_members(tmp_path):
+    store = FileMembershipStore(str(tmp_path), member_timeout=30)
+    assert store.heartbeat('a') == ['a']
+    assert store.heartbeat('b') == ['a', 'b']
+
+    with open(os.path.join(store.members_dir, 'c.json'), 'w') as file:
+        json.dump({'instance': 'c', 'heartbeat': time.time() - 60}, file)
+    assert store.members() == ['a', 'b']
+    assert os.path.exists(os.path.join(store.members_dir, 'c.json'))
+    assert store.heartbeat('a') == ['a', 'b']
+    assert not os.path.exists(os.path.join(store.members_dir, 'c.json'))
+
+    store.leave('b')
+    assert store.members() == ['a']
+
+
+def coordinator(store_dir, instance_id):
+    shard = ShardCoordinator()
+    shard.configure({'sharding': {'enabled': True, 'instance_id': instance_id, 'store_dir': store_dir}})
+    return shard
+
+
+def test_instances_split_the_devices(tmp_path):
+    devices = [{'id': key} for key in KEYS[:1000]]
+    first = coordinator(str(tmp_path), 'first')
+    second = coordinator(str(tmp_path), 'second')
+    first.refresh()
+    second.refresh()
+    first.refresh()
+
+    owned_first = {device['id'] for device in first.owned(devices)}
+    owned_second = {device['id'] for device in second.owned(devices)}
+    assert owned_first and owned_second
+    assert not owned_first & owned_second
+    assert len(owned_first | owned_second) == len(devices)
+
+    # The second instance leaving hands its devices to the first
+    second.store.leave('second')
+    first.refresh()
+    assert len(first.owned(devices)) == len(devices)
+
+
+def test_disabled_sharding_owns_everything():
+    devices = [{'id': key} for key in KEYS[:10]]
+    assert ShardCoordinator().owned(devices) is devices
+
+
+def test_local_slices_partition_the_devices():
+    devices = [{'id': key} for key in KEYS[:1000]]
+    slices = []
+    for index in range(3):
+        shard = ShardCoordinator()
+        shard.set_local_slice(index, 3)
+        slices.append({device['id'] for device in shard.owned(devices)})
+    assert sum(len(owned) for owned in slices) == len(devices)
+    assert set.union(*slices) == {device['id'] for device in devices}
@@ -0,0 +1,77 @@
+"""
+Tests for the RouterOS value parsers
+"""
+import pytest
+
+from utils.units import (parse_number, parse_rate, parse_rate_pair, parse_number_pair,
+                         parse_duration, parse_duration_pair)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2412', 2412),
+    ('-65@HT20-7', -65),
+    ('  12.5 dB', 12.5),
+    ('10M', 10),
+    ('', 0),
+    ('n/a', 0),
+    (42, 42),
+    (1.5, 1.5)
+])
+def test_parse_number(value, expected):
+    assert parse_number(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('10M', 10000000),
+    ('512k', 512000),
+    ('512K', 512000),
+    ('1.5G', 1500000000),
+    ('144.4Mbps-20MHz/2S', 144400000),
+    ('6Mbps', 6000000),
+    ('2T', 2000000000000),
+    ('1000', 1000),
+    ('0', 0),
+    ('unlimited', 0),
+    (2500, 2500)
+])
+def test_parse_rate(value, expected):
+    result = parse_rate(value)
+    assert result == expected
+    assert isinstance(result, int)
+
+
+def test_parse_rate_keeps_fractional_bits():
+    assert parse_rate('1.5') == 1.5
+
+
+def test_parse_pairs():
+    assert parse_rate_pair('5M/10M') == (5000000, 10000000)
+    assert parse_rate_pair('2M') == (2000000, 2000000)
+    assert parse_rate_pair(1000) == (1000, 1000)
+    assert parse_number_pair('1200/3400') == (1200, 3400)
+    assert parse_duration_pair('8s/16s') == (8, 16)
+    assert parse_duration_pair('10s') == (10, 10)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1w2d3h4m5s', 604800 + 2 * 86400 + 3 * 3600 + 4 * 60 + 5),
+    ('12m3s120ms', 723.12),
+    ('300us', 0.0003),
+    ('00:05:12', 312),
+    ('1d 00:05:12', 86712),
+    ('5:12', 312),
+    ('', 0),
+    (None, 0),
+    ('bad:clock', 0),
+    (90, 90)
+])
+def test_parse_duration(value, expected):
+    assert parse_duration(value) == pytest.approx(expected)
+
+
+def test_parsed_strings_are_memoized():
+    from utils.units import _parse_number
+    parse_rate('123M')
+    hits = _parse_number.cache_info().hits
+    parse_rate('123M')
+    assert _parse_number.cache_info().hits == hits + 1
@@ -0,0 +1,78 @@
+"""
+Tests for the data version stamps behind conditional API responses
+"""
+from types import SimpleNamespace
+
+from utils import versions as versions_module
+from utils.versions import VersionStamps, DEVICE_WINDOW
+
+
+def stamps():
+    versions = VersionStamps()
+    versions.max_age = 0
+    return versions
+
+
+def test_no_stamp_before_any_write():
+    versions = stamps()
+    assert versions.stamp('cpu_metrics') is None
+    versions.bump('alert_state')
+    assert versions.stamp('alert_state') is None
+
+
+def test_stamp_changes_only_with_its_measurements():
+    versions = stamps()
+    versions.observe({'measurement': 'cpu_metrics', 'tags': {}})
+    cpu = versions.stamp('cpu_metrics')
+    alerts = versions.stamp('alert', 'alert_state')
+
+    versions.observe([{'measurement': 'memory_metrics'}, {'measurement': 'memory_metrics'}])
+    assert versions.stamp('cpu_metrics') == cpu
+    versions.observe({'measurement': 'cpu_metrics'})
+    assert versions.stamp('cpu_metrics') != cpu
+
+    assert versions.stamp('alert', 'alert_state') == alerts
+    versions.bump('alert_state')
+    assert versions.stamp('alert', 'alert_state') != alerts
+
+
+def test_device_stamp_tracks_the_set_of_devices():
+    versions = stamps()
+    point = {'measurement': 'interface', 'tags': {'device_id': 'r1'}}
+    versions.observe(point)
+    first = versions.stamp(devices=True)
+    versions.observe(point)
+    assert versions.stamp(devices=True) == first
+    versions.observe({'measurement': 'cpu_metrics', 'tags': {'device_id': 'r2'}})
+    assert versions.stamp(devices=True) == first
+    versions.observe({'measurement': 'wireless', 'tags': {'device_id': 'r2'}})
+    assert versions.stamp(devices=True) != first
+
+
+def test_devices_expire_after_the_query_window(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(versions_module, 'time', SimpleNamespace(monotonic=lambda: clock[0], time=lambda: 0.0))
+    versions = stamps()
+    versions.observe({'measurement': 'device', 'tags': {'device_id': 'r1'}})
+    clock[0] += DEVICE_WINDOW / 2
+    versions.observe({'measurement': 'device', 'tags': {'device_id': 'r2'}})
+    before = versions.stamp(devices=True)
+
+    clock[0] += DEVICE_WINDOW / 2 + 1
+    expired = versions.stamp(devices=True)
+    assert expired != before
+    assert list(versions._device_seen) == ['r2']
+    assert versions.stamp(devices=True) == expired
+
+
+def test_max_age_buckets_the_stamp(monkeypatch):
+    versions = VersionStamps()
+    versions.configure({'api': {'etag': {'max_age': 60}}})
+    versions.observe({'measurement': 'cpu_metrics'})
+    clock = SimpleNamespace(monotonic=lambda: 0.0, time=lambda: 6000.0)
+    monkeypatch.setattr(versions_module, 'time', clock)
+    first = versions.stamp('cpu_metrics')
+    clock.time = lambda: 6059.0
+    assert versions.stamp('cpu_metrics') == first
+    clock.time = lambda: 6060.0
+    assert versions.stamp('cpu_metrics') != first